@@ -1,18 +1,35 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import hashlib
 import json
 import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
-from typing import Any, List, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, List, Optional, Tuple
 import os
 
 import httpx
 
+from . import metrics, shared_state
+from .recorder import recorder
+
 
 def _env(key: str, default: str = "") -> str:
   return (os.getenv(key) or "").strip() or default
 
 
+def _env_float(key: str, default: float) -> float:
+  try:
+    return float(_env(key) or default)
+  except ValueError:
+    return default
+
+
 @dataclass
 class NodeDraft:
   level: int
@@ -21,34 +38,363 @@ class NodeDraft:
   parent_index: Optional[int]  # index in list, None for root
 
 
+@dataclass
+class AICallResult:
+  """
+  一次 AIClient 方法调用的结果。
+  source：llm（真调了模型）/ cache（命中响应缓存）/ stub（内置规则兜底）/
+  prefetch（用上了回答后预取的结果）/ similar（复用了项目里相似问答的追问，见 similarity.py）；
+  error：走 stub 的原因，no_api / circuit_open / bad_output，或异常类名（ReadTimeout、HTTPStatusError…）。
+  """
+
+  method: str
+  source: str
+  latency: float
+  error: Optional[str] = None
+  value: Any = None
+
+  @property
+  def degraded(self) -> bool:
+    # 没配 key 用 stub 是预期行为，不算降级
+    return self.source == "stub" and self.error != "no_api"
+
+
+class BadOutput(Exception):
+  """模型返回了，但内容解析不出可用结果。"""
+
+
+class CircuitBreaker:
+  """
+  按最近 window 秒内的调用错误率熔断：样本够 min_calls 且错误率 >= error_rate 就打开，
+  cooldown 秒内所有调用直接走 stub；冷却后放一个探测请求，成功才关上。
+  """
+
+  def __init__(self, error_rate: float, min_calls: int, window: float, cooldown: float) -> None:
+    self.error_rate = error_rate
+    self.min_calls = min_calls
+    self.window = window
+    self.cooldown = cooldown
+    self._events: Deque[Tuple[float, bool]] = deque()
+    self._opened_at: Optional[float] = None
+    self._probing = False
+    self._probe_id = 0
+    self._lock = threading.Lock()
+
+  @property
+  def state(self) -> str:
+    if self._opened_at is None:
+      return "closed"
+    return "half_open" if self._probing else "open"
+
+  def allow(self) -> bool:
+    return self.admit() is not None
+
+  def admit(self) -> Optional[int]:
+    """
+    None：拒绝；0：正常放行；大于 0：这次是半开时的探测请求，返回探测编号。
+    探测请求不管怎么结束（没真发出去、被并发名额拒掉、只命中了缓存）都要 release_probe，
+    不然 _probing 一直是 True，熔断器就再也关不上了。
+    """
+    with self._lock:
+      if self._opened_at is None:
+        return 0
+      if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+        return None
+      self._probing = True
+      self._probe_id += 1
+      return self._probe_id
+
+  def release_probe(self, probe_id: int) -> None:
+    """探测请求结束但没有 record 出结果：放掉探测名额，下一个请求接着探。"""
+    with self._lock:
+      if self._probing and probe_id == self._probe_id:
+        self._probing = False
+
+  def record(self, ok: bool) -> None:
+    now = time.monotonic()
+    with self._lock:
+      if self._opened_at is not None:
+        if not self._probing:
+          return  # 打开前就发出去的慢请求，结果不作数
+        self._probing = False
+        if ok:
+          self._opened_at = None
+          self._events.clear()
+        else:
+          self._opened_at = now
+        return
+      self._events.append((now, ok))
+      while self._events and now - self._events[0][0] > self.window:
+        self._events.popleft()
+      errors = sum(1 for _, e_ok in self._events if not e_ok)
+      if len(self._events) >= self.min_calls and errors / len(self._events) >= self.error_rate:
+        self._opened_at = now
+        metrics.AI_BREAKER_OPENS.inc()
+
+
+class ResponseCache:
+  """按 (model, messages) 缓存模型原始回复，带 TTL，条数封顶；存在 shared_state 里，多 worker 共用。"""
+
+  def __init__(self, ttl: float, max_items: int, store=None) -> None:
+    self.ttl = ttl
+    self.max_items = max_items
+    self.store = store or shared_state.state
+
+  @staticmethod
+  def key(model: str, messages: List[dict]) -> str:
+    raw = json.dumps([model, messages], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+  def get(self, key: str) -> Optional[str]:
+    if self.ttl <= 0:
+      return None
+    return self.store.get("llm_response", key)
+
+  def put(self, key: str, content: str) -> None:
+    if self.ttl <= 0:
+      return
+    self.store.put("llm_response", key, content, self.ttl, self.max_items)
+
+  async def aget(self, key: str) -> Optional[str]:
+    return await shared_state.call(self.store, self.get, key)
+
+  async def aput(self, key: str, content: str) -> None:
+    await shared_state.call(self.store, self.put, key, content)
+
+
+class ConcurrencyLimited(Exception):
+  """等了一个超时时长都没排到模型调用名额。"""
+
+
+class ConcurrencyLimiter:
+  """
+  限制同时在途的模型调用数（按供应商配额来定），名额记在 shared_state 里，多 worker 合计不超过 limit。
+  limit <= 0 不限。名额带租期，持有者崩了也会自己过期。
+  """
+
+  def __init__(self, limit: int, store=None, name: str = "llm") -> None:
+    self.limit = limit
+    self.name = name
+    self.store = store or shared_state.state
+
+  @asynccontextmanager
+  async def slot(self, timeout: float) -> AsyncIterator[None]:
+    if self.limit <= 0:
+      yield
+      return
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while True:
+      token = await shared_state.call(self.store, self.store.try_acquire, self.name, self.limit, timeout + 5)
+      if token is not None:
+        break
+      if time.monotonic() >= deadline:
+        raise ConcurrencyLimited(self.name)
+      await asyncio.sleep(delay)
+      delay = min(delay * 2, 0.2)
+    try:
+      yield
+    finally:
+      await shared_state.call(self.store, self.store.release, self.name, token)
+
+
+# AIClient 每个请求 new 一个，熔断、缓存和并发名额要跨请求共享，放模块级
+breaker = CircuitBreaker(
+  error_rate=_env_float("AI_BREAKER_ERROR_RATE", 0.5),
+  min_calls=int(_env_float("AI_BREAKER_MIN_CALLS", 5)),
+  window=_env_float("AI_BREAKER_WINDOW", 60.0),
+  cooldown=_env_float("AI_BREAKER_COOLDOWN", 30.0),
+)
+response_cache = ResponseCache(
+  ttl=_env_float("AI_CACHE_TTL", 600.0),
+  max_items=int(_env_float("AI_CACHE_SIZE", 512)),
+)
+llm_limiter = ConcurrencyLimiter(int(_env_float("AI_MAX_CONCURRENCY", 0)))
+
+# 进程内共用的连接池，由 main 的 lifespan 打开 / 关闭；没开（脚本、进程内压测）时每次调用临时建一个
+_http_pool: Optional[httpx.AsyncClient] = None
+
+
+def open_http_pool() -> httpx.AsyncClient:
+  """keep-alive 复用到模型服务的连接，省掉每次调用的 TCP + TLS 握手。"""
+  global _http_pool
+  if _http_pool is None:
+    size = int(_env_float("AI_HTTP_POOL_SIZE", 20))
+    _http_pool = httpx.AsyncClient(limits=httpx.Limits(max_connections=size, max_keepalive_connections=size))
+  return _http_pool
+
+
+async def close_http_pool() -> None:
+  global _http_pool
+  if _http_pool is not None:
+    pool, _http_pool = _http_pool, None
+    await pool.aclose()
+
+
+class _HTTPProvider:
+  """OpenAI 兼容的 chat/completions 接口。"""
+
+  name = "openai"
+
+  def __init__(self, base: str, key: str) -> None:
+    self.base = base
+    self.key = key
+
+  async def _post(self, client: httpx.AsyncClient, model: str, messages: List[dict], timeout: float) -> dict:
+    r = await client.post(
+      f"{self.base}/chat/completions",
+      json={"model": model, "messages": messages},
+      headers={"Authorization": f"Bearer {self.key}", "Content-Type": "application/json"},
+      timeout=timeout,
+    )
+    r.raise_for_status()
+    return r.json()
+
+  async def complete(self, model: str, messages: List[dict], timeout: float) -> dict:
+    if _http_pool is not None:
+      return await self._post(_http_pool, model, messages, timeout)
+    async with httpx.AsyncClient(timeout=timeout) as client:
+      return await self._post(client, model, messages, timeout)
+
+
+def _make_provider(base: str, key: str):
+  """AI_PROVIDER=sim 用离线模拟器（backend/llm_sim.py）；默认走 OpenAI 兼容接口，没配 key 返回 None（用 stub）。"""
+  if _env("AI_PROVIDER").lower() == "sim":
+    from .llm_sim import get_provider
+
+    return get_provider()
+  if base and key:
+    return _HTTPProvider(base, key)
+  return None
+
+
+# 当前这次方法调用里 _call_llm 的来源（llm / cache），由 _run 设置、_call_llm 追加
+_llm_sources: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("llm_sources", default=None)
+# 当前这次方法调用是不是熔断半开时的探测请求，是的话不读回复缓存
+_probing_call: contextvars.ContextVar[bool] = contextvars.ContextVar("ai_probing", default=False)
+# 当前在跑哪个 AIClient 方法，录制时标在记录上
+_current_method: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("ai_method", default=None)
+
+
+def _content_of(data: dict) -> str:
+  return (data.get("choices") or [{}])[0].get("message", {}).get("content", "") or ""
+
+
 class AIClient:
   """
-  我这边用 OpenAI 兼容接口调大模型；没配 key 就用内置 stub 规则。
+  我这边用 OpenAI 兼容接口调大模型（AI_PROVIDER=sim 时换成离线模拟器）；没配 key 就用内置 stub 规则。
+  每个公开方法都走 _run：调用结果记成 AICallResult，放进 self.calls 并上报指标。
   """
 
   def __init__(self) -> None:
     self.base = _env("AI_API_BASE").rstrip("/")
     self.key = _env("AI_API_KEY")
     self.model = _env("AI_MODEL") or "gpt-4o-mini"
-    self.has_real_api = bool(self.base and self.key)
+    self.timeout = _env_float("AI_TIMEOUT", 60.0)
+    self.provider = _make_provider(self.base, self.key)
+    self.has_real_api = self.provider is not None
+    self.calls: List[AICallResult] = []
 
   async def _call_llm(self, messages: List[dict]) -> str:
-    url = f"{self.base}/chat/completions"
-    payload = {"model": self.model, "messages": messages}
-    async with httpx.AsyncClient(timeout=60.0) as client:
-      r = await client.post(
-        url,
-        json=payload,
-        headers={"Authorization": f"Bearer {self.key}", "Content-Type": "application/json"},
+    cache_key = ResponseCache.key(self.model, messages)
+    sources = _llm_sources.get()
+    # 探测请求要真打一次上游，命中缓存说明不了服务恢复没有
+    cached = None if _probing_call.get() else await response_cache.aget(cache_key)
+    if cached is not None:
+      metrics.CACHE_REQUESTS.inc(cache="llm_response", result="hit")
+      if sources is not None:
+        sources.append("cache")
+      return cached
+    metrics.CACHE_REQUESTS.inc(cache="llm_response", result="miss")
+
+    async with llm_limiter.slot(self.timeout):
+      start = time.perf_counter()
+      outcome = "error"
+      data: dict = {}
+      error: Optional[str] = None
+      status: Optional[int] = None
+      try:
+        data = await self.provider.complete(self.model, messages, self.timeout)
+        outcome = "ok"
+      except Exception as e:
+        error = type(e).__name__
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        raise
+      finally:
+        elapsed = time.perf_counter() - start
+        metrics.LLM_LATENCY.observe(elapsed, model=self.model, outcome=outcome)
+        breaker.record(outcome == "ok")
+        if recorder is not None:
+          self._record(messages, data, elapsed, error, status)
+    if sources is not None:
+      sources.append("llm")
+    usage = data.get("usage") or {}
+    for kind in ("prompt", "completion"):
+      n = usage.get(f"{kind}_tokens")
+      if isinstance(n, int):
+        metrics.LLM_TOKENS.inc(n, model=self.model, kind=kind)
+    content = _content_of(data)
+    if content:
+      await response_cache.aput(cache_key, content)
+    return content
+
+  def _record(self, messages: List[dict], data: dict, elapsed: float, error: Optional[str], status: Optional[int]) -> None:
+    from .llm_sim import prompt_key
+
+    try:
+      recorder.record_llm(
+        key=prompt_key(messages),
+        method=_current_method.get(),
+        model=self.model,
+        provider=getattr(self.provider, "name", ""),
+        messages=messages,
+        response=_content_of(data) if data else "",
+        latency=elapsed,
+        usage=data.get("usage") if data else None,
+        error=error,
+        status=status,
       )
-      r.raise_for_status()
-      data = r.json()
-      return (data.get("choices") or [{}])[0].get("message", {}).get("content", "") or ""
+    except Exception:  # 录制失败不影响正常调用
+      pass
 
-  async def generate_mindmap(self, idea_text: str) -> List[NodeDraft]:
+  async def _run(self, method: str, call: Callable[[], Awaitable[Any]], stub: Callable[[], Any]) -> Any:
+    """统一入口：决定走模型还是 stub，出错退回 stub，并把来源 / 耗时 / 错误类型记下来。"""
+    start = time.perf_counter()
+    error: Optional[str] = None
+    source = "stub"
+    probe = breaker.admit() if self.has_real_api else 0
     if not self.has_real_api:
-      return self._generate_stub_mindmap(idea_text)
-    try:
+      error = "no_api"
+    elif probe is None:
+      error = "circuit_open"
+    else:
+      token = _llm_sources.set([])
+      method_token = _current_method.set(method)
+      probe_token = _probing_call.set(bool(probe))
+      try:
+        value = await call()
+        # 一次方法里可能调多次模型，只要有一次真发出去就算 llm
+        source = "llm" if "llm" in (_llm_sources.get() or []) else "cache"
+      except BadOutput:
+        error = "bad_output"
+      except Exception as e:
+        error = type(e).__name__
+      finally:
+        _probing_call.reset(probe_token)
+        _current_method.reset(method_token)
+        _llm_sources.reset(token)
+        if probe:
+          breaker.release_probe(probe)
+    if error is not None:
+      value = stub()
+      metrics.AI_STUB_FALLBACKS.inc(method=method, reason=error)
+    result = AICallResult(method=method, source=source, latency=time.perf_counter() - start, error=error, value=value)
+    self.calls.append(result)
+    metrics.record_ai_call(result)
+    return value
+
+  async def generate_mindmap(self, idea_text: str) -> List[NodeDraft]:
+    async def call() -> List[NodeDraft]:
       prompt = f"""根据以下项目构想，生成一个3层思维导图节点列表。
 要求：
 - 输出一个 JSON 数组，每个元素为 {{ "level": 0或1或2或3, "title": "节点标题", "question": "该节点的问题", "parent_index": null或父节点在数组中的下标 }}。
@@ -75,37 +421,34 @@ class AIClient:
         if level == 0:
           parent_index = None
         drafts.append(NodeDraft(level=level, title=title, question=question, parent_index=parent_index))
-      if len(drafts) >= 8:
-        return drafts
-    except Exception:
-      pass
-    return self._generate_stub_mindmap(idea_text)
+      if len(drafts) < 8:
+        raise BadOutput("too few nodes")
+      return drafts
+
+    return await self._run("generate_mindmap", call, lambda: self._generate_stub_mindmap(idea_text))
 
   async def make_short_title(self, question: str) -> str:
     """基于问题内容，用 AI 生成不超过 7 字的简短标题；无 API 时退回前 7 字。"""
     q = (question or "").strip()
     if not q:
       return "节点"
-    if not self.has_real_api:
-      return q[:7]
-    try:
+
+    async def call() -> str:
       prompt = f"""下面是一条项目脑图中的问题，请你基于它的含义，用不超过 7 个汉字起一个简短、概括性的标题。
 要求：不要加引号、句号或问号，不要超过 7 个字，尽量是名词或短语。只输出标题本身。
 
 问题：{q[:300]}
 标题："""
       content = (await self._call_llm([{"role": "user", "content": prompt}])).strip()
-      title = content.splitlines()[0].strip(" 《》\"'""''").strip()
+      title = content.splitlines()[0].strip(" 《》\"'""''").strip() if content else ""
       if not title:
-        return q[:7]
+        raise BadOutput("empty title")
       return title[:7]
-    except Exception:
-      return q[:7]
+
+    return await self._run("make_short_title", call, lambda: q[:7])
 
   async def judge_node_completeness(self, node_question: str, answer: str) -> bool:
-    if not self.has_real_api:
-      return len(answer.strip()) >= 20
-    try:
+    async def call() -> bool:
       prompt = f"""以下是一个脑图节点的问题和用户的回答。请判断回答是否足够完善（信息充足、无关键缺失）。只回答 YES 或 NO。
 
 问题：{node_question[:500]}
@@ -113,18 +456,30 @@ class AIClient:
 回答：{answer[:1000]}"""
       content = (await self._call_llm([{"role": "user", "content": prompt}])).strip().upper()
       return "YES" in content or "是" in content
-    except Exception:
-      return len(answer.strip()) >= 20
 
-  async def merge_project_doc(self, title: str, idea_text: str, qa_sections: List[str]) -> str:
-    if not self.has_real_api:
-      return self._merge_stub(title, idea_text, qa_sections)
-    try:
-      full = f"# {title}\n\n## 原始项目构想\n\n{idea_text or '(无)'}\n\n## 节点问答总结\n\n" + "\n".join(qa_sections)
-      prompt = f"""请将以下内容整合成一篇完整的项目文档（Markdown）。要求：保持用户原意，可优化表述与结构，不要篡改用户原始内容。直接输出整篇文档。\n\n{full[:8000]}"""
-      return (await self._call_llm([{"role": "user", "content": prompt}])).strip() or self._merge_stub(title, idea_text, qa_sections)
-    except Exception:
-      return self._merge_stub(title, idea_text, qa_sections)
+    return await self._run("judge_node_completeness", call, lambda: len(answer.strip()) >= 20)
+
+  async def merge_section(self, title: str, idea_text: str, heading: str, qa_lines: List[str]) -> str:
+    """把一个一级分支下的问答整理成文档里的一章（以「## 分支标题」开头），整篇由 services 拼。"""
+
+    async def call() -> str:
+      body = "\n".join(qa_lines)
+      prompt = f"""以下是项目「{title}」脑图中一个分支的节点问答，请把它整理成项目文档中的一个章节（Markdown）。
+要求：以二级标题「## {heading}」开头；保持用户原意，可优化表述与结构，不要篡改用户原始内容；只输出这一章。
+
+项目构想（供参考）：
+{(idea_text or '(无)')[:1000]}
+
+分支问答：
+{body[:6000]}"""
+      content = (await self._call_llm([{"role": "user", "content": prompt}])).strip()
+      if not content:
+        raise BadOutput("empty section")
+      if not content.startswith("#"):
+        content = f"## {heading}\n\n{content}"
+      return content
+
+    return await self._run("merge_section", call, lambda: self._merge_section_stub(heading, qa_lines))
 
   async def make_tips_candidates(
     self, project_idea: str, node_question: str, latest_answer: str
@@ -133,15 +488,8 @@ class AIClient:
     基于项目主题 + 当前节点问题 + 最新回答，生成 2~3 条 Tips 建议文本。
     返回纯文本列表，每条为一段完整提示语。
     """
-    if not self.has_real_api:
-      # stub：简单返回几条固定提示
-      base = (node_question or "").strip() or "该节点"
-      return [
-        f"{base} · 可参考一些业界最佳实践。",
-        f"{base} · 结合你的目标用户举 1~2 个具体例子。",
-        f"{base} · 想一想有哪些潜在风险或约束条件需要事先列出来。",
-      ][:3]
-    try:
+
+    async def call() -> List[str]:
       prompt = f"""项目背景：
 {project_idea[:800]}
 
@@ -161,24 +509,61 @@ class AIClient:
 """
       content = (await self._call_llm([{"role": "user", "content": prompt}])).strip()
       lines = [ln.strip() for ln in content.splitlines() if ln.strip()]
-      # 取前 3 条非空行
       if not lines:
-        return [
-          "可以先从目标、用户、场景三个角度，各写一两句文字补充说明。",
-          "尝试回顾类似项目的经验，整理 1~2 条你认为最关键的成功要素。",
-        ]
+        raise BadOutput("no tips")
+      # 取前 3 条非空行
       return lines[:3]
-    except Exception:
+
+    def stub() -> List[str]:
+      if not self.has_real_api:
+        # stub：简单返回几条固定提示
+        base = (node_question or "").strip() or "该节点"
+        return [
+          f"{base} · 可参考一些业界最佳实践。",
+          f"{base} · 结合你的目标用户举 1~2 个具体例子。",
+          f"{base} · 想一想有哪些潜在风险或约束条件需要事先列出来。",
+        ][:3]
       return [
         "可以先从目标、用户、场景三个角度，各写一两句文字补充说明。",
         "尝试回顾类似项目的经验，整理 1~2 条你认为最关键的成功要素。",
       ]
 
+    return await self._run("make_tips_candidates", call, stub)
+
+  async def draft_node_answer(
+    self, project_idea: str, node_question: str, context: Optional[List[Tuple[str, str]]] = None
+  ) -> str:
+    """AI 代答一个问题节点（自动作答用）。context 是祖先节点的 (问题, 回答)，由浅到深。"""
+
+    async def call() -> str:
+      known = ""
+      if context:
+        known = "\n\n上层问题和已有回答：\n" + "\n".join(f"- {q[:100]}：{a[:300]}" for q, a in context[-4:])
+      prompt = f"""项目背景：
+{project_idea[:800]}{known}
+
+请代替项目负责人，直接回答下面这个问题：
+{node_question[:400]}
+
+要求：
+- 结合项目背景和上层回答，给出具体、可执行的内容，不要反问；
+- 用自然中文，不超过 150 字；
+- 只输出回答正文，不要标题、编号或额外解释。"""
+      content = (await self._call_llm([{"role": "user", "content": prompt}])).strip()
+      if not content:
+        raise BadOutput("empty answer")
+      return content[:1000]
+
+    def stub() -> str:
+      base = (node_question or "").strip().rstrip("？?") or "这个问题"
+      return f"关于「{base[:40]}」：先在一个小范围内试点，明确目标用户和可量化的完成标准，再逐步扩大。"
+
+    return await self._run("draft_node_answer", call, stub)
+
   async def draft_analyze_and_reply(self, messages: List[dict]) -> dict:
     """立项阶段：只澄清「问题本质」，不问受众/细节。本质清晰后返回 ready + 标题；初题留到进脑图时再生成。"""
-    if not self.has_real_api:
-      return self._draft_stub(messages)
-    try:
+
+    async def call() -> dict:
       conv = "\n".join([f"{m.get('role','')}: {m.get('content','')}" for m in messages])
       prompt = f"""你正在帮助用户澄清一个项目构想的「本质」——即这件事到底是什么、朝哪个方向做。
 
@@ -209,8 +594,8 @@ B) 若已能明确概括出项目本质（能写出一个清晰的项目标题
             "initial_questions": [],  # 初题在 create_project 时由另一套提示词生成
           }
       return {"need_more": True, "reply": content[:2000]}
-    except Exception:
-      return self._draft_stub(messages)
+
+    return await self._run("draft_analyze_and_reply", call, lambda: self._draft_stub(messages))
 
   def _draft_stub(self, messages: List[dict]) -> dict:
     user_text = " ".join([m.get("content", "") for m in messages if m.get("role") == "user"])
@@ -229,9 +614,8 @@ B) 若已能明确概括出项目本质（能写出一个清晰的项目标题
 
   async def generate_initial_mindmap_questions(self, idea_text: str, title: str) -> List[str]:
     """进入脑图后专用：根据已澄清的项目本质，生成 2～3 个供工作台使用的关键疑问或可行性质疑（可含受众、场景、风险等）。"""
-    if not self.has_real_api:
-      return self._initial_mindmap_questions_stub(idea_text, title)
-    try:
+
+    async def call() -> List[str]:
       prompt = f"""项目标题：{title[:100]}
 
 用户在与我们澄清「项目本质」时的对话摘要或描述：
@@ -244,11 +628,13 @@ B) 若已能明确概括出项目本质（能写出一个清晰的项目标题
       content = re.sub(r"^.*?\[", "[", content)
       content = re.sub(r"\].*$", "]", content)
       arr = json.loads(content)
-      if isinstance(arr, list):
-        return [str(q)[:200] for q in arr[:3] if str(q).strip()]
-      return self._initial_mindmap_questions_stub(idea_text, title)
-    except Exception:
-      return self._initial_mindmap_questions_stub(idea_text, title)
+      if not isinstance(arr, list):
+        raise BadOutput("not a list")
+      return [str(q)[:200] for q in arr[:3] if str(q).strip()]
+
+    return await self._run(
+      "generate_initial_mindmap_questions", call, lambda: self._initial_mindmap_questions_stub(idea_text, title)
+    )
 
   def _initial_mindmap_questions_stub(self, idea_text: str, title: str) -> List[str]:
     return [
@@ -259,16 +645,19 @@ B) 若已能明确概括出项目本质（能写出一个清晰的项目标题
 
   async def node_answer_judge_and_followups(
     self, project_idea: str, node_question: str, user_answer: str, current_level: int,
+    existing: Optional[List[str]] = None,
   ) -> dict:
-    """判定回答是否充分，并生成 1-2 个追问子问题（用于扩展脑图）。"""
-    if not self.has_real_api:
-      return self._node_followup_stub(node_question, user_answer, current_level)
-    try:
+    """判定回答是否充分，并生成 1-2 个追问子问题（用于扩展脑图）。existing 是节点下已有的追问，提示模型别再问。"""
+
+    async def call() -> dict:
+      avoid = ""
+      if existing:
+        avoid = "\n\n该节点下已有这些追问，新的追问不要与之重复：\n" + "\n".join(f"- {q[:100]}" for q in existing[:10])
       prompt = f"""项目背景：{project_idea[:800]}
 
 当前节点问题：{node_question[:400]}
 
-用户回答：{user_answer[:1000]}
+用户回答：{user_answer[:1000]}{avoid}
 
 请判断用户回答是否已足够清晰、可据此推进（信息充足、无关键缺失）。然后：
 1) 若已足够，只输出：{{"sufficient":true}}
@@ -284,8 +673,12 @@ B) 若已能明确概括出项目本质（能写出一个清晰的项目标题
         followups = []
       followups = [str(q)[:200] for q in followups[:2]]
       return {"sufficient": sufficient, "followup_questions": followups}
-    except Exception:
-      return self._node_followup_stub(node_question, user_answer, current_level)
+
+    return await self._run(
+      "node_answer_judge_and_followups",
+      call,
+      lambda: self._node_followup_stub(node_question, user_answer, current_level),
+    )
 
   def _node_followup_stub(self, node_question: str, user_answer: str, current_level: int) -> dict:
     sufficient = len(user_answer.strip()) >= 25
@@ -373,23 +766,7 @@ B) 若已能明确概括出项目本质（能写出一个清晰的项目标题
 
     return drafts
 
-  def _merge_stub(self, title: str, idea_text: str, qa_sections: List[str]) -> str:
-    parts: List[str] = []
-    parts.append(f"# {title} - 融合项目文档（Demo）")
-    parts.append("")
-    parts.append("## 一、原始项目构想")
-    parts.append("")
-    parts.append(idea_text or "(无)")
-    parts.append("")
-    parts.append("## 二、脑图节点问答总结")
-    parts.extend(qa_sections)
-    parts.append("")
-    parts.append("## 三、说明")
-    parts.append("")
-    parts.append(
-      "本文档由 Demo 内置规则自动拼接生成，未接入真实大模型；"
-      "在正式环境中，可在保持不篡改你原始意图的前提下，使用大模型优化结构与表述。"
-    )
-    return "\n".join(parts)
+  def _merge_section_stub(self, heading: str, qa_lines: List[str]) -> str:
+    return "\n".join([f"## {heading}", ""] + qa_lines).rstrip()
 
 
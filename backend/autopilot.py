@@ -0,0 +1,260 @@
+"""
+AI 自动作答（autopilot）：把项目里所有红色问题交给模型代答，不用前端一个个点。
+
+- 开始时按先序拍一份红色问题清单（最多 AUTOPILOT_MAX_NODES 个，默认 500），之后新加的节点不管；
+- 并发代答，同时最多 AUTOPILOT_CONCURRENCY 个（默认 8，另外还受 AI_MAX_CONCURRENCY 的全局名额限制）；
+  祖先也在清单里的问题先等祖先答完，代答时带上祖先的问答，父先于子；
+- 答好的攒够 AUTOPILOT_BATCH 条（默认 10）或每隔 AUTOPILOT_FLUSH 秒（默认 1）落一次库，
+  走 services.answer_nodes_batch，一批一个事务，节点增量照常推给 WebSocket；
+  落库前再看一眼，用户这期间自己答过的问题就不覆盖了；
+- 进度：GET 轮询，或者 WebSocket 上 type=autopilot 的消息；
+- 取消后不再发新的调用，已经答好没落库的照样存上；
+- 模型出错退回 stub 的不存（没配 key 时 stub 就是正常结果，照存）；
+- 任务只在本进程，每个项目只留最近一次；结束的任务留 AUTOPILOT_KEEP 秒（默认 3600）供查询，
+  最多留 AUTOPILOT_KEEP_MAX 个（默认 1000），超了先删结束得早的；多 worker 时查询 / 取消要落到同一个 worker 上。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlmodel import Session, select
+
+from .ai_client import AIClient
+from .cache import dumps
+from .db import engine
+from .events import broker
+from .models import Node, NodeAnswer, Project
+from .services import _is_question, answer_nodes_batch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AutopilotJob:
+  id: str
+  project_id: str
+  status: str = "running"  # running / done / cancelled / failed
+  total: int = 0  # 清单里的问题数
+  generated: int = 0  # 已代答
+  saved: int = 0  # 已落库
+  skipped: int = 0  # 落库前发现用户已经答过
+  failed: int = 0  # 模型出错，没代答
+  error: Optional[str] = None
+  started_at: datetime = field(default_factory=datetime.utcnow)
+  finished_at: Optional[datetime] = None
+  task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+  def to_dict(self) -> dict:
+    return {
+      "id": self.id,
+      "project_id": self.project_id,
+      "status": self.status,
+      "total": self.total,
+      "generated": self.generated,
+      "saved": self.saved,
+      "skipped": self.skipped,
+      "failed": self.failed,
+      "error": self.error,
+      "started_at": self.started_at,
+      "finished_at": self.finished_at,
+    }
+
+
+def _load_plan(project_id: str, limit: int) -> Tuple[str, Dict[str, Node], List[Node], Dict[str, str]]:
+  """(构想, 全部节点, 待答的红色问题（先序）, 节点最近一条回答)。"""
+  with Session(engine) as session:
+    project = session.get(Project, project_id)
+    if project is None:
+      raise ValueError("project_not_found")
+    nodes = session.exec(select(Node).where(Node.project_id == project_id).order_by(Node.dfs_key)).all()
+    rows = session.exec(
+      select(NodeAnswer.node_id, NodeAnswer.content)
+      .join(Node, Node.id == NodeAnswer.node_id)
+      .where(Node.project_id == project_id)
+      .order_by(NodeAnswer.id)
+    ).all()
+    open_nodes = [n for n in nodes if n.status == "red" and _is_question(n)][:limit]
+    return project.idea_text, {n.id: n for n in nodes}, open_nodes, dict(rows)
+
+
+class Autopilot:
+  def __init__(
+    self,
+    concurrency: int = 8,
+    batch_size: int = 10,
+    flush_interval: float = 1.0,
+    max_nodes: int = 500,
+    keep_seconds: float = 3600.0,
+    keep_max: int = 1000,
+  ) -> None:
+    self.concurrency = max(1, concurrency)
+    self.batch_size = max(1, batch_size)
+    self.flush_interval = flush_interval
+    self.max_nodes = max_nodes
+    self.keep_seconds = keep_seconds
+    self.keep_max = keep_max
+    self._jobs: Dict[str, AutopilotJob] = {}  # project_id -> 最近一次任务
+
+  @classmethod
+  def from_env(cls) -> "Autopilot":
+    return cls(
+      int(os.getenv("AUTOPILOT_CONCURRENCY") or 8),
+      int(os.getenv("AUTOPILOT_BATCH") or 10),
+      float(os.getenv("AUTOPILOT_FLUSH") or 1.0),
+      int(os.getenv("AUTOPILOT_MAX_NODES") or 500),
+      float(os.getenv("AUTOPILOT_KEEP") or 3600),
+      int(os.getenv("AUTOPILOT_KEEP_MAX") or 1000),
+    )
+
+  def get(self, project_id: str) -> Optional[AutopilotJob]:
+    return self._jobs.get(project_id)
+
+  def _evict(self) -> None:
+    """删掉结束太久的任务；结束的任务还是太多就从结束得最早的删起。"""
+    now = datetime.utcnow()
+    finished = [j for j in self._jobs.values() if j.finished_at is not None]
+    expired = [j for j in finished if (now - j.finished_at).total_seconds() > self.keep_seconds]
+    finished = sorted((j for j in finished if j not in expired), key=lambda j: j.finished_at)
+    for job in expired + finished[: max(0, len(finished) - self.keep_max)]:
+      if self._jobs.get(job.project_id) is job:
+        del self._jobs[job.project_id]
+
+  async def start(self, project_id: str) -> AutopilotJob:
+    """开一个任务；这个项目已经有在跑的就直接返回那个。项目不存在抛 ValueError("project_not_found")。"""
+    self._evict()
+    job = self._jobs.get(project_id)
+    if job is not None and job.status == "running":
+      return job
+    # 读整棵树是同步的 DB 操作，放线程池里做，别卡住事件循环
+    plan = await asyncio.get_running_loop().run_in_executor(None, _load_plan, project_id, self.max_nodes)
+    job = self._jobs.get(project_id)
+    if job is not None and job.status == "running":
+      return job  # 等读库的时候别的请求已经开了一个
+    job = AutopilotJob(id=uuid4().hex, project_id=project_id, total=len(plan[2]))
+    # 和预取一样用空的 context 跑，模型调用别算到发起它的请求头上
+    job.task = asyncio.get_running_loop().create_task(self._run(job, plan), context=contextvars.Context())
+    self._jobs[project_id] = job
+    return job
+
+  async def cancel(self, project_id: str) -> Optional[AutopilotJob]:
+    """取消并等它把已答好的存完。"""
+    job = self._jobs.get(project_id)
+    if job is not None and job.task is not None and not job.task.done():
+      job.task.cancel()
+      await asyncio.wait({job.task})
+    return job
+
+  async def cancel_all(self) -> None:
+    """关停时用：全部取消，等它们把已答好的存完再返回，之后才能关连接池和引擎。"""
+    tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+    for task in tasks:
+      task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+  async def _publish(self, job: AutopilotJob) -> None:
+    if broker.wants(job.project_id):
+      await broker.publish(job.project_id, dumps({"type": "autopilot", **job.to_dict()}).decode("utf-8"))
+
+  async def _save(self, job: AutopilotJob, items: List[Tuple[str, str, bool]]) -> None:
+    with Session(engine) as session:
+      ids = [node_id for node_id, _, _ in items]
+      still_open = set(session.exec(select(Node.id).where(Node.id.in_(ids), Node.status == "red")).all())
+      keep = [it for it in items if it[0] in still_open]
+      if keep:
+        await answer_nodes_batch(session, job.project_id, keep)
+    job.saved += len(keep)
+    job.skipped += len(items) - len(keep)
+    await self._publish(job)
+
+  async def _run(self, job: AutopilotJob, plan: Tuple[str, Dict[str, Node], List[Node], Dict[str, str]]) -> None:
+    unsaved: List[Tuple[str, str, bool]] = []
+    wake = asyncio.Event()
+    state = {"finished": False}
+    workers: List[asyncio.Task] = []
+    writer_task: Optional[asyncio.Task] = None
+    try:
+      idea, by_id, open_nodes, answers = plan
+      await self._publish(job)
+      events = {n.id: asyncio.Event() for n in open_nodes}
+      drafted: Dict[str, str] = {}
+      slots = asyncio.Semaphore(self.concurrency)
+
+      def ancestors(n: Node) -> List[Node]:
+        """由浅到深。"""
+        out: List[Node] = []
+        pid = n.parent_id
+        while pid and pid in by_id:
+          out.append(by_id[pid])
+          pid = by_id[pid].parent_id
+        return out[::-1]
+
+      async def answer_one(n: Node) -> None:
+        try:
+          ups = ancestors(n)
+          for p in ups:
+            if p.id in events:
+              await events[p.id].wait()
+          context = [(p.question, drafted.get(p.id) or answers[p.id]) for p in ups if p.id in drafted or p.id in answers]
+          async with slots:
+            client = AIClient()
+            text = await client.draft_node_answer(idea, n.question, context)
+          if client.calls and client.calls[-1].degraded:
+            job.failed += 1
+            return
+          drafted[n.id] = text
+          job.generated += 1
+          unsaved.append((n.id, text, True))
+          if len(unsaved) >= self.batch_size:
+            wake.set()
+        finally:
+          events[n.id].set()
+
+      async def writer() -> None:
+        while True:
+          try:
+            await asyncio.wait_for(wake.wait(), self.flush_interval)
+          except asyncio.TimeoutError:
+            pass
+          wake.clear()
+          while unsaved:
+            batch = unsaved[: self.batch_size]
+            del unsaved[: len(batch)]
+            await self._save(job, batch)
+          if state["finished"]:
+            return
+
+      workers = [asyncio.ensure_future(answer_one(n)) for n in open_nodes]
+      writer_task = asyncio.ensure_future(writer())
+      await asyncio.gather(*workers)
+      state["finished"] = True
+      wake.set()
+      await writer_task
+      job.status = "done"
+    except asyncio.CancelledError:
+      for t in workers + ([writer_task] if writer_task else []):
+        t.cancel()
+      # 已经答好的别白算；这里的 DB 操作不会被再取消打断（commit 之前没有 await）
+      if unsaved:
+        await self._save(job, list(unsaved))
+      job.status = "cancelled"
+    except Exception as e:
+      for t in workers + ([writer_task] if writer_task else []):
+        t.cancel()
+      logger.warning("autopilot for %s failed: %s", job.project_id, e)
+      job.status = "failed"
+      job.error = str(e) or type(e).__name__
+    finally:
+      job.finished_at = datetime.utcnow()
+      await self._publish(job)
+      self._evict()
+
+
+autopilot = Autopilot.from_env()
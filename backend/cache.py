@@ -0,0 +1,79 @@
+"""
+项目详情的序列化缓存：同一个 (project_id, revision) 只序列化一次，之后直接回 bytes。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+try:  # orjson 可选：装了就用，没装退回标准库 json
+  import orjson
+except ImportError:  # pragma: no cover
+  orjson = None
+
+
+def _json_default(obj: Any) -> Any:
+  if isinstance(obj, datetime):
+    return obj.isoformat()
+  raise TypeError(f"not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+  if orjson is not None:
+    return orjson.dumps(obj)
+  return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def project_etag(project_id: str, revision: int) -> str:
+  return f'"{project_id}-{revision}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+  """If-None-Match 可能是逗号分隔的多个值，也可能带 W/ 前缀。"""
+  if not if_none_match:
+    return False
+  for tag in if_none_match.split(","):
+    tag = tag.strip()
+    if tag == "*" or tag.removeprefix("W/") == etag:
+      return True
+  return False
+
+
+class PayloadCache:
+  """每个项目只留最新 revision 的一份 bytes；项目数按 LRU 封顶。"""
+
+  def __init__(self, max_projects: int = 256) -> None:
+    self.max_projects = max_projects
+    self._items: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, project_id: str, revision: int) -> Optional[bytes]:
+    with self._lock:
+      item = self._items.get(project_id)
+      if item is None or item[0] != revision:
+        return None
+      self._items.move_to_end(project_id)
+      return item[1]
+
+  def put(self, project_id: str, revision: int, body: bytes) -> None:
+    with self._lock:
+      cur = self._items.get(project_id)
+      # 并发请求里慢的那个可能拿着旧 revision 回来，别把新的覆盖掉
+      if cur is not None and cur[0] > revision:
+        return
+      self._items[project_id] = (revision, body)
+      self._items.move_to_end(project_id)
+      while len(self._items) > self.max_projects:
+        self._items.popitem(last=False)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._items.clear()
+
+
+project_payload_cache = PayloadCache(int(os.getenv("PROJECT_CACHE_SIZE", "256") or 256))
@@ -0,0 +1,153 @@
+"""
+响应压缩：按 Accept-Encoding 给 API 响应现压 br / gzip。
+
+- 比 COMPRESS_MIN_SIZE（默认 1KB）小的、已经带 Content-Encoding 的（预压缩的静态资源）、
+  非文本类型和 SSE 都原样放行；
+- 一次性返回的 body 直接整块压；分块流式的 body 边收边压，每块 flush，下游照样能边收边解；
+- 压过的响应 ETag 改成弱 ETag（W/...），If-None-Match 比较时会忽略前缀。
+brotli 是可选依赖，没装就只用 gzip。
+"""
+
+from __future__ import annotations
+
+import os
+import zlib
+from typing import List, Optional, Tuple
+
+_COMPRESSIBLE = ("text/", "application/json", "application/javascript", "application/xml", "+json", "+xml", "application/x-ndjson")
+
+
+def _brotli():
+  try:
+    import brotli  # 可选依赖
+  except ImportError:
+    return None
+  return brotli
+
+
+def pick_encoding(accept_encoding: str, available) -> str:
+  """按 Accept-Encoding 挑：br 优先，其次 gzip；q=0 的视为不接受。"""
+  accepted = {}
+  for part in (accept_encoding or "").split(","):
+    name, _, params = part.strip().partition(";")
+    q = 1.0
+    params = params.strip()
+    if params.startswith("q="):
+      try:
+        q = float(params[2:])
+      except ValueError:
+        q = 0.0
+    if name:
+      accepted[name.strip().lower()] = q
+  for enc in ("br", "gzip"):
+    if enc in available and (accepted.get(enc, accepted.get("*", 0.0)) > 0):
+      return enc
+  return "identity"
+
+
+def available_encodings() -> Tuple[str, ...]:
+  return ("br", "gzip") if _brotli() is not None else ("gzip",)
+
+
+class _Compressor:
+  def __init__(self, encoding: str, gzip_level: int, brotli_quality: int) -> None:
+    self.encoding = encoding
+    if encoding == "br":
+      self._br = _brotli().Compressor(quality=brotli_quality)
+    else:
+      self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+  def chunk(self, data: bytes, final: bool) -> bytes:
+    if self.encoding == "br":
+      out = self._br.process(data)
+      return out + (self._br.finish() if final else self._br.flush())
+    out = self._gz.compress(data)
+    return out + self._gz.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+  for k, v in headers:
+    if k.lower() == name:
+      return v
+  return None
+
+
+class CompressionMiddleware:
+  def __init__(
+    self,
+    app,
+    minimum_size: Optional[int] = None,
+    gzip_level: int = 6,
+    brotli_quality: int = 5,
+  ) -> None:
+    self.app = app
+    self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("COMPRESS_MIN_SIZE", "1024") or 1024)
+    self.gzip_level = gzip_level
+    # 动态内容用中等档位：quality 11 压得最小但慢几十倍，留给预压缩的静态资源
+    self.brotli_quality = brotli_quality
+    self.encodings = available_encodings()
+
+  async def __call__(self, scope, receive, send) -> None:
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+    request_headers = dict(scope.get("headers") or [])
+    encoding = pick_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"), self.encodings)
+    if encoding == "identity":
+      await self.app(scope, receive, send)
+      return
+
+    state = {"start": None, "compressor": None, "passthrough": False}
+
+    async def send_wrapper(message) -> None:
+      if message["type"] == "http.response.start":
+        # 等第一块 body 到了才知道多大、要不要压
+        state["start"] = message
+        return
+      if message["type"] != "http.response.body" or state["passthrough"]:
+        await send(message)
+        return
+
+      body = message.get("body", b"")
+      more = message.get("more_body", False)
+      if state["compressor"] is None:
+        start = state["start"]
+        headers = list(start.get("headers") or [])
+        content_type = (_header(headers, b"content-type") or b"").decode("latin-1").lower()
+        skip = (
+          start["status"] < 200
+          or start["status"] in (204, 304)
+          or _header(headers, b"content-encoding") is not None
+          or not any(t in content_type for t in _COMPRESSIBLE)
+          or content_type.startswith("text/event-stream")
+          or (not more and len(body) < self.minimum_size)
+        )
+        if skip:
+          state["passthrough"] = True
+          await send(start)
+          await send(message)
+          return
+        state["compressor"] = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+        out = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"etag")]
+        etag = _header(headers, b"etag")
+        if etag is not None:
+          out.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+        vary = _header(headers, b"vary")
+        out = [(k, v) for k, v in out if k.lower() != b"vary"]
+        out.append((b"vary", (vary + b", Accept-Encoding") if vary else b"Accept-Encoding"))
+        out.append((b"content-encoding", encoding.encode()))
+        if not more:
+          data = state["compressor"].chunk(body, final=True)
+          out.append((b"content-length", str(len(data)).encode()))
+          await send({**start, "headers": out})
+          await send({"type": "http.response.body", "body": data})
+          return
+        await send({**start, "headers": out})
+      data = state["compressor"].chunk(body, final=not more)
+      await send({"type": "http.response.body", "body": data, "more_body": more})
+
+    await self.app(scope, receive, send_wrapper)
+    if state["start"] is not None and state["compressor"] is None and not state["passthrough"]:
+      # 只有 start 没有 body 的响应（极少见），原样补发出去
+      await send(state["start"])
+      await send({"type": "http.response.body", "body": b""})
@@ -1,22 +1,181 @@
-from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import Column, Integer, MetaData, String, Table, inspect, text
+from sqlmodel import SQLModel, create_engine, Session, select
+import hashlib
+import json
 import os
 
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./mindmap.db")
+def _normalize_url(url: str) -> str:
+  """postgres:// 和不带驱动名的 postgresql:// 统一走 psycopg 3（服务端预处理语句靠它）。"""
+  if url.startswith("postgres://"):
+    url = "postgresql://" + url[len("postgres://"):]
+  if url.startswith("postgresql://"):
+    url = "postgresql+psycopg://" + url[len("postgresql://"):]
+  return url
 
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
 
+def _env_int(key: str, default: int) -> int:
+  try:
+    return int(os.getenv(key) or default)
+  except ValueError:
+    return default
 
-def init_db() -> None:
-  """建表；会顺带 import models 把表结构注册上。"""
-  from . import models  # noqa: F401
+
+def _engine_kwargs(url: str) -> dict:
+  """
+  SQLite：单文件，连接跨线程用。
+  其他库（生产上是 Postgres）：连接池大小 / 溢出 / 借连接超时 / 定期回收可配，借出前 ping 一下，
+  防止数据库重启或中间件掐掉空闲连接后拿到死连接。
+  """
+  if url.startswith("sqlite"):
+    return {"connect_args": {"check_same_thread": False}}
+  kwargs = {
+    "pool_size": _env_int("DB_POOL_SIZE", 10),
+    "max_overflow": _env_int("DB_MAX_OVERFLOW", 20),
+    "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+    "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+    "pool_pre_ping": True,
+  }
+  if url.startswith("postgresql+psycopg"):
+    # 同一条 SQL 在一个连接上执行到第 N 次起改用服务端预处理语句；
+    # 前面挂了事务模式的 pgbouncer 时设 DB_PREPARE_THRESHOLD=off 关掉
+    threshold = (os.getenv("DB_PREPARE_THRESHOLD") or "5").strip().lower()
+    kwargs["connect_args"] = {
+      "prepare_threshold": None if threshold in ("off", "none") else int(threshold),
+      "application_name": "mindmap",
+    }
+  return kwargs
+
+
+DATABASE_URL = _normalize_url(os.getenv("DATABASE_URL", "sqlite:///./mindmap.db"))
+
+engine = create_engine(
+  DATABASE_URL,
+  echo=False,
+  # JSON 列里多是中文，别转成 \uXXXX
+  json_serializer=lambda obj: json.dumps(obj, ensure_ascii=False),
+  **_engine_kwargs(DATABASE_URL),
+)
+
+
+def _add_missing_columns() -> set:
+  """create_all 不会改已有表：老库缺的新列在这里用 ALTER TABLE 补上，返回补了哪些 (表, 列)。"""
+  added = set()
+  insp = inspect(engine)
+  with engine.begin() as conn:
+    for table in SQLModel.metadata.sorted_tables:
+      if not insp.has_table(table.name):
+        continue
+      existing = {c["name"] for c in insp.get_columns(table.name)}
+      for col in table.columns:
+        if col.name in existing:
+          continue
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(dialect=engine.dialect)}"
+        default = getattr(col.default, "arg", None)
+        if isinstance(default, (int, float)) and not isinstance(default, bool):
+          ddl += f" DEFAULT {default}"
+        elif isinstance(default, str):
+          ddl += " DEFAULT '" + default.replace("'", "''") + "'"
+        conn.execute(text(ddl))
+        added.add((table.name, col.name))
+  return added
+
+
+def _add_missing_indexes() -> None:
+  """同理，老表上后加的索引也补建一下。"""
+  with engine.begin() as conn:
+    for table in SQLModel.metadata.sorted_tables:
+      for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _migrate_json_columns() -> None:
+  """老的 Postgres 库里 JSON 字段还是 VARCHAR（存的 JSON 文本），原地转成 JSONB。SQLite 不区分，不用动。"""
+  if engine.dialect.name != "postgresql":
+    return
+  insp = inspect(engine)
+  with engine.begin() as conn:
+    for table in SQLModel.metadata.sorted_tables:
+      if not insp.has_table(table.name):
+        continue
+      current = {c["name"]: c["type"] for c in insp.get_columns(table.name)}
+      for col in table.columns:
+        target = col.type.compile(dialect=engine.dialect)
+        if target != "JSONB" or col.name not in current:
+          continue
+        if current[col.name].compile(dialect=engine.dialect) == "JSONB":
+          continue
+        conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {col.name} TYPE JSONB USING {col.name}::jsonb"))
+
+
+# 记录库里表结构对应的指纹，和代码里的一致就跳过建表 / 补列那一串 inspect
+_version_meta = MetaData()
+schema_version = Table(
+  "schema_version",
+  _version_meta,
+  Column("id", Integer, primary_key=True),
+  Column("fingerprint", String(64), nullable=False),
+)
+
+
+def schema_fingerprint() -> str:
+  """按当前模型的表、列（类型 / 可空 / 主键）、索引和检索索引版本算的指纹；改了模型自然就变，不用手工维护版本号。"""
+  from . import search
+
+  parts = []
+  for table in SQLModel.metadata.sorted_tables:
+    parts.append(f"T {table.name}")
+    for col in table.columns:
+      parts.append(f"C {col.name} {col.type.compile(dialect=engine.dialect)} {col.nullable} {col.primary_key}")
+    for index in sorted(table.indexes, key=lambda i: i.name or ""):
+      parts.append(f"I {index.name} {','.join(c.name for c in index.columns)}")
+  parts.append(f"S search {search.INDEX_VERSION}")
+  return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _stored_fingerprint() -> str:
+  try:
+    with engine.connect() as conn:
+      return conn.execute(select(schema_version.c.fingerprint).where(schema_version.c.id == 1)).scalar() or ""
+  except Exception:  # 新库 / 老库还没有这张表
+    return ""
+
+
+def _store_fingerprint(fingerprint: str) -> None:
+  _version_meta.create_all(engine)
+  with engine.begin() as conn:
+    conn.execute(schema_version.delete())
+    conn.execute(schema_version.insert().values(id=1, fingerprint=fingerprint))
+
+
+def init_db(force: bool = False) -> bool:
+  """
+  建表；会顺带 import models 把表结构注册上。
+  库里记录的结构指纹和当前一致时直接返回 False（不做任何 DDL / inspect），否则迁移后返回 True。
+  """
+  from . import models, search  # noqa: F401
+
+  fingerprint = schema_fingerprint()
+  if not force and _stored_fingerprint() == fingerprint:
+    return False
 
   SQLModel.metadata.create_all(engine)
+  added = _add_missing_columns()
+  _add_missing_indexes()
+  _migrate_json_columns()
+  search.ensure_index(engine)
+  if added & {("node", "sub_total"), ("node", "dfs_key")}:
+    # 老库刚加上子树计数 / 先序位置列，按现有节点补算一遍
+    from .services import rebuild_tree_index
+
+    with Session(engine) as session:
+      for project_id in session.exec(select(models.Project.id)).all():
+        rebuild_tree_index(session, project_id)
+      session.commit()
+  _store_fingerprint(fingerprint)
+  return True
 
 
 def get_session() -> Session:
   with Session(engine) as session:
     yield session
-
-
@@ -0,0 +1,198 @@
+"""
+项目级发布 / 订阅：services 改完树之后把节点 diff 推给正在看这个项目的 WebSocket。
+
+默认是进程内广播；多 worker 部署时用 EVENTS_BACKEND=redis://... 走 Redis pub/sub，
+每个 worker 只负责把频道里的消息转给自己进程里的订阅者。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+_CHANNEL_PREFIX = "mindmap:project:"
+_QUEUE_SIZE = 100
+# Redis 断线后重新订阅的退避（秒），和前端 WebSocket 重连一样指数增长
+_RETRY_MIN, _RETRY_MAX = 0.5, 30.0
+
+# 订阅者队列满了（客户端太慢）时塞进去的哨兵消息，收到后前端应整棵重拉
+RESET_MESSAGE = '{"type":"reset"}'
+
+
+class InProcessBackend:
+  """单进程：publish 直接投递给本进程的订阅者。"""
+
+  def __init__(self) -> None:
+    self._broker: Optional["Broker"] = None
+
+  async def start(self, broker: "Broker") -> None:
+    self._broker = broker
+
+  async def stop(self) -> None:
+    self._broker = None
+
+  def wants(self, channel: str) -> bool:
+    # 没人订阅就别费劲拼 diff
+    return self._broker is not None and self._broker.has_subscribers(channel)
+
+  async def publish(self, channel: str, message: str) -> None:
+    if self._broker is not None:
+      self._broker.deliver(channel, message)
+
+
+class RedisBackend:
+  """
+  多 worker：消息发到 Redis 频道，后台任务 psubscribe 后转发给本进程订阅者。
+  client 只要求 redis.asyncio 那几个方法（publish / pubsub），测试时可以换成本地替身。
+  连接断了就退避重连、重新订阅；断开期间的消息收不到了，重新订阅后给本进程所有订阅者发 reset 让它们重拉。
+  """
+
+  def __init__(self, client) -> None:
+    self.client = client
+    self._task: Optional[asyncio.Task] = None
+    self._pubsub = None
+
+  @classmethod
+  def from_url(cls, url: str) -> "RedisBackend":
+    import redis.asyncio as redis  # 可选依赖，只在配置了 redis 时才需要
+
+    return cls(redis.from_url(url, decode_responses=True))
+
+  async def start(self, broker: "Broker") -> None:
+    await self._subscribe()
+    self._task = asyncio.create_task(self._forward(broker))
+
+  async def _subscribe(self) -> None:
+    self._pubsub = self.client.pubsub()
+    await self._pubsub.psubscribe(_CHANNEL_PREFIX + "*")
+
+  async def _close_pubsub(self) -> None:
+    pubsub, self._pubsub = self._pubsub, None
+    if pubsub is None:
+      return
+    try:
+      await pubsub.punsubscribe()
+      await pubsub.close()
+    except Exception:  # 连接本来就断了
+      pass
+
+  async def stop(self) -> None:
+    if self._task is not None:
+      self._task.cancel()
+      try:
+        await self._task
+      except asyncio.CancelledError:
+        pass
+      self._task = None
+    await self._close_pubsub()
+
+  def wants(self, channel: str) -> bool:
+    # 别的 worker 上可能有订阅者，本地看不出来
+    return True
+
+  async def publish(self, channel: str, message: str) -> None:
+    await self.client.publish(_CHANNEL_PREFIX + channel, message)
+
+  async def _forward(self, broker: "Broker") -> None:
+    delay = _RETRY_MIN
+    while True:
+      try:
+        if self._pubsub is None:
+          await self._subscribe()
+          delay = _RETRY_MIN
+          logger.info("redis pubsub resubscribed")
+          broker.reset_all()
+        async for item in self._pubsub.listen():
+          self._deliver(broker, item)
+        raise ConnectionError("pubsub listen ended")
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        logger.warning("redis pubsub lost, resubscribing in %.1fs: %s", delay, e)
+        await self._close_pubsub()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, _RETRY_MAX)
+
+  @staticmethod
+  def _deliver(broker: "Broker", item: dict) -> None:
+    if item.get("type") not in ("message", "pmessage"):
+      return
+    channel = item.get("channel") or ""
+    if isinstance(channel, bytes):
+      channel = channel.decode("utf-8")
+    data = item.get("data")
+    if isinstance(data, bytes):
+      data = data.decode("utf-8")
+    broker.deliver(channel[len(_CHANNEL_PREFIX):], data)
+
+
+class Broker:
+  def __init__(self, backend=None) -> None:
+    self.backend = backend or InProcessBackend()
+    self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+    self._started = False
+
+  async def start(self) -> None:
+    if not self._started:
+      await self.backend.start(self)
+      self._started = True
+
+  async def stop(self) -> None:
+    if self._started:
+      await self.backend.stop()
+      self._started = False
+
+  def has_subscribers(self, channel: str) -> bool:
+    return bool(self._subscribers.get(channel))
+
+  def wants(self, channel: str) -> bool:
+    return self._started and self.backend.wants(channel)
+
+  async def publish(self, channel: str, message: str) -> None:
+    try:
+      await self.backend.publish(channel, message)
+    except Exception as e:  # 推送失败不能影响主流程，前端还有 /changes 兜底
+      logger.warning("publish to %s failed: %s", channel, e)
+
+  def deliver(self, channel: str, message: str) -> None:
+    for queue in list(self._subscribers.get(channel, ())):
+      try:
+        queue.put_nowait(message)
+      except asyncio.QueueFull:
+        # 慢客户端：清空积压，只留一条 reset，让它自己重拉
+        while not queue.empty():
+          queue.get_nowait()
+        queue.put_nowait(RESET_MESSAGE)
+
+  def reset_all(self) -> None:
+    """推送丢过消息（比如 Redis 断线）：让本进程所有订阅者整棵重拉。"""
+    for channel in list(self._subscribers):
+      self.deliver(channel, RESET_MESSAGE)
+
+  @asynccontextmanager
+  async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+    self._subscribers.setdefault(channel, set()).add(queue)
+    try:
+      yield queue
+    finally:
+      subs = self._subscribers.get(channel)
+      if subs is not None:
+        subs.discard(queue)
+        if not subs:
+          self._subscribers.pop(channel, None)
+
+
+def _make_backend():
+  url = (os.getenv("EVENTS_BACKEND") or "").strip()
+  if url.startswith(("redis://", "rediss://")):
+    return RedisBackend.from_url(url)
+  return InProcessBackend()
+
+
+broker = Broker(_make_backend())
@@ -0,0 +1,198 @@
+"""
+导出：把项目的脑图连同回答导成 Markdown / OPML（给 XMind、幕布这类脑图工具）/ NDJSON。
+
+- 节点按先序（dfs_key, id）分批键集翻页，每批 _BATCH 个节点连同它们的回答一次读完再输出，
+  内存只和一批有关；读完一批就把游标关了，客户端收得慢也不会一直占着读锁把写请求堵成 database is locked；
+- 输出按 _CHUNK 字节攒成块交给 StreamingResponse，压缩中间件会边收边压；
+- 全部项目导出成一个 zip：zipfile 写进只进不退的缓冲区，每写一块就吐出去，也不落临时文件。
+"""
+
+from __future__ import annotations
+
+import io
+import re
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from sqlmodel import Session, and_, or_, select
+
+from .cache import dumps
+from .db import engine
+from .models import Node, NodeAnswer, Project
+
+FORMATS = {
+  "md": ("text/markdown; charset=utf-8", "md"),
+  "opml": ("text/x-opml; charset=utf-8", "opml"),
+  "ndjson": ("application/x-ndjson", "ndjson"),
+}
+_CHUNK = 64 * 1024
+_BATCH = 500
+_STATUS_TAGS = {"red": "待答", "green": "已答", "ai": "AI 代答"}
+_UNSAFE_NAME = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def _rows(session: Session, project_id: str) -> Iterator[Tuple[Node, List[str]]]:
+  """先序逐个给出 (节点, 回答列表)。"""
+  after: Optional[Tuple[str, str]] = None
+  while True:
+    stmt = select(Node).where(Node.project_id == project_id)
+    if after is not None:
+      stmt = stmt.where(or_(Node.dfs_key > after[0], and_(Node.dfs_key == after[0], Node.id > after[1])))
+    nodes = session.exec(stmt.order_by(Node.dfs_key, Node.id).limit(_BATCH)).all()
+    if not nodes:
+      return
+    answers: Dict[str, List[str]] = {}
+    rows = session.exec(
+      select(NodeAnswer.node_id, NodeAnswer.content)
+      .where(NodeAnswer.node_id.in_([n.id for n in nodes]))
+      .order_by(NodeAnswer.id)
+    ).all()
+    for node_id, content in rows:
+      answers.setdefault(node_id, []).append(content)
+    # 这一批读完了，结束读事务再往外吐（session 开着 expire_on_commit=False，已读的节点不会失效重查）
+    session.commit()
+    for n in nodes:
+      yield n, answers.get(n.id, [])
+    if len(nodes) < _BATCH:
+      return
+    after = (nodes[-1].dfs_key, nodes[-1].id)
+
+
+def _one_line(text: str) -> str:
+  return " ".join((text or "").split())
+
+
+def _markdown(project: Project, rows: Iterator[Tuple[Node, List[str]]]) -> Iterator[str]:
+  yield f"# {_one_line(project.name)}\n\n"
+  if project.idea_text:
+    yield "".join(f"> {line}\n" for line in project.idea_text.splitlines()) + "\n"
+  for n, answers in rows:
+    if n.level > 0:
+      tag = "Tips" if n.node_type == "tip" else _STATUS_TAGS.get(n.status, n.status)
+      yield f"{'#' * min(n.level + 1, 6)} {_one_line(n.title)} [{tag}]\n\n"
+      if n.question and n.question != n.title:
+        yield f"**问题：** {n.question}\n\n"
+    if answers:
+      # 多行回答的后续行缩进，留在同一个列表项里
+      yield "".join("- " + a.strip().replace("\n", "\n  ") + "\n" for a in answers) + "\n"
+
+
+def _opml(project: Project, rows: Iterator[Tuple[Node, List[str]]]) -> Iterator[str]:
+  yield '<?xml version="1.0" encoding="UTF-8"?>\n<opml version="2.0">\n'
+  yield f"<head><title>{escape(_one_line(project.name))}</title></head>\n<body>\n"
+  open_levels: List[int] = []
+  for n, answers in rows:
+    closing = ""
+    while open_levels and open_levels[-1] >= n.level:
+      open_levels.pop()
+      closing += "  " * len(open_levels) + "</outline>\n"
+    note = "\n\n".join([n.question or ""] + answers).strip()
+    yield (
+      f"{closing}{'  ' * len(open_levels)}<outline text={quoteattr(n.title or '')} "
+      f"_note={quoteattr(note)} _status={quoteattr(n.status or '')} _type={quoteattr(n.node_type or 'question')}>\n"
+    )
+    open_levels.append(n.level)
+  while open_levels:
+    open_levels.pop()
+    yield "  " * len(open_levels) + "</outline>\n"
+  yield "</body>\n</opml>\n"
+
+
+def _ndjson(project: Project, rows: Iterator[Tuple[Node, List[str]]]) -> Iterator[bytes]:
+  head = {
+    "type": "project",
+    "id": project.id,
+    "name": project.name,
+    "idea_text": project.idea_text,
+    "status": project.status,
+    "revision": project.revision or 0,
+    "created_at": project.created_at,
+    "updated_at": project.updated_at,
+  }
+  yield dumps(head) + b"\n"
+  for n, answers in rows:
+    yield dumps(
+      {
+        "type": "node",
+        "id": n.id,
+        "parent_id": n.parent_id,
+        "level": n.level,
+        "title": n.title,
+        "question": n.question,
+        "status": n.status,
+        "order_index": n.order_index,
+        "node_type": n.node_type or "question",
+        "answers": answers,
+      }
+    ) + b"\n"
+
+
+def _chunked(parts: Iterator) -> Iterator[bytes]:
+  buf: List[bytes] = []
+  size = 0
+  for part in parts:
+    data = part.encode("utf-8") if isinstance(part, str) else part
+    buf.append(data)
+    size += len(data)
+    if size >= _CHUNK:
+      yield b"".join(buf)
+      buf, size = [], 0
+  if buf:
+    yield b"".join(buf)
+
+
+def _project_parts(session: Session, project: Project, fmt: str) -> Iterator[bytes]:
+  render = {"md": _markdown, "opml": _opml, "ndjson": _ndjson}[fmt]
+  return _chunked(render(project, _rows(session, project.id)))
+
+
+def filename(project: Project, fmt: str, ascii_only: bool = False) -> str:
+  stem = _UNSAFE_NAME.sub("_", project.name or "").strip("_.")[:40]
+  if ascii_only or not stem:
+    stem = "project"
+  return f"{stem}-{project.id[:8]}.{FORMATS[fmt][1]}"
+
+
+def stream_project(project_id: str, fmt: str) -> Iterator[bytes]:
+  """单个项目；用自己的 session，响应流完才关（请求的 session 在开始流之前就关了）。"""
+  with Session(engine, expire_on_commit=False) as session:
+    project = session.get(Project, project_id)
+    if project is None:
+      return
+    yield from _project_parts(session, project, fmt)
+
+
+class _Sink(io.RawIOBase):
+  """zipfile 的输出端：不能 seek（zipfile 会改用数据描述符），写进来的随时取走。"""
+
+  def __init__(self) -> None:
+    self._parts: List[bytes] = []
+
+  def writable(self) -> bool:
+    return True
+
+  def write(self, b) -> int:
+    self._parts.append(bytes(b))
+    return len(b)
+
+  def take(self) -> bytes:
+    out = b"".join(self._parts)
+    self._parts.clear()
+    return out
+
+
+def stream_archive(fmt: str) -> Iterator[bytes]:
+  """全部项目打成一个 zip，每个项目一个文件，按创建时间排。"""
+  sink = _Sink()
+  with Session(engine, expire_on_commit=False) as session:
+    projects = session.exec(select(Project).order_by(Project.created_at, Project.id)).all()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+      for project in projects:
+        with zf.open(filename(project, fmt), "w") as entry:
+          for chunk in _project_parts(session, project, fmt):
+            entry.write(chunk)
+            data = sink.take()
+            if data:
+              yield data
+    yield sink.take()
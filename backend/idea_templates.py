@@ -0,0 +1,162 @@
+"""
+立项模板：以前生成过的「项目构想 -> 脑图 / 初题」存成向量索引，新构想和某条足够像时直接套用，不用等模型。
+
+- 向量同 similarity.py（字符 n-gram 哈希 + 余弦），整个索引是一个 N x DIM 的 NumPy 矩阵，查一次就是一次矩阵乘；
+- 持久化到 IDEA_TEMPLATE_PATH（默认 ./idea_templates.npz），先写临时文件再原子替换；
+  多 worker 时查之前看一眼文件 mtime，别的进程写过就重新读，写的时候也先合并磁盘上的新条目；
+  读文件（最多几 MB）和矩阵乘都在线程池里做（nearest_async / add_async），启动时后台先读一遍（warm）；
+- 相似度 ≥ IDEA_TEMPLATE_THRESHOLD（默认 0.85）才套用；条数封顶 IDEA_TEMPLATE_MAX（默认 2000），旧的先淘汰；
+- 只收真模型生成的结果（stub 没必要存）；IDEA_TEMPLATES=0 时整个关掉。
+套用之后的后台精修（再调一次模型，还没被动过的节点换成新结果，IDEA_TEMPLATE_REFINE=0 关掉）在 services 里，
+任务挂在这里统一取消。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from . import similarity
+
+logger = logging.getLogger(__name__)
+
+
+class IdeaTemplates:
+  def __init__(
+    self, path: str, threshold: float = 0.85, max_items: int = 2000, enabled: bool = True, refine: bool = True
+  ) -> None:
+    self.path = path
+    self.threshold = threshold
+    self.max_items = max_items
+    self.enabled = enabled
+    self.refine = refine
+    self._entries: List[dict] = []  # {"kind", "text", "payload", "ts"}，和 _vectors 的行一一对应
+    self._vectors = None
+    self._mtime = 0.0
+    self._lock = threading.Lock()
+    self._tasks: Set[asyncio.Task] = set()
+
+  @classmethod
+  def from_env(cls) -> "IdeaTemplates":
+    def flag(key: str) -> bool:
+      return (os.getenv(key) or "1").strip().lower() not in ("0", "false", "off")
+
+    return cls(
+      os.getenv("IDEA_TEMPLATE_PATH") or "./idea_templates.npz",
+      float(os.getenv("IDEA_TEMPLATE_THRESHOLD") or 0.85),
+      int(os.getenv("IDEA_TEMPLATE_MAX") or 2000),
+      flag("IDEA_TEMPLATES"),
+      flag("IDEA_TEMPLATE_REFINE"),
+    )
+
+  # ---------- 磁盘 ----------
+
+  def _read(self) -> Tuple[List[dict], Any, float]:
+    try:
+      mtime = os.path.getmtime(self.path)
+      with np.load(self.path, allow_pickle=False) as data:
+        return json.loads(str(data["meta"])), data["vectors"], mtime
+    except FileNotFoundError:
+      return [], np.zeros((0, similarity.DIM), dtype=np.float32), 0.0
+    except Exception as e:  # 文件坏了就当没有，下次写会覆盖
+      logger.warning("idea template index %s unreadable: %s", self.path, e)
+      return [], np.zeros((0, similarity.DIM), dtype=np.float32), 0.0
+
+  def _refresh(self) -> None:
+    """首次使用或别的进程写过文件时重新读；调用方持锁。"""
+    try:
+      mtime = os.path.getmtime(self.path)
+    except OSError:
+      mtime = 0.0
+    if self._vectors is None or mtime != self._mtime:
+      self._entries, self._vectors, self._mtime = self._read()
+
+  def _write(self) -> None:
+    tmp = f"{self.path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+      np.savez_compressed(f, vectors=self._vectors, meta=np.array(json.dumps(self._entries, ensure_ascii=False)))
+    os.replace(tmp, self.path)
+    self._mtime = os.path.getmtime(self.path)
+
+  # ---------- 读写 ----------
+
+  def nearest(self, kind: str, text: str) -> Optional[Tuple[float, Any]]:
+    """(相似度, payload)；没有达到阈值的返回 None。"""
+    if not self.enabled or not text.strip():
+      return None
+    query = similarity.embed([text])[0]
+    with self._lock:
+      self._refresh()
+      if not self._entries:
+        return None
+      scores = self._vectors @ query
+      best, best_score = -1, self.threshold
+      for i in scores.argsort()[::-1]:
+        if scores[i] < best_score:
+          break
+        if self._entries[i]["kind"] == kind:
+          best, best_score = int(i), float(scores[i])
+          break
+      return (best_score, self._entries[best]["payload"]) if best >= 0 else None
+
+  async def nearest_async(self, kind: str, text: str) -> Optional[Tuple[float, Any]]:
+    if not self.enabled or not text.strip():
+      return None
+    return await asyncio.get_running_loop().run_in_executor(None, self.nearest, kind, text)
+
+  def warm(self) -> None:
+    """启动时在线程池里调：先把索引读进来，第一个请求不用等。"""
+    if self.enabled:
+      with self._lock:
+        self._refresh()
+
+  def add(self, kind: str, text: str, payload: Any) -> None:
+    """同步写盘（几十毫秒），在线程池里调。"""
+    if not self.enabled or not text.strip() or not payload:
+      return
+    vector = similarity.embed([text])
+    with self._lock:
+      self._refresh()
+      keep = [i for i, e in enumerate(self._entries) if not (e["kind"] == kind and e["text"] == text)]
+      keep = keep[-(self.max_items - 1) :] if self.max_items > 1 else []
+      self._entries = [self._entries[i] for i in keep] + [{"kind": kind, "text": text, "payload": payload, "ts": time.time()}]
+      self._vectors = np.vstack([self._vectors[keep], vector]).astype(np.float32)
+      try:
+        self._write()
+      except OSError as e:
+        logger.warning("idea template index %s not saved: %s", self.path, e)
+
+  async def add_async(self, kind: str, text: str, payload: Any) -> None:
+    await asyncio.get_running_loop().run_in_executor(None, self.add, kind, text, payload)
+
+  # ---------- 后台精修任务 ----------
+
+  def spawn(self, coro: Awaitable[Any]) -> None:
+    async def run() -> None:
+      try:
+        await coro
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:  # 后台的事，失败了记一笔就算
+        logger.warning("idea template background task failed: %s", e)
+
+    # 和预取一样用空的 context 跑，别算到触发它的请求头上
+    task = asyncio.get_running_loop().create_task(run(), context=contextvars.Context())
+    self._tasks.add(task)
+    task.add_done_callback(self._tasks.discard)
+
+  def cancel_all(self) -> None:
+    for task in list(self._tasks):
+      task.cancel()
+    self._tasks.clear()
+
+
+idea_templates = IdeaTemplates.from_env()
@@ -0,0 +1,319 @@
+"""
+离线 LLM 模拟器：AI_PROVIDER=sim 时 AIClient 不走网络，改由这里出结果。
+
+和内置 stub 的区别是它模拟的是「模型服务」而不是「兜底规则」：
+- 有延迟（首 token 前的等待按分布抽样）和吐字速度，回复越长越慢；
+- 能按比例注入超时 / 429 / 500 / 乱码，走的是和真实接口一样的异常类型，熔断、降级路径都能被测到；
+- 给了录制文件就按 prompt 回放录下来的回复和耗时，没录到的再现编一个。
+
+同一个 seed、同样的调用序列，抽到的延迟、故障和回复都一样，方便复现。
+
+配置（都可选）：
+  AI_SIM_LATENCY   首 token 延迟分布：fixed:0.5 / uniform:0.2,1.5 / normal:0.8,0.3 / lognormal:0.8,0.5 / exp:0.8
+                   （lognormal 两个参数是中位数和 sigma），默认 lognormal:0.8,0.5
+  AI_SIM_TOKEN_RATE  每秒吐多少 token，默认 40，0 表示瞬间吐完
+  AI_SIM_FAILURES  故障注入，逗号分隔的 类型:概率，类型有 timeout / 429 / 500 / garbage，如 timeout:0.02,500:0.05
+  AI_SIM_REPLAY    录制文件（JSONL，见 AI_RECORD_PATH），按 prompt 回放
+  AI_SIM_SEED      随机种子，默认 0
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+# 重放时由 benchmarks/replay.py 设为原始请求的 rid，同一 prompt 录了多条时优先取这次请求里的那条
+replay_rid: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("sim_replay_rid", default=None)
+
+_CJK = re.compile(r"[\u3000-\u9fff\uff00-\uffef]")
+
+
+def prompt_key(messages: List[dict]) -> str:
+  """按消息内容算的键，和模型名无关：换了模型录的数据也能回放。"""
+  raw = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+  return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+  """粗估 token 数：中文一字一个，其他按 4 个字符一个。"""
+  cjk = len(_CJK.findall(text))
+  return max(1, cjk + (len(text) - cjk) // 4)
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+  kind, _, arg_text = (spec or "").strip().partition(":")
+  try:
+    args = [float(x) for x in arg_text.split(",") if x.strip()]
+  except ValueError:
+    raise ValueError(f"bad latency distribution: {spec!r}")
+  kind = kind.lower()
+  if kind == "fixed" and len(args) == 1:
+    return lambda rng: args[0]
+  if kind == "uniform" and len(args) == 2:
+    return lambda rng: rng.uniform(args[0], args[1])
+  if kind == "normal" and len(args) == 2:
+    return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+  if kind == "lognormal" and len(args) == 2 and args[0] > 0:
+    mu = math.log(args[0])
+    return lambda rng: rng.lognormvariate(mu, args[1])
+  if kind == "exp" and len(args) == 1 and args[0] > 0:
+    return lambda rng: rng.expovariate(1.0 / args[0])
+  raise ValueError(f"bad latency distribution: {spec!r}")
+
+
+def parse_failures(spec: str) -> List[Tuple[str, float]]:
+  out: List[Tuple[str, float]] = []
+  for part in (spec or "").split(","):
+    part = part.strip()
+    if not part:
+      continue
+    kind, _, rate = part.partition(":")
+    kind = kind.strip().lower()
+    if kind not in ("timeout", "429", "500", "garbage"):
+      raise ValueError(f"unknown failure kind: {kind!r}")
+    out.append((kind, float(rate or 0)))
+  return out
+
+
+# ---------- 编回复：各 AIClient 方法的 prompt 里都有固定字样，据此回一份能被解析的内容 ----------
+
+_TOPICS = ["目标用户", "使用场景", "核心功能", "冷启动", "竞品差异", "成本结构", "合规风险", "团队分工"]
+_QUESTIONS = [
+  "第一批用户从哪来？",
+  "和现有的替代方案相比差异在哪？",
+  "最小可行版本需要哪几个功能？",
+  "靠什么持续留住用户？",
+  "最大的落地风险是什么，怎么兜底？",
+  "需要哪些外部资源或合作方？",
+]
+_TIPS = [
+  "可以参考同类平台的冷启动做法，先在一个小圈子里验证。",
+  "结合你的目标用户举一两个具体使用例子，会更容易发现缺口。",
+  "把潜在的合规和安全风险单独列出来，各写一条应对思路。",
+  "试着给这一步定一个可量化的完成标准。",
+]
+
+
+def plausible_reply(prompt: str, rng: random.Random) -> str:
+  if "思维导图节点列表" in prompt:
+    nodes = [{"level": 0, "title": "项目", "question": "项目根节点", "parent_index": None}]
+    for topic in rng.sample(_TOPICS, 4):
+      nodes.append({"level": 1, "title": topic, "question": f"围绕「{topic}」，整体思路是什么？", "parent_index": 0})
+      p = len(nodes) - 1
+      for q in rng.sample(_QUESTIONS, 2):
+        nodes.append({"level": 2, "title": q[:5], "question": q, "parent_index": p})
+    return json.dumps(nodes, ensure_ascii=False)
+  # 融合文档、代答的 prompt 里夹着用户写的各种内容，要先于其他关键词判断
+  if "请代替项目负责人" in prompt:
+    return "".join(rng.sample(_TIPS, 2))
+  if "项目文档中的一个章节" in prompt:
+    heading = prompt.split("「## ", 1)[-1].split("」", 1)[0]
+    body = prompt.split("分支问答：\n", 1)[-1]
+    return f"## {heading}\n\n" + body[:4000]
+  if "项目文档" in prompt:
+    body = prompt.split("\n\n", 1)[-1]
+    return "# 项目文档\n\n" + body[:6000]
+  if "界定本质" in prompt:
+    if rng.random() < 0.3:
+      return "能再说明一下，你更想做的是线上撮合平台，还是线下的服务？"
+    return json.dumps({"ready": True, "title": "校园二手教材交易"}, ensure_ascii=False)
+  if "关键疑问" in prompt:
+    return json.dumps(rng.sample(_QUESTIONS, 3), ensure_ascii=False)
+  if "followup_questions" in prompt:
+    if rng.random() < 0.3:
+      return '{"sufficient":true}'
+    return json.dumps({"sufficient": False, "followup_questions": rng.sample(_QUESTIONS, 2)}, ensure_ascii=False)
+  if "Tips" in prompt:
+    return "\n".join(rng.sample(_TIPS, 3))
+  if "YES 或 NO" in prompt:
+    return "YES" if rng.random() < 0.7 else "NO"
+  if "起一个简短" in prompt:
+    return rng.choice(_TOPICS)
+  return "好的。"
+
+
+@dataclass
+class _Plan:
+  wait: float  # 首 token 前的等待
+  generation: float  # 吐字耗时
+  content: str
+  failure: Optional[str]  # timeout / 状态码 / None
+  usage: dict
+
+
+def _replay_failure(entry: dict) -> Optional[str]:
+  error = entry.get("error")
+  if not error:
+    return None
+  if "Timeout" in error:
+    return "timeout"
+  return str(entry.get("status") or 500)
+
+
+class SimProvider:
+  """和 _HTTPProvider 同一个接口：complete() 返回 chat/completions 的响应 JSON。"""
+
+  name = "sim"
+
+  def __init__(
+    self,
+    latency: str = "lognormal:0.8,0.5",
+    token_rate: float = 40.0,
+    failures: str = "",
+    replay_path: str = "",
+    seed: int = 0,
+  ) -> None:
+    self.first_token = parse_distribution(latency)
+    self.token_rate = token_rate
+    self.failures = parse_failures(failures)
+    self.seed = seed
+    self.replay: Dict[str, List[dict]] = load_replay(replay_path) if replay_path else {}
+    self._seen: Dict[str, int] = {}
+    self._lock = threading.Lock()
+
+  @classmethod
+  def from_env(cls) -> "SimProvider":
+    env = lambda k, d="": (os.getenv(k) or "").strip() or d  # noqa: E731
+    return cls(
+      latency=env("AI_SIM_LATENCY", "lognormal:0.8,0.5"),
+      token_rate=float(env("AI_SIM_TOKEN_RATE", "40")),
+      failures=env("AI_SIM_FAILURES"),
+      replay_path=env("AI_SIM_REPLAY"),
+      seed=int(env("AI_SIM_SEED", "0")),
+    )
+
+  def _rng(self, key: str) -> Tuple[random.Random, int]:
+    # 每个 prompt 各自一条随机序列：并发下调用先后打乱也不影响每条 prompt 抽到什么
+    with self._lock:
+      n = self._seen.get(key, 0)
+      self._seen[key] = n + 1
+    return random.Random(f"{self.seed}:{key}:{n}"), n
+
+  def _pick(self, recorded: List[dict], key: str, n: int) -> dict:
+    rid = replay_rid.get()
+    same = [e for e in recorded if rid and e.get("rid") == rid]
+    if not same:
+      return recorded[n % len(recorded)]
+    with self._lock:
+      m = self._seen.get(f"{rid}:{key}", 0)
+      self._seen[f"{rid}:{key}"] = m + 1
+    return same[m % len(same)]
+
+  def _plan(self, messages: List[dict]) -> _Plan:
+    key = prompt_key(messages)
+    rng, n = self._rng(key)
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+
+    recorded = self.replay.get(key)
+    if recorded:
+      entry = self._pick(recorded, key, n)
+      content = entry.get("response") or ""
+      usage = entry.get("usage") or {}
+      # 录下来的是总耗时，回放时原样等这么久，不再按吐字速度另算
+      return _Plan(
+        wait=float(entry.get("latency") or 0.0),
+        generation=0.0,
+        content=content,
+        failure=_replay_failure(entry),
+        usage={
+          "prompt_tokens": usage.get("prompt_tokens", estimate_tokens(prompt)),
+          "completion_tokens": usage.get("completion_tokens", estimate_tokens(content)),
+        },
+      )
+
+    failure = None
+    roll = rng.random()
+    for kind, rate in self.failures:
+      if roll < rate:
+        failure = kind
+        break
+      roll -= rate
+    content = plausible_reply(prompt, rng)
+    if failure == "garbage":
+      # 接口正常返回，但内容解析不出来
+      content = "抱歉，我没太理解"[: rng.randint(2, 8)]
+      failure = None
+    completion = estimate_tokens(content)
+    return _Plan(
+      wait=self.first_token(rng),
+      generation=completion / self.token_rate if self.token_rate else 0.0,
+      content=content,
+      failure=failure,
+      usage={"prompt_tokens": estimate_tokens(prompt), "completion_tokens": completion},
+    )
+
+  async def complete(self, model: str, messages: List[dict], timeout: float) -> dict:
+    plan = self._plan(messages)
+    total = plan.wait + plan.generation
+    if plan.failure == "timeout" or total > timeout:
+      await asyncio.sleep(timeout)
+      raise httpx.ReadTimeout("simulated timeout")
+    await asyncio.sleep(total)
+    _raise_for_failure(plan.failure)
+    return {
+      "object": "chat.completion",
+      "model": model,
+      "choices": [{"index": 0, "message": {"role": "assistant", "content": plan.content}, "finish_reason": "stop"}],
+      "usage": plan.usage,
+    }
+
+  async def stream(self, model: str, messages: List[dict], timeout: float) -> AsyncIterator[str]:
+    """按吐字速度分块产出回复内容，给之后要做流式展示的调用方用。"""
+    plan = self._plan(messages)
+    if plan.failure == "timeout" or plan.wait > timeout:
+      await asyncio.sleep(timeout)
+      raise httpx.ReadTimeout("simulated timeout")
+    await asyncio.sleep(plan.wait)
+    _raise_for_failure(plan.failure)
+    step = 4
+    per_chunk = plan.generation * step / max(len(plan.content), 1)
+    for i in range(0, len(plan.content), step):
+      yield plan.content[i : i + step]
+      if per_chunk:
+        await asyncio.sleep(per_chunk)
+
+
+def _raise_for_failure(failure: Optional[str]) -> None:
+  if failure and failure.isdigit():
+    request = httpx.Request("POST", "http://sim/v1/chat/completions")
+    response = httpx.Response(int(failure), request=request)
+    raise httpx.HTTPStatusError(f"simulated {failure}", request=request, response=response)
+
+
+def load_replay(path: str) -> Dict[str, List[dict]]:
+  """读录制文件：每行一条 {key?, messages?, response, latency, usage, error?, status?}，按 prompt 分组。"""
+  out: Dict[str, List[dict]] = {}
+  with open(path, encoding="utf-8") as f:
+    for line in f:
+      line = line.strip()
+      if not line:
+        continue
+      entry = json.loads(line)
+      key = entry.get("key") or (prompt_key(entry["messages"]) if entry.get("messages") else None)
+      if key:
+        out.setdefault(key, []).append(entry)
+  return out
+
+
+_provider: Optional[SimProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> SimProvider:
+  """进程内共用一个：回放文件只读一次，每个 prompt 的调用计数也要跨请求累计。"""
+  global _provider
+  with _provider_lock:
+    if _provider is None:
+      _provider = SimProvider.from_env()
+    return _provider
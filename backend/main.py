@@ -1,55 +1,128 @@
 # FastAPI 入口：立项 / 脑图 / 文档解析 / 静态前端
 from __future__ import annotations
 
+import asyncio
 import base64
 import io
+import logging
 import os
-from typing import List
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+from urllib.parse import quote
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import Body, Depends, FastAPI, HTTPException
+from fastapi import Body, Depends, FastAPI, HTTPException, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlmodel import Session, select
 
-from .ai_client import AIClient
-from .db import get_session, init_db
+from . import export, metrics, search
+from .ai_client import AIClient, breaker, close_http_pool, open_http_pool
+from .autopilot import autopilot
+from .cache import dumps, etag_matches, project_etag, project_payload_cache
+from .compression import CompressionMiddleware
+from .db import engine, get_session, init_db
+from .events import broker
+from .idea_templates import idea_templates
+from .prefetch import prefetcher
+from .recorder import RecordingMiddleware, recorder
 from .models import Node, NodeAnswer, Project
+from .static import StaticAssets
 from .schemas import (
+  AutopilotJobOut,
+  BatchAnswerRequest,
+  BatchAnswerResponse,
   DraftCreateRequest,
   DraftCreateResponse,
   DraftMessageRequest,
   DraftMessageResponse,
   FromDraftRequest,
   MergeResponse,
+  NextTaskOut,
   NodeAnswerRequest,
   NodeAnswerResponse,
   NodeOut,
   NodeWithAnswers,
   ProgressOut,
+  ProjectChangesOut,
   ProjectInitRequest,
   ProjectListItem,
   ProjectOut,
+  SearchResponse,
   ShortTitleResponse,
+  SubtreeNodeOut,
+  SubtreeOut,
   TipsCandidatesResponse,
   TipsChooseRequest,
 )
 from .services import (
   answer_node_and_trace,
+  answer_nodes_batch,
+  bump_revision,
   calc_progress,
+  compact_nodes,
   create_draft,
   create_project_from_draft,
   create_project_from_idea,
   draft_append_message,
   flatten_nodes,
+  get_subtree,
+  merge_project_doc,
+  next_red_node,
+  node_payload,
+  progress_by_project,
+  project_changes_payload,
+  project_progress,
+  publish_changes,
+  record_change,
   spawn_followup_node,
   spawn_tips_node,
 )
 
 
-app = FastAPI(title="AI Mindmap Backend")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+  """
+  启动：表结构没变就不做 DDL；开模型调用的连接池；PREWARM_PARSERS=1 时后台把 pdf / docx 解析库先 import 好，
+  不然第一次上传文档要在请求里付这几百毫秒。
+  """
+  start = time.perf_counter()
+  migrated = init_db()
+  open_http_pool()
+  await broker.start()
+  # 静态资源的读取 / hash / 预压缩放后台，构建完之前来的请求会等它或自己补建
+  asyncio.get_running_loop().run_in_executor(None, static_assets.build)
+  # 立项模板索引同理，先在后台读进来
+  asyncio.get_running_loop().run_in_executor(None, idea_templates.warm)
+  if (os.getenv("PREWARM_PARSERS") or "").strip().lower() in ("1", "true", "yes"):
+    asyncio.get_running_loop().run_in_executor(None, _prewarm_parsers)
+  logger.info("startup in %.1fms (schema %s)", (time.perf_counter() - start) * 1000, "migrated" if migrated else "current")
+  try:
+    yield
+  finally:
+    prefetcher.clear()
+    idea_templates.cancel_all()
+    # 自动作答被取消时还要把已答好的落库，等它们收完尾再关连接池和引擎
+    await autopilot.cancel_all()
+    await broker.stop()
+    await close_http_pool()
+    engine.dispose()
+
+
+app = FastAPI(title="AI Mindmap Backend", lifespan=lifespan)
+
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine)
+if recorder is not None:
+  app.add_middleware(RecordingMiddleware, rec=recorder)
+# 压缩要在录制外层：录制要从明文响应里抠 id
+app.add_middleware(CompressionMiddleware)
 
 app.add_middleware(
   CORSMiddleware,
@@ -57,6 +130,7 @@ app.add_middleware(
   allow_credentials=True,
   allow_methods=["*"],
   allow_headers=["*"],
+  expose_headers=["X-AI-Source", "X-AI-Degraded", "X-AI-Latency-Ms", "X-AI-Errors"],
 )
 
 
@@ -64,42 +138,44 @@ app.add_middleware(
 _ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
 
-@app.on_event("startup")
-def on_startup() -> None:
-  init_db()
-
-
 @app.get("/health")
 def health() -> dict:
-  return {"status": "ok"}
+  return {"status": "ok", "ai_breaker": breaker.state}
 
 
-def _project_to_out(project: Project, nodes: List[Node]) -> ProjectOut:
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint() -> PlainTextResponse:
+  """Prometheus 文本格式的进程内指标。"""
+  return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# 紧凑格式的媒体类型：Accept 里带它或 ?format=compact 时，GET 详情的 nodes 换成列式数组
+COMPACT_MEDIA_TYPE = "application/vnd.mindmap.compact+json"
+
+
+def _project_payload(project: Project, nodes: List[Node], compact: bool = False) -> dict:
+  """ProjectOut 的纯 dict 版本，GET 详情直接拿它序列化，省掉逐个 NodeOut 校验。compact 见 services.compact_nodes。"""
   flat = flatten_nodes(nodes)
   total, green, percent = calc_progress(flat)
-  return ProjectOut(
-    id=project.id,
-    name=project.name,
-    ideaText=project.idea_text,
-    status=project.status,
-    created_at=project.created_at,
-    updated_at=project.updated_at,
-    nodes=[
-      NodeOut(
-        id=n.id,
-        project_id=n.project_id,
-        parent_id=n.parent_id,
-        level=n.level,
-        title=n.title,
-        question=n.question,
-        status=n.status,
-        order_index=n.order_index,
-        node_type=getattr(n, "node_type", "question"),
-      )
-      for n in flat
-    ],
-    progress=ProgressOut(total=total, green=green, percent=percent),
-  )
+  return {
+    "id": project.id,
+    "name": project.name,
+    "ideaText": project.idea_text,
+    "status": project.status,
+    "revision": project.revision or 0,
+    "created_at": project.created_at,
+    "updated_at": project.updated_at,
+    "nodes": compact_nodes(flat) if compact else [node_payload(n) for n in flat],
+    "progress": {"total": total, "green": green, "percent": percent},
+  }
+
+
+def _project_to_out(project: Project, nodes: List[Node]) -> ProjectOut:
+  return ProjectOut(**_project_payload(project, nodes))
+
+
+def _node_to_out(n: Node) -> NodeOut:
+  return NodeOut(**node_payload(n))
 
 
 @app.post("/api/draft", response_model=DraftCreateResponse)
@@ -167,28 +243,214 @@ async def init_project(
 @app.get("/api/projects", response_model=List[ProjectListItem])
 def list_projects(session: Session = Depends(get_session)) -> List[ProjectListItem]:
   projects = session.exec(select(Project).order_by(Project.created_at.desc())).all()
-  items: List[ProjectListItem] = []
-  for p in projects:
-    nodes = session.exec(select(Node).where(Node.project_id == p.id)).all()
-    total, green, percent = calc_progress(flatten_nodes(nodes))
-    items.append(
-      ProjectListItem(
-        id=p.id,
-        name=p.name,
-        status=p.status,
-        progressPercent=percent,
-      )
+  progress = progress_by_project(session)
+  return [
+    ProjectListItem(
+      id=p.id,
+      name=p.name,
+      status=p.status,
+      progressPercent=progress.get(p.id, (0, 0, 0))[2],
     )
-  return items
+    for p in projects
+  ]
+
+
+@app.get("/api/search", response_model=SearchResponse)
+def search_all(
+  q: str = Query(..., min_length=1, max_length=200),
+  project_id: Optional[str] = None,
+  limit: int = Query(20, ge=1, le=50),
+  offset: int = Query(0, ge=0),
+  session: Session = Depends(get_session),
+) -> SearchResponse:
+  """全文检索项目、节点和回答，按相关度排序；空格分隔的多个词要同时命中。"""
+  try:
+    result = search.search(session, q, project_id=project_id, limit=limit, offset=offset)
+  except ValueError as e:
+    if str(e) == "empty_query":
+      raise HTTPException(status_code=400, detail="empty_query")
+    raise
+  return SearchResponse(query=q, offset=offset, limit=limit, **result)
+
+
+def _attachment(name: str, ascii_name: str) -> str:
+  # 文件名里有中文，按 RFC 5987 给 filename*，不认的老客户端用纯 ASCII 的 filename
+  return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(name)}"
+
+
+@app.get("/api/projects/{project_id}/export")
+def export_project(
+  project_id: str,
+  fmt: str = Query("md", alias="format"),
+  session: Session = Depends(get_session),
+) -> StreamingResponse:
+  """导出单个项目（md / opml / ndjson），边查边写，见 backend/export.py。"""
+  if fmt not in export.FORMATS:
+    raise HTTPException(status_code=400, detail="bad_format")
+  project = session.get(Project, project_id)
+  if project is None:
+    raise HTTPException(status_code=404, detail="project_not_found")
+  return StreamingResponse(
+    export.stream_project(project_id, fmt),
+    media_type=export.FORMATS[fmt][0],
+    headers={"Content-Disposition": _attachment(export.filename(project, fmt), export.filename(project, fmt, ascii_only=True))},
+  )
+
+
+@app.get("/api/export")
+def export_all(fmt: str = Query("md", alias="format")) -> StreamingResponse:
+  """全部项目打成一个 zip 流式下载，每个项目一个文件。"""
+  if fmt not in export.FORMATS:
+    raise HTTPException(status_code=400, detail="bad_format")
+  return StreamingResponse(
+    export.stream_archive(fmt),
+    media_type="application/zip",
+    headers={"Content-Disposition": _attachment(f"projects-{fmt}.zip", f"projects-{fmt}.zip")},
+  )
 
 
 @app.get("/api/projects/{project_id}", response_model=ProjectOut)
-def get_project(project_id: str, session: Session = Depends(get_session)) -> ProjectOut:
+def get_project(
+  project_id: str,
+  request: Request,
+  fmt: Optional[str] = Query(None, alias="format"),
+  session: Session = Depends(get_session),
+) -> Response:
+  """
+  前端几乎每次操作后都会重拉详情：按 revision 带 ETag，没变就 304；
+  变了也只在该 revision 第一次被请求时序列化，之后直接回缓存的 bytes。
+  ?format=compact 或 Accept: application/vnd.mindmap.compact+json 时 nodes 用列式紧凑格式。
+  """
   project = session.get(Project, project_id)
   if not project:
     raise HTTPException(status_code=404, detail="project_not_found")
-  nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
-  return _project_to_out(project, nodes)
+  compact = fmt == "compact" or COMPACT_MEDIA_TYPE in (request.headers.get("accept") or "")
+  revision = project.revision or 0
+  etag = project_etag(project.id + ("-c" if compact else ""), revision)
+  headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+  if etag_matches(request.headers.get("if-none-match"), etag):
+    metrics.CACHE_REQUESTS.inc(cache="project_payload", result="not_modified")
+    return Response(status_code=304, headers=headers)
+
+  cache_key = project.id + (":compact" if compact else "")
+  body = project_payload_cache.get(cache_key, revision)
+  metrics.CACHE_REQUESTS.inc(cache="project_payload", result="hit" if body is not None else "miss")
+  if body is None:
+    nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
+    body = dumps(_project_payload(project, nodes, compact=compact))
+    project_payload_cache.put(cache_key, revision, body)
+  media_type = COMPACT_MEDIA_TYPE if compact else "application/json"
+  return Response(content=body, media_type=media_type, headers=headers)
+
+
+@app.get("/api/projects/{project_id}/changes", response_model=ProjectChangesOut)
+def get_project_changes_since(
+  project_id: str,
+  since: int = Query(..., ge=0),
+  session: Session = Depends(get_session),
+) -> ProjectChangesOut:
+  """增量同步：只回 since 之后新增 / 改过 / 状态变过的节点，大图也按改动量计费。"""
+  try:
+    payload = project_changes_payload(session, project_id, since)
+  except ValueError as e:
+    if str(e) == "project_not_found":
+      raise HTTPException(status_code=404, detail="project_not_found")
+    raise
+  return ProjectChangesOut(**payload)
+
+
+@app.get("/api/projects/{project_id}/nodes", response_model=SubtreeOut)
+def get_project_nodes(
+  project_id: str,
+  parent_id: Optional[str] = None,
+  depth: int = Query(1, ge=1, le=10),
+  session: Session = Depends(get_session),
+) -> SubtreeOut:
+  """按需展开：只回 parent_id 下 depth 层的节点，附子节点数和子树进度。不传 parent_id 从根开始。"""
+  try:
+    project, items = get_subtree(session, project_id, parent_id or None, depth)
+  except ValueError as e:
+    if str(e) in ("project_not_found", "node_not_found"):
+      raise HTTPException(status_code=404, detail=str(e))
+    raise
+  return SubtreeOut(
+    id=project.id,
+    parent_id=parent_id or None,
+    depth=depth,
+    revision=project.revision or 0,
+    nodes=[
+      SubtreeNodeOut(
+        **node_payload(n),
+        child_count=child_count,
+        progress=ProgressOut(total=total, green=green, percent=percent),
+      )
+      for n, child_count, (total, green, percent) in items
+    ],
+  )
+
+
+@app.get("/api/projects/{project_id}/next", response_model=NextTaskOut)
+def get_next_task(
+  project_id: str,
+  after: Optional[str] = None,
+  session: Session = Depends(get_session),
+) -> NextTaskOut:
+  """下一个待回答的问题：先序顺序里 after 节点之后的第一个红色问题；不传 after 从头找。"""
+  project = session.get(Project, project_id)
+  if not project:
+    raise HTTPException(status_code=404, detail="project_not_found")
+  after_key = ""
+  if after:
+    cur = session.get(Node, after)
+    if not cur or cur.project_id != project.id:
+      raise HTTPException(status_code=404, detail="node_not_found")
+    after_key = cur.dfs_key
+  nxt = next_red_node(session, project.id, after_key)
+  total, green, percent = project_progress(session, project.id)
+  return NextTaskOut(
+    nextNodeId=nxt.id if nxt else None,
+    node=_node_to_out(nxt) if nxt else None,
+    progress=ProgressOut(total=total, green=green, percent=percent),
+  )
+
+
+@app.websocket("/api/projects/{project_id}/ws")
+async def project_updates(websocket: WebSocket, project_id: str, since: Optional[int] = None) -> None:
+  """
+  实时推送节点 diff（消息格式同 /changes，多一个 type 字段），替代前端轮询。
+  带 ?since= 连上来会先补一条从 since 到现在的增量。
+  """
+  with Session(engine) as session:
+    if not session.get(Project, project_id):
+      await websocket.close(code=4404)
+      return
+  await websocket.accept()
+
+  async with broker.subscribe(project_id) as queue:
+    # 先订阅再补增量，中间漏不了；重复的 diff 前端按节点覆盖即可
+    if since is not None:
+      with Session(engine) as session:
+        payload = project_changes_payload(session, project_id, since)
+      payload["type"] = "changes"
+      await websocket.send_text(dumps(payload).decode("utf-8"))
+
+    async def pump() -> None:
+      while True:
+        await websocket.send_text(await queue.get())
+
+    async def drain() -> None:
+      # 客户端不发东西，这里只为及时发现断开
+      while True:
+        msg = await websocket.receive()
+        if msg["type"] == "websocket.disconnect":
+          return
+
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(drain())]
+    try:
+      await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+      for t in tasks:
+        t.cancel()
 
 
 @app.post(
@@ -202,7 +464,7 @@ async def answer_node(
   session: Session = Depends(get_session),
 ) -> NodeAnswerResponse:
   try:
-    node, nodes, next_node_id, added_nodes = await answer_node_and_trace(
+    node, (total, green, percent), next_node_id, added_nodes = await answer_node_and_trace(
       session, project_id, node_id, payload.content, ai_client=AIClient(), by_ai=payload.by_ai
     )
   except ValueError as e:  # noqa: B902
@@ -212,9 +474,6 @@ async def answer_node(
       raise HTTPException(status_code=404, detail="node_not_found")
     raise
 
-  flat = flatten_nodes(nodes)
-  total, green, percent = calc_progress(flat)
-
   answers = (
     session.exec(select(NodeAnswer).where(NodeAnswer.node_id == node.id).order_by(NodeAnswer.created_at))
     .all()
@@ -231,20 +490,7 @@ async def answer_node(
 
   added_out = None
   if added_nodes:
-    added_out = [
-      NodeOut(
-        id=n.id,
-        project_id=n.project_id,
-        parent_id=n.parent_id,
-        level=n.level,
-        title=n.title,
-        question=n.question,
-        status=n.status,
-        order_index=n.order_index,
-        node_type=getattr(n, "node_type", "question"),
-      )
-      for n in added_nodes
-    ]
+    added_out = [_node_to_out(n) for n in added_nodes]
 
   return NodeAnswerResponse(
     updatedNode=node_with_answers,
@@ -254,6 +500,58 @@ async def answer_node(
   )
 
 
+@app.post("/api/projects/{project_id}/answers", response_model=BatchAnswerResponse)
+async def answer_nodes(
+  project_id: str,
+  payload: BatchAnswerRequest,
+  session: Session = Depends(get_session),
+) -> BatchAnswerResponse:
+  """
+  批量提交回答（导入已有材料）：整批一个事务，返回合并后的节点增量和下一个红色问题。
+  """
+  items = [(a.node_id, a.content, a.by_ai) for a in payload.answers]
+  try:
+    changes, next_node_id = await answer_nodes_batch(session, project_id, items)
+  except ValueError as e:  # noqa: B902
+    msg = str(e)
+    if msg in {"project_not_found", "node_not_found"}:
+      raise HTTPException(status_code=404, detail=msg)
+    if msg in {"empty_batch", "batch_too_large"}:
+      raise HTTPException(status_code=400, detail=msg)
+    raise
+  return BatchAnswerResponse(**changes, nextNodeId=next_node_id)
+
+
+@app.post("/api/projects/{project_id}/autopilot", response_model=AutopilotJobOut)
+async def start_autopilot(project_id: str) -> AutopilotJobOut:
+  """
+  AI 自动作答：后台并发代答所有红色问题，分批落库（见 backend/autopilot.py）。已有在跑的就返回那个。
+  """
+  try:
+    job = await autopilot.start(project_id)
+  except ValueError as e:  # noqa: B902
+    if str(e) == "project_not_found":
+      raise HTTPException(status_code=404, detail="project_not_found")
+    raise
+  return AutopilotJobOut(**job.to_dict())
+
+
+@app.get("/api/projects/{project_id}/autopilot", response_model=AutopilotJobOut)
+def get_autopilot(project_id: str) -> AutopilotJobOut:
+  job = autopilot.get(project_id)
+  if job is None:
+    raise HTTPException(status_code=404, detail="autopilot_not_found")
+  return AutopilotJobOut(**job.to_dict())
+
+
+@app.delete("/api/projects/{project_id}/autopilot", response_model=AutopilotJobOut)
+async def cancel_autopilot(project_id: str) -> AutopilotJobOut:
+  job = await autopilot.cancel(project_id)
+  if job is None:
+    raise HTTPException(status_code=404, detail="autopilot_not_found")
+  return AutopilotJobOut(**job.to_dict())
+
+
 @app.post(
   "/api/projects/{project_id}/nodes/{node_id}/spawn",
   response_model=NodeOut,
@@ -274,20 +572,11 @@ async def spawn_node(
       raise HTTPException(status_code=404, detail="project_not_found")
     if msg == "node_not_found":
       raise HTTPException(status_code=404, detail="node_not_found")
-    if msg in {"no_answer", "no_followup"}:
+    if msg == "no_answer":
       raise HTTPException(status_code=400, detail=msg)
     raise
 
-  return NodeOut(
-    id=new_node.id,
-    project_id=new_node.project_id,
-    parent_id=new_node.parent_id,
-    level=new_node.level,
-    title=new_node.title,
-    question=new_node.question,
-    status=new_node.status,
-    order_index=new_node.order_index,
-  )
+  return _node_to_out(new_node)
 
 
 @app.post(
@@ -314,17 +603,7 @@ async def spawn_tips(
       raise HTTPException(status_code=400, detail="no_answer")
     raise
 
-  return NodeOut(
-    id=new_node.id,
-    project_id=new_node.project_id,
-    parent_id=new_node.parent_id,
-    level=new_node.level,
-    title=new_node.title,
-    question=new_node.question,
-    status=new_node.status,
-    order_index=new_node.order_index,
-    node_type=new_node.node_type,
-  )
+  return _node_to_out(new_node)
 
 
 @app.post(
@@ -346,23 +625,24 @@ async def get_tips_candidates(
 
   ai = AIClient()
 
-  # 对于 Tips 节点：基于父节点 + 父节点最新回答生成补充 Tips
+  # 对于 Tips 节点：基于父节点 + 父节点最新回答生成补充 Tips；
+  # 对于普通问题节点：基于问题本身 +（可选）已有回答，生成「可能的回答」候选
   if getattr(node, "node_type", "question") == "tip":
-    parent = session.get(Node, node.parent_id) if node.parent_id else None
-    if not parent:
+    base = session.get(Node, node.parent_id) if node.parent_id else None
+    if not base:
       raise HTTPException(status_code=400, detail="no_parent")
-    latest_answer = session.exec(
-      select(NodeAnswer).where(NodeAnswer.node_id == parent.id).order_by(NodeAnswer.created_at.desc())
-    ).first()
-    latest_answer_text = latest_answer.content if latest_answer else ""
-    cands = await ai.make_tips_candidates(project.idea_text, parent.question, latest_answer_text)
   else:
-    # 对于普通问题节点：基于问题本身 +（可选）已有回答，生成「可能的回答」候选
-    latest_answer = session.exec(
-      select(NodeAnswer).where(NodeAnswer.node_id == node.id).order_by(NodeAnswer.created_at.desc())
-    ).first()
+    base = node
+  latest_answer = session.exec(
+    select(NodeAnswer).where(NodeAnswer.node_id == base.id).order_by(NodeAnswer.created_at.desc())
+  ).first()
+  # 回答刚存下时已经在后台预取过一份（backend/prefetch.py）
+  cands = None
+  if latest_answer is not None:
+    cands = await prefetcher.take("tips", base.id, latest_answer.id, "make_tips_candidates")
+  if cands is None:
     latest_answer_text = latest_answer.content if latest_answer else ""
-    cands = await ai.make_tips_candidates(project.idea_text, node.question, latest_answer_text)
+    cands = await ai.make_tips_candidates(project.idea_text, base.question, latest_answer_text)
   return TipsCandidatesResponse(candidates=cands)
 
 
@@ -396,20 +676,14 @@ async def choose_tip(
   node.title = title
   node.status = "tip"  # 仍作为信息节点
   session.add(node)
+  search.index_nodes(session, [node])
+  revision = bump_revision(session, project)
+  record_change(session, project, node, "updated")
   session.commit()
   session.refresh(node)
+  await publish_changes(session, project_id, revision - 1)
 
-  return NodeOut(
-    id=node.id,
-    project_id=node.project_id,
-    parent_id=node.parent_id,
-    level=node.level,
-    title=node.title,
-    question=node.question,
-    status=node.status,
-    order_index=node.order_index,
-    node_type=node.node_type,
-  )
+  return _node_to_out(node)
 
 
 @app.post(
@@ -432,52 +706,25 @@ async def make_node_title(
   new_title = await ai.make_short_title(node.question)
   node.title = new_title
   session.add(node)
+  search.index_nodes(session, [node])
+  revision = bump_revision(session, project)
+  record_change(session, project, node, "updated")
   session.commit()
   session.refresh(node)
+  await publish_changes(session, project_id, revision - 1)
   return ShortTitleResponse(title=new_title)
 
 
 @app.post("/api/projects/{project_id}/merge", response_model=MergeResponse)
 async def merge_project(project_id: str, session: Session = Depends(get_session)) -> MergeResponse:
-  project = session.get(Project, project_id)
-  if not project:
-    raise HTTPException(status_code=404, detail="project_not_found")
-  nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
-  flat = flatten_nodes(nodes)
-  total, green, _ = calc_progress(flat)
-  if not total or total != green:
-    raise HTTPException(status_code=400, detail="project_not_completed")
-
-  # 聚合节点问答
-  sections: List[str] = []
-  for n in flat:
-    if n.level == 0:
-      continue
-    answers = (
-      session.exec(select(NodeAnswer).where(NodeAnswer.node_id == n.id).order_by(NodeAnswer.created_at))
-      .all()
-    )
-    if not answers:
-      continue
-    path_titles: List[str] = []
-    cur = n
-    # 通过 parent_id 向上追溯路径
-    by_id = {x.id: x for x in flat}
-    while cur:
-      path_titles.append(cur.title)
-      cur = by_id.get(cur.parent_id) if cur.parent_id else None
-    path_titles.reverse()
-    sections.append(f"### {' > '.join(path_titles)}")
-    sections.append("")
-    sections.append(f"**节点问题：** {n.question}")
-    sections.append("")
-    sections.append("**用户解答：**")
-    for i, a in enumerate(answers, start=1):
-      sections.append(f"- 解答 {i}：{a.content}")
-    sections.append("")
-
-  ai_client = AIClient()
-  content = await ai_client.merge_project_doc(project.name, project.idea_text, sections)
+  try:
+    content = await merge_project_doc(session, project_id)
+  except ValueError as e:
+    if str(e) == "project_not_found":
+      raise HTTPException(status_code=404, detail="project_not_found")
+    if str(e) == "project_not_completed":
+      raise HTTPException(status_code=400, detail="project_not_completed")
+    raise
   return MergeResponse(content=content)
 
 
@@ -496,6 +743,14 @@ def _parse_txt(content: bytes) -> str:
   return content.decode("utf-8", errors="replace")
 
 
+def _prewarm_parsers() -> None:
+  try:
+    import docx  # noqa: F401
+    import pypdf  # noqa: F401
+  except Exception as e:  # 预热失败不影响启动，真用到时再报
+    logger.warning("prewarm parsers failed: %s", e)
+
+
 def _parse_pdf(content: bytes) -> str:
   from pypdf import PdfReader
   reader = PdfReader(io.BytesIO(content))
@@ -551,5 +806,6 @@ async def parse_document(payload: dict = Body(...)) -> dict:
   return {"text": text[:50000]}
 
 
-# 挂前端：访问 http://localhost:8000/ 即可用，别用 file:// 开页面
-app.mount("/", StaticFiles(directory=_ROOT_DIR, html=True), name="frontend")
+# 挂前端：访问 http://localhost:8000/ 即可用，别用 file:// 开页面；只放行页面和 frontend/，见 backend/static.py
+static_assets = StaticAssets(_ROOT_DIR)
+app.mount("/", static_assets, name="frontend")
@@ -0,0 +1,271 @@
+"""
+进程内指标，/metrics 按 Prometheus 文本格式导出。
+
+- HTTP：按路由模板（不是原始路径，避免 id 撑爆标签）记延迟、每个请求的 SQL 条数和耗时；
+- LLM：_call_llm 的延迟、usage 里的 token 数；AIClient 各方法的结果来源（llm / cache / stub）、
+  退回 stub 的原因和熔断次数；同一请求里的 AI 调用还会写进响应头 X-AI-*；
+- 缓存命中、services 层各函数耗时。
+
+多 worker 时每个进程各算各的，由 Prometheus 按实例聚合。
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+  return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+  items = list(key) + ([extra] if extra else [])
+  if not items:
+    return ""
+  body = ",".join(
+    '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in items
+  )
+  return "{" + body + "}"
+
+
+def _fmt_num(v: float) -> str:
+  if v == float("inf"):
+    return "+Inf"
+  return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Counter:
+  def __init__(self, name: str, help_text: str) -> None:
+    self.name = name
+    self.help = help_text
+    self._values: Dict[LabelKey, float] = {}
+    self._lock = threading.Lock()
+
+  def inc(self, amount: float = 1.0, **labels: str) -> None:
+    key = _label_key(labels)
+    with self._lock:
+      self._values[key] = self._values.get(key, 0.0) + amount
+
+  def value(self, **labels: str) -> float:
+    return self._values.get(_label_key(labels), 0.0)
+
+  def render(self) -> List[str]:
+    lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+    with self._lock:
+      for key, v in sorted(self._values.items()):
+        lines.append(f"{self.name}{_fmt_labels(key)} {_fmt_num(v)}")
+    return lines
+
+
+class Histogram:
+  def __init__(self, name: str, help_text: str, buckets: Sequence[float] = _LATENCY_BUCKETS) -> None:
+    self.name = name
+    self.help = help_text
+    self.buckets = tuple(buckets)
+    # label -> [各桶计数..., sum, count]
+    self._values: Dict[LabelKey, List[float]] = {}
+    self._lock = threading.Lock()
+
+  def observe(self, value: float, **labels: str) -> None:
+    key = _label_key(labels)
+    with self._lock:
+      row = self._values.get(key)
+      if row is None:
+        row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+      for i, b in enumerate(self.buckets):
+        if value <= b:
+          row[i] += 1
+      row[-2] += value
+      row[-1] += 1
+
+  def count(self, **labels: str) -> float:
+    row = self._values.get(_label_key(labels))
+    return row[-1] if row else 0.0
+
+  def render(self) -> List[str]:
+    lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+    with self._lock:
+      for key, row in sorted(self._values.items()):
+        for i, b in enumerate(self.buckets):
+          lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', _fmt_num(b)))} {_fmt_num(row[i])}")
+        lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {_fmt_num(row[-1])}")
+        lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_num(row[-2])}")
+        lines.append(f"{self.name}_count{_fmt_labels(key)} {_fmt_num(row[-1])}")
+    return lines
+
+
+_registry: List = []
+
+
+def _register(metric):
+  _registry.append(metric)
+  return metric
+
+
+HTTP_LATENCY = _register(Histogram("http_request_duration_seconds", "HTTP request latency by route."))
+HTTP_DB_QUERIES = _register(
+  Histogram("http_request_db_queries", "SQL statements executed per HTTP request.", _COUNT_BUCKETS)
+)
+HTTP_DB_TIME = _register(Histogram("http_request_db_seconds", "Time spent in SQL per HTTP request."))
+DB_QUERIES = _register(Counter("db_queries_total", "SQL statements executed."))
+LLM_LATENCY = _register(Histogram("llm_request_duration_seconds", "LLM provider call latency."))
+LLM_TOKENS = _register(Counter("llm_tokens_total", "Tokens reported in the provider usage field."))
+AI_STUB_FALLBACKS = _register(Counter("ai_stub_fallbacks_total", "AIClient calls answered by the built-in stub."))
+AI_CALLS = _register(Counter("ai_calls_total", "AIClient calls by method and source (llm/cache/stub)."))
+AI_CALL_LATENCY = _register(Histogram("ai_call_duration_seconds", "AIClient method latency by source."))
+AI_BREAKER_OPENS = _register(Counter("ai_breaker_opens_total", "Times the LLM circuit breaker opened."))
+CACHE_REQUESTS = _register(Counter("cache_requests_total", "Cache lookups by cache and result."))
+SERVICE_LATENCY = _register(Histogram("service_duration_seconds", "Service-layer function latency."))
+
+
+def render() -> str:
+  lines: List[str] = []
+  for m in _registry:
+    lines.extend(m.render())
+  return "\n".join(lines) + "\n"
+
+
+# ---------- 请求级统计：中间件放一个可变对象进 contextvar，线程池 / 子任务拷贝上下文后仍指向同一个 ----------
+
+
+class RequestStats:
+  __slots__ = ("db_queries", "db_seconds", "ai_calls")
+
+  def __init__(self) -> None:
+    self.db_queries = 0
+    self.db_seconds = 0.0
+    self.ai_calls: List = []
+
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+  "request_stats", default=None
+)
+
+
+def instrument_engine(engine) -> None:
+  """给 engine 挂上 SQL 计数 / 计时。"""
+
+  @event.listens_for(engine, "before_cursor_execute")
+  def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+  @event.listens_for(engine, "after_cursor_execute")
+  def _after(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("_query_start")
+    elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+    DB_QUERIES.inc()
+    stats = _request_stats.get()
+    if stats is not None:
+      stats.db_queries += 1
+      stats.db_seconds += elapsed
+
+
+def record_ai_call(result) -> None:
+  """AIClient._run 每次调用结束时调：计数，并挂到当前请求上供响应头使用。"""
+  AI_CALLS.inc(method=result.method, source=result.source)
+  AI_CALL_LATENCY.observe(result.latency, method=result.method, source=result.source)
+  stats = _request_stats.get()
+  if stats is not None:
+    stats.ai_calls.append(result)
+
+
+def _ai_headers(calls: List) -> List[Tuple[bytes, bytes]]:
+  """X-AI-Source：本次用到的来源；X-AI-Degraded：是否因故障吃了 stub；X-AI-Errors：故障类型。"""
+  if not calls:
+    return []
+  sources = list(dict.fromkeys(c.source for c in calls))
+  errors = list(dict.fromkeys(c.error for c in calls if c.degraded))
+  headers = [
+    (b"x-ai-source", ",".join(sources).encode()),
+    (b"x-ai-degraded", b"1" if errors else b"0"),
+    (b"x-ai-latency-ms", str(int(sum(c.latency for c in calls) * 1000)).encode()),
+  ]
+  if errors:
+    headers.append((b"x-ai-errors", ",".join(errors).encode()))
+  return headers
+
+
+def _route_label(scope) -> str:
+  route = scope.get("route")
+  path = getattr(route, "path", None)
+  if path is None:
+    return "unmatched"
+  return path or "/"
+
+
+class MetricsMiddleware:
+  """纯 ASGI 中间件：不缓冲响应体，WebSocket / 流式响应也能过。"""
+
+  def __init__(self, app) -> None:
+    self.app = app
+
+  async def __call__(self, scope, receive, send) -> None:
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    status = {"code": 500}
+
+    async def send_wrapper(message) -> None:
+      if message["type"] == "http.response.start":
+        status["code"] = message["status"]
+        extra = _ai_headers(stats.ai_calls)
+        if extra:
+          message = dict(message)
+          message["headers"] = list(message.get("headers") or []) + extra
+      await send(message)
+
+    start = time.perf_counter()
+    try:
+      await self.app(scope, receive, send_wrapper)
+    finally:
+      elapsed = time.perf_counter() - start
+      _request_stats.reset(token)
+      route = _route_label(scope)
+      method = scope.get("method", "")
+      HTTP_LATENCY.observe(elapsed, method=method, route=route, status=str(status["code"]))
+      HTTP_DB_QUERIES.observe(stats.db_queries, method=method, route=route)
+      HTTP_DB_TIME.observe(stats.db_seconds, method=method, route=route)
+
+
+def timed(name: str):
+  """services 层函数计时，同步 / 异步都能套。"""
+
+  def deco(fn):
+    if inspect.iscoroutinefunction(fn):
+
+      @functools.wraps(fn)
+      async def async_wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+          return await fn(*args, **kwargs)
+        finally:
+          SERVICE_LATENCY.observe(time.perf_counter() - start, name=name)
+
+      return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+      start = time.perf_counter()
+      try:
+        return fn(*args, **kwargs)
+      finally:
+        SERVICE_LATENCY.observe(time.perf_counter() - start, name=name)
+
+    return wrapper
+
+  return deco
@@ -1,21 +1,37 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
+from sqlalchemy import JSON, Column, Index
+from sqlalchemy.types import TypeDecorator
 from sqlmodel import Field, SQLModel
 
 
+class JSONType(TypeDecorator):
+  """Postgres 上是原生 JSONB，其他库用通用 JSON（SQLite 里就是存 JSON 文本）；postgres 方言用到才 import。"""
+
+  impl = JSON
+  cache_ok = True
+
+  def load_dialect_impl(self, dialect):
+    if dialect.name == "postgresql":
+      from sqlalchemy.dialects.postgresql import JSONB
+
+      return dialect.type_descriptor(JSONB())
+    return dialect.type_descriptor(JSON())
+
+
 class Draft(SQLModel, table=True):
   """立项那几轮对话 + AI 分析结果"""
   id: Optional[str] = Field(default=None, primary_key=True)
-  messages: str = "[]"  # JSON: [{"role":"user"|"system","content":"..."}]
+  messages: List[dict] = Field(default_factory=list, sa_column=Column(JSONType, nullable=False))  # [{"role":"user"|"system","content":"..."}]
   status: str = "chatting"  # chatting | ready
   mode: str = "detail"  # brief | detail | deep
   max_questions: int = 20  # 总问题配额（不含根节点）
   current_questions: int = 0  # 已生成的问题节点数量
   project_title: Optional[str] = None
-  initial_questions: str = "[]"  # JSON: ["q1","q2",...] 仅当 status=ready 时有效
+  initial_questions: List[str] = Field(default_factory=list, sa_column=Column(JSONType, nullable=False))  # ["q1","q2",...] 仅当 status=ready 时有效
   created_at: datetime = Field(default_factory=datetime.utcnow)
   updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -31,27 +47,43 @@ class ProjectBase(SQLModel):
 
 class Project(ProjectBase, table=True):
   id: Optional[str] = Field(default=None, primary_key=True)
+  revision: int = 0  # 每次改动 +1，GET 的 ETag / 序列化缓存都认这个号
   created_at: datetime = Field(default_factory=datetime.utcnow)
   updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+# 节点 status / node_type 的全部取值；紧凑格式（services.compact_nodes）按这里的顺序编号，只能往后加
+NODE_STATUSES = ("red", "green", "ai")
+NODE_TYPES = ("question", "tip")
+
+
 class NodeBase(SQLModel):
-  project_id: str = Field(foreign_key="project.id")
-  parent_id: Optional[str] = Field(default=None, foreign_key="node.id")
+  project_id: str = Field(foreign_key="project.id", index=True)
+  parent_id: Optional[str] = Field(default=None, foreign_key="node.id", index=True)
   level: int
   title: str
   question: str
-  status: str = "red"  # red / green
+  status: str = "red"  # red / green / ai（AI 代答）
   order_index: int = 0
   node_type: str = "question"  # question | tip
 
 
 class Node(NodeBase, table=True):
+  # 「下一个红色问题」索引：按 (项目, 状态, 先序位置) 有序，取下一个就是一次索引查找
+  __table_args__ = (Index("ix_node_project_status_dfs", "project_id", "status", "dfs_key"),)
+
   id: Optional[str] = Field(default=None, primary_key=True)
+  # 先序位置：祖先链上每层 order_index 补零后用 / 拼起来，按字符串排序即先序遍历顺序
+  dfs_key: str = ""
+  # 子树计数（不含自身，口径同进度：Tips 和根节点不算），由 services 沿祖先链维护
+  sub_total: int = 0
+  sub_green: int = 0
+  sub_red: int = 0
 
 
 class NodeAnswerBase(SQLModel):
-  node_id: str = Field(foreign_key="node.id")
+  # 按节点取回答（作答、融合、导出时和节点连表）都走这个索引
+  node_id: str = Field(foreign_key="node.id", index=True)
   content: str
 
 
@@ -69,3 +101,39 @@ class ProjectDialogBase(SQLModel):
 class ProjectDialog(ProjectDialogBase, table=True):
   id: Optional[int] = Field(default=None, primary_key=True)
   created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class NodeChange(SQLModel, table=True):
+  """节点变更日志：每次 revision +1 时记下动了哪些节点，给 /changes 增量同步用。"""
+  __table_args__ = (Index("ix_nodechange_project_revision", "project_id", "revision"),)
+
+  id: Optional[int] = Field(default=None, primary_key=True)
+  project_id: str = Field(foreign_key="project.id")
+  revision: int
+  node_id: str = Field(foreign_key="node.id")
+  kind: str  # added / updated / status
+
+
+class MergedSection(SQLModel, table=True):
+  """融合文档按一级分支分段存的成稿；digest 对不上（分支里问答改了）才重新让模型整理。"""
+  __table_args__ = (Index("ix_mergedsection_project_branch", "project_id", "branch_id", unique=True),)
+
+  id: Optional[int] = Field(default=None, primary_key=True)
+  project_id: str = Field(foreign_key="project.id")
+  branch_id: str = Field(foreign_key="node.id")
+  digest: str  # 分支路径 + 问题 + 回答 + 模型的 sha256
+  content: str
+  updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class SearchDoc(SQLModel, table=True):
+  """全文检索的文档：项目 / 节点 / 回答各一行，services 写库时同步维护，检索见 backend/search.py。"""
+  __table_args__ = (Index("ix_searchdoc_kind_ref", "kind", "ref_id", unique=True),)
+
+  id: Optional[int] = Field(default=None, primary_key=True)
+  kind: str  # project | node | answer
+  ref_id: str  # 对应行的 id（回答是整数 id 转成字符串）
+  project_id: str = Field(index=True)
+  node_id: Optional[str] = None  # 节点 / 回答所属节点
+  title: str = ""
+  body: str = ""
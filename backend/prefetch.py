@@ -0,0 +1,99 @@
+"""
+回答后的预取：用户答完一个节点，下一步多半是「追问」（spawn）或「Tips」（tips/candidates），
+两者都要等一次模型调用。answer 落库后就在后台把这两次调用先发出去，结果按节点存着，
+真正的请求来了直接拿（还在算就接着等，总比从头算快）。
+
+- 每条结果带着当时那条回答的 id，节点有了新回答就作废，取的时候 id 对不上也不用；
+- 按节点数 LRU 封顶（AI_PREFETCH_SIZE，默认 256），被挤掉的还在跑的任务直接取消；
+- 结果只在本进程；多 worker 时另一个 worker 拿不到任务，但同样的 prompt 会命中共享的回复缓存；
+- 只在接了真模型时预取（stub 本来就是瞬间出结果），AI_PREFETCH=0 关掉。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from . import metrics
+from .ai_client import AICallResult
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+  def __init__(self, max_nodes: int = 256, enabled: bool = True) -> None:
+    self.max_nodes = max_nodes
+    self.enabled = enabled
+    # node_id -> kind -> (回答 id, 任务)
+    self._entries: "OrderedDict[str, dict]" = OrderedDict()
+
+  @classmethod
+  def from_env(cls) -> "Prefetcher":
+    enabled = (os.getenv("AI_PREFETCH") or "1").strip().lower() not in ("0", "false", "off")
+    return cls(int(os.getenv("AI_PREFETCH_SIZE") or 256), enabled)
+
+  def schedule(self, kind: str, node_id: str, version: Any, factory: Callable[[], Awaitable[Any]]) -> None:
+    """factory 返回可用结果，或 None 表示这次没拿到（出错 / 降级），取的时候当没预取。"""
+    if not self.enabled:
+      return
+
+    async def run() -> Any:
+      try:
+        return await factory()
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:  # 预取失败不影响任何人，正式请求会自己再调
+        logger.info("prefetch %s for %s failed: %s", kind, node_id, e)
+        return None
+
+    # 用空的 context 跑：别把这次模型调用算到触发它的那个请求头上
+    task = asyncio.get_running_loop().create_task(run(), context=contextvars.Context())
+    kinds = self._entries.setdefault(node_id, {})
+    old = kinds.get(kind)
+    if old is not None and old[0] != version:
+      old[1].cancel()
+    kinds[kind] = (version, task)
+    self._entries.move_to_end(node_id)
+    while len(self._entries) > self.max_nodes:
+      _, evicted = self._entries.popitem(last=False)
+      for _, t in evicted.values():
+        t.cancel()
+
+  def invalidate(self, node_id: str) -> None:
+    for _, task in (self._entries.pop(node_id, None) or {}).values():
+      task.cancel()
+
+  async def take(self, kind: str, node_id: str, version: Any, method: str) -> Optional[Any]:
+    """拿预取结果；没有、回答已变、失败了都返回 None。用上了会记一次 source=prefetch 的 AI 调用。"""
+    entry = (self._entries.get(node_id) or {}).get(kind)
+    if entry is None or entry[0] != version:
+      metrics.CACHE_REQUESTS.inc(cache="prefetch", result="miss" if entry is None else "stale")
+      return None
+    start = time.perf_counter()
+    pending = not entry[1].done()
+    try:
+      value = await asyncio.shield(entry[1])
+    except asyncio.CancelledError:
+      if not entry[1].cancelled():
+        raise  # 是这次请求自己被取消了
+      value = None
+    if value is None:
+      metrics.CACHE_REQUESTS.inc(cache="prefetch", result="failed")
+      return None
+    metrics.CACHE_REQUESTS.inc(cache="prefetch", result="pending" if pending else "hit")
+    metrics.record_ai_call(AICallResult(method=method, source="prefetch", latency=time.perf_counter() - start, value=value))
+    return value
+
+  def clear(self) -> None:
+    for kinds in self._entries.values():
+      for _, task in kinds.values():
+        task.cancel()
+    self._entries.clear()
+
+
+prefetcher = Prefetcher.from_env()
@@ -0,0 +1,230 @@
+"""
+LLM 流量录制：配置 AI_RECORD_PATH 后，每次模型调用和触发它的 HTTP 请求都追加一行 JSON 到这个文件。
+
+- type=llm：prompt、回复、耗时、usage、错误；key 是 llm_sim.prompt_key（脱敏过的按脱敏后的 prompt 算），
+  AI_SIM_REPLAY 直接拿来回放；
+- type=http：方法、路径、请求体、状态码、耗时，以及响应里出现的 id（按出现顺序），
+  benchmarks/replay.py 重放时用它把旧 id 对上新 id。
+两类记录用 rid 关联：某次请求里发生的模型调用和这次请求的 rid 相同。
+
+AI_RECORD_REDACT 控制脱敏，逗号分隔：
+  secrets    （默认）邮箱、手机号、sk- 开头的 key 等替换成占位符
+  prompts    不存 prompt 原文，只留 key 和长度（回放仍按 key 匹配）
+  responses  不存模型回复原文
+  bodies     不存 HTTP 请求体（这样的请求重放时会跳过）
+  none       什么都不脱
+
+多 worker 同时写同一个文件也没关系：每条记录一次 write，O_APPEND 保证不会交错。
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, List, Optional
+
+_ID = re.compile(r"\b[0-9a-f]{32}\b")
+_SECRETS = [
+  (re.compile(r"sk-[A-Za-z0-9_\-]{8,}"), "[key]"),
+  (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "[email]"),
+  (re.compile(r"(?<!\d)1[3-9]\d{9}(?!\d)"), "[phone]"),
+  (re.compile(r"(?<!\d)\d{17}[\dXx](?!\d)"), "[id_card]"),
+]
+# 请求体超过这个大小（比如上传的文档）就不存原文
+_MAX_BODY = 64 * 1024
+
+# 当前 HTTP 请求的录制编号，由 RecordingMiddleware 设置
+current_rid: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("record_rid", default=None)
+
+
+def _scrub(text: str) -> str:
+  for pattern, repl in _SECRETS:
+    text = pattern.sub(repl, text)
+  return text
+
+
+def _scrub_obj(obj: Any) -> Any:
+  if isinstance(obj, str):
+    return _scrub(obj)
+  if isinstance(obj, list):
+    return [_scrub_obj(x) for x in obj]
+  if isinstance(obj, dict):
+    return {k: _scrub_obj(v) for k, v in obj.items()}
+  return obj
+
+
+def _placeholder(text: str) -> str:
+  return f"[redacted:{len(text)}]"
+
+
+class TrafficRecorder:
+  def __init__(self, path: str, redact: str = "secrets") -> None:
+    self.path = path
+    modes = {m.strip().lower() for m in (redact or "").split(",") if m.strip()}
+    self.redact = set() if "none" in modes else (modes or {"secrets"})
+    self._lock = threading.Lock()
+
+  @classmethod
+  def from_env(cls) -> Optional["TrafficRecorder"]:
+    path = (os.getenv("AI_RECORD_PATH") or "").strip()
+    if not path:
+      return None
+    return cls(path, os.getenv("AI_RECORD_REDACT") or "secrets")
+
+  def _write(self, entry: dict) -> None:
+    line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+    data = line.encode("utf-8")
+    with self._lock:
+      fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+      try:
+        os.write(fd, data)
+      finally:
+        os.close(fd)
+
+  def _text(self, text: str, mode: str) -> str:
+    if mode in self.redact:
+      return _placeholder(text)
+    return _scrub(text) if "secrets" in self.redact else text
+
+  def record_llm(
+    self,
+    *,
+    key: str,
+    method: Optional[str],
+    model: str,
+    provider: str,
+    messages: List[dict],
+    response: str,
+    latency: float,
+    usage: Optional[dict],
+    error: Optional[str] = None,
+    status: Optional[int] = None,
+  ) -> None:
+    if "secrets" in self.redact:
+      from .llm_sim import prompt_key
+
+      # 请求体也是脱敏后存的，重放时拼出来的 prompt 里就是占位符；键按脱敏后的算才对得上
+      scrubbed = [{**m, "content": _scrub(m["content"])} if isinstance(m.get("content"), str) else m for m in messages]
+      if scrubbed != messages:
+        key = prompt_key(scrubbed)
+    entry = {
+      "type": "llm",
+      "ts": time.time(),
+      "pid": os.getpid(),
+      "rid": current_rid.get(),
+      "key": key,
+      "method": method,
+      "model": model,
+      "provider": provider,
+      "messages": [{**m, "content": self._text(str(m.get("content", "")), "prompts")} for m in messages],
+      "response": self._text(response, "responses"),
+      "latency": round(latency, 4),
+      "usage": usage or {},
+    }
+    if error:
+      entry["error"] = error
+      if status:
+        entry["status"] = status
+    self._write(entry)
+
+  def record_http(
+    self,
+    *,
+    method: str,
+    path: str,
+    query: str,
+    body: Optional[bytes],
+    status: int,
+    latency: float,
+    started: float,
+    response_body: bytes,
+    rid: str,
+  ) -> None:
+    entry: dict = {
+      "type": "http",
+      "ts": started,
+      "pid": os.getpid(),
+      "rid": rid,
+      "method": method,
+      "path": path,
+      "query": query,
+      "status": status,
+      "latency": round(latency, 4),
+      # 响应里的 id 按出现顺序记下来，重放时和新响应逐个对应
+      "ids": list(dict.fromkeys(_ID.findall(response_body.decode("utf-8", errors="ignore")))),
+    }
+    if body:
+      if "bodies" in self.redact or len(body) > _MAX_BODY:
+        entry["body_redacted"] = len(body)
+      else:
+        try:
+          parsed = json.loads(body)
+          entry["body"] = _scrub_obj(parsed) if "secrets" in self.redact else parsed
+        except ValueError:
+          entry["body_redacted"] = len(body)
+    self._write(entry)
+
+
+recorder = TrafficRecorder.from_env()
+
+
+class RecordingMiddleware:
+  """把 /api 下的 HTTP 请求连同请求体、响应里的 id 记下来；只在开了录制时挂上。"""
+
+  def __init__(self, app, rec: TrafficRecorder) -> None:
+    self.app = app
+    self.rec = rec
+
+  async def __call__(self, scope, receive, send) -> None:
+    if scope["type"] != "http" or not scope.get("path", "").startswith("/api/"):
+      await self.app(scope, receive, send)
+      return
+
+    body_parts: List[bytes] = []
+    resp_parts: List[bytes] = []
+    state = {"status": 500, "size": 0}
+
+    async def receive_wrapper():
+      message = await receive()
+      if message["type"] == "http.request":
+        body_parts.append(message.get("body", b""))
+      return message
+
+    async def send_wrapper(message) -> None:
+      if message["type"] == "http.response.start":
+        state["status"] = message["status"]
+      elif message["type"] == "http.response.body":
+        chunk = message.get("body", b"")
+        # 只为了抠 id，响应太大就不再往下攒了
+        if state["size"] < 4 * 1024 * 1024:
+          resp_parts.append(chunk)
+          state["size"] += len(chunk)
+      await send(message)
+
+    rid = uuid.uuid4().hex[:12]
+    token = current_rid.set(rid)
+    started = time.time()
+    t0 = time.perf_counter()
+    try:
+      await self.app(scope, receive_wrapper, send_wrapper)
+    finally:
+      current_rid.reset(token)
+      try:
+        self.rec.record_http(
+          method=scope.get("method", ""),
+          path=scope.get("path", ""),
+          query=(scope.get("query_string") or b"").decode("latin-1"),
+          body=b"".join(body_parts) or None,
+          status=state["status"],
+          latency=time.perf_counter() - t0,
+          started=started,
+          response_body=b"".join(resp_parts),
+          rid=rid,
+        )
+      except Exception:  # 录制失败不能影响请求本身
+        pass
@@ -40,12 +40,47 @@ class ProjectOut(BaseModel):
   name: str
   ideaText: str
   status: str
+  revision: int = 0
   created_at: datetime
   updated_at: datetime
   nodes: List[NodeOut]
   progress: ProgressOut
 
 
+class NodeDelta(BaseModel):
+  kind: str  # added / updated / status
+  node: NodeOut
+
+
+class ProjectChangesOut(BaseModel):
+  id: str
+  status: str
+  since: int
+  revision: int
+  reset: bool = False  # True 时增量不可用，前端应整棵重拉
+  changes: List[NodeDelta]
+  progress: ProgressOut
+
+
+class SubtreeNodeOut(NodeOut):
+  child_count: int = 0
+  progress: ProgressOut  # 该节点子树内（不含自身）的问题进度
+
+
+class SubtreeOut(BaseModel):
+  id: str
+  parent_id: Optional[str] = None
+  depth: int
+  revision: int
+  nodes: List[SubtreeNodeOut]
+
+
+class NextTaskOut(BaseModel):
+  nextNodeId: Optional[str] = None
+  node: Optional[NodeOut] = None
+  progress: ProgressOut
+
+
 class ProjectListItem(BaseModel):
   id: str
   name: str
@@ -74,10 +109,58 @@ class NodeAnswerResponse(BaseModel):
   addedNodes: Optional[List[NodeOut]] = None
 
 
+class BatchAnswerItem(BaseModel):
+  node_id: str
+  content: str
+  by_ai: bool = False
+
+
+class BatchAnswerRequest(BaseModel):
+  answers: List[BatchAnswerItem]
+
+
+class BatchAnswerResponse(ProjectChangesOut):
+  # 整批回答合并后的增量，since 是提交前的 revision
+  nextNodeId: Optional[str] = None
+
+
+class AutopilotJobOut(BaseModel):
+  id: str
+  project_id: str
+  status: str  # running / done / cancelled / failed
+  total: int
+  generated: int
+  saved: int
+  skipped: int
+  failed: int
+  error: Optional[str] = None
+  started_at: datetime
+  finished_at: Optional[datetime] = None
+
+
 class MergeResponse(BaseModel):
   content: str
 
 
+class SearchHit(BaseModel):
+  kind: str  # project | node | answer
+  project_id: str
+  project_name: str
+  node_id: Optional[str] = None
+  answer_id: Optional[int] = None
+  title: str
+  snippet: str
+  score: float
+
+
+class SearchResponse(BaseModel):
+  query: str
+  total: int
+  offset: int
+  limit: int
+  hits: List[SearchHit]
+
+
 class ShortTitleResponse(BaseModel):
   title: str
 
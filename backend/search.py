@@ -0,0 +1,317 @@
+"""
+全文检索：项目名 / 构想、节点标题 / 问题、回答内容。
+
+- 文档都在 searchdoc 表（models.SearchDoc）里，services 写库时顺手 upsert（index_* 这几个函数），
+  和业务数据同一个事务提交；
+- SQLite：searchdoc 外挂一张 FTS5 表，trigram 分词（中文不需要分词器），触发器同步；
+  SQLite 太老（< 3.34）没有 trigram 分词器时不建 FTS 表，全部退回 LIKE；
+- Postgres：tsvector 的分词器切不开中文，改用 pg_trgm 的 GIN 索引（同样是 trigram）加速 ILIKE；
+- 排序和分页都在 SQL 里做，只取回这一页：走 FTS 时用 bm25()（标题权重高）；
+  走 LIKE 时用同样权重的简化 BM25 表达式（_score_sql），ORDER BY ... LIMIT 在库里取前 N；
+  命中总数另数一次，第一页没取满时就不用数了；
+- trigram 至少 3 个字才走索引，1~2 个字的词在索引结果上再加 LIKE 过滤，全是短词才整个退回 LIKE（扫一遍表）；
+  限定项目时按 project_id 索引扫这个项目的文档，不走全库 MATCH。
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+logger = logging.getLogger(__name__)
+
+# 计入结构指纹：加一后老库启动时会重新跑一遍 ensure_index
+INDEX_VERSION = 1
+MAX_TERMS = 8
+# 标题 / 正文在相关度里的权重，FTS 的 bm25() 和 _score_sql 共用
+_TITLE_WEIGHT, _BODY_WEIGHT = 4.0, 1.0
+# _score_sql 用的 BM25 参数；正文平均长度按节点问题 / 回答的常见长度估
+_K1, _B, _AVG_BODY = 1.2, 0.75, 60.0
+_SNIPPET_WIDTH = 60
+# 各库有没有 FTS 表（库地址 -> 有没有），第一次查询时看一眼
+_fts_tables: Dict[str, bool] = {}
+
+_SQLITE_DDL = [
+  "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+  "title, body, content='searchdoc', content_rowid='id', tokenize='trigram')",
+  "CREATE TRIGGER IF NOT EXISTS searchdoc_ai AFTER INSERT ON searchdoc BEGIN "
+  "INSERT INTO search_index(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+  "CREATE TRIGGER IF NOT EXISTS searchdoc_ad AFTER DELETE ON searchdoc BEGIN "
+  "INSERT INTO search_index(search_index, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+  "CREATE TRIGGER IF NOT EXISTS searchdoc_au AFTER UPDATE ON searchdoc BEGIN "
+  "INSERT INTO search_index(search_index, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+  "INSERT INTO search_index(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+
+_POSTGRES_DDL = [
+  "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+  "CREATE INDEX IF NOT EXISTS ix_searchdoc_text_trgm ON searchdoc USING gin ((title || ' ' || body) gin_trgm_ops)",
+]
+
+_BACKFILL = """
+INSERT INTO searchdoc (kind, ref_id, project_id, node_id, title, body)
+SELECT 'project', id, id, NULL, name, idea_text FROM project
+UNION ALL
+SELECT 'node', id, project_id, id, title, question FROM node
+UNION ALL
+SELECT 'answer', CAST(a.id AS TEXT), n.project_id, a.node_id, '', a.content
+FROM nodeanswer a JOIN node n ON n.id = a.node_id
+"""
+
+_UPSERT = text(
+  "INSERT INTO searchdoc (kind, ref_id, project_id, node_id, title, body) "
+  "VALUES (:kind, :ref_id, :project_id, :node_id, :title, :body) "
+  "ON CONFLICT (kind, ref_id) DO UPDATE SET title = excluded.title, body = excluded.body"
+)
+
+
+def ensure_index(engine) -> None:
+  """建 FTS 表 / trigram 索引；searchdoc 还是空的（老库刚升级）就从现有数据回填一遍。由 init_db 调。"""
+  sqlite = engine.dialect.name == "sqlite"
+  with engine.begin() as conn:
+    fresh_fts = sqlite and conn.execute(
+      text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+    ).first() is None
+    ddl = _SQLITE_DDL if sqlite else _POSTGRES_DDL
+    if fresh_fts:
+      try:
+        with conn.begin_nested():
+          conn.execute(text(ddl[0]))
+      except OperationalError as e:
+        # 老 SQLite 没有 trigram 分词器：不建 FTS 表和触发器，查询全走 LIKE
+        logger.warning("FTS5 trigram tokenizer unavailable, search falls back to LIKE: %s", e)
+        ddl, fresh_fts = [], False
+    for stmt in ddl:
+      conn.execute(text(stmt))
+    if conn.execute(text("SELECT 1 FROM searchdoc LIMIT 1")).first() is None:
+      conn.execute(text(_BACKFILL))  # 触发器顺带把 FTS 填上
+    elif fresh_fts:
+      # searchdoc 已有数据但 FTS 表是刚建的，按外挂内容重建一遍
+      conn.execute(text("INSERT INTO search_index(search_index) VALUES ('rebuild')"))
+  _fts_tables.pop(str(engine.url), None)
+
+
+def _has_fts(session: Session) -> bool:
+  bind = session.get_bind()
+  if bind.dialect.name != "sqlite":
+    return False
+  key = str(bind.url)
+  if key not in _fts_tables:
+    _fts_tables[key] = session.execute(
+      text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+    ).first() is not None
+  return _fts_tables[key]
+
+
+# ---------- 写入：services 在改数据的同一个 session 里调 ----------
+
+
+def _upsert(session: Session, docs: List[dict]) -> None:
+  if docs:
+    session.execute(_UPSERT, docs)
+
+
+def index_project(session: Session, project) -> None:
+  _upsert(
+    session,
+    [
+      {
+        "kind": "project",
+        "ref_id": project.id,
+        "project_id": project.id,
+        "node_id": None,
+        "title": project.name or "",
+        "body": project.idea_text or "",
+      }
+    ],
+  )
+
+
+def index_nodes(session: Session, nodes: Iterable) -> None:
+  _upsert(
+    session,
+    [
+      {
+        "kind": "node",
+        "ref_id": n.id,
+        "project_id": n.project_id,
+        "node_id": n.id,
+        "title": n.title or "",
+        "body": n.question or "",
+      }
+      for n in nodes
+    ],
+  )
+
+
+def index_answers(session: Session, pairs: Iterable[Tuple]) -> None:
+  """pairs 是 (节点, 回答)；回答要先 flush 拿到 id。"""
+  _upsert(
+    session,
+    [
+      {
+        "kind": "answer",
+        "ref_id": str(answer.id),
+        "project_id": node.project_id,
+        "node_id": node.id,
+        "title": "",
+        "body": answer.content or "",
+      }
+      for node, answer in pairs
+    ],
+  )
+
+
+# ---------- 查询 ----------
+
+
+def _terms(q: str) -> List[str]:
+  seen: List[str] = []
+  for t in (q or "").split():
+    if t not in seen:
+      seen.append(t)
+  return seen[:MAX_TERMS]
+
+
+def _like(term: str) -> str:
+  return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _snippet(body: str, terms: List[str]) -> str:
+  """取第一个命中词前后一段；没命中（比如只命中了标题）就取开头。"""
+  body = " ".join((body or "").split())
+  lowered = body.lower()
+  pos = min((p for p in (lowered.find(t.lower()) for t in terms) if p >= 0), default=0)
+  start = max(pos - _SNIPPET_WIDTH // 3, 0)
+  end = start + _SNIPPET_WIDTH
+  return ("…" if start else "") + body[start:end] + ("…" if end < len(body) else "")
+
+
+def _where(sqlite: bool, fts: bool, terms: List[str], project_id: Optional[str], params: dict) -> Tuple[List[str], List[str]]:
+  """(交给 FTS MATCH 的词, 其余的 SQL 条件)。"""
+  where: List[str] = []
+  op = "LIKE" if sqlite else "ILIKE"
+  # 限定项目时按 project_id 索引只扫这个项目的文档，比全库 MATCH 再按项目筛快一个量级
+  indexed = [t for t in terms if len(t) >= 3] if fts and not project_id else []
+  for i, t in enumerate(terms):
+    if t in indexed:
+      continue
+    # trigram 索引管不到的短词、限定项目时、没有 FTS 时（Postgres 上 ILIKE 走 pg_trgm 索引）用 LIKE 过滤
+    params[f"t{i}"] = _like(t)
+    where.append(f"(d.title {op} :t{i} ESCAPE '\\' OR d.body {op} :t{i} ESCAPE '\\')")
+  if project_id:
+    where.append("d.project_id = :project_id")
+    params["project_id"] = project_id
+  if indexed:
+    params["match"] = " AND ".join('"' + t.replace('"', '""') + '"' for t in indexed)
+  return indexed, where
+
+
+_FIELDS = ("id", "kind", "ref_id", "project_id", "node_id", "title", "body")
+_COLS = ", ".join(f"d.{f}" for f in _FIELDS)
+
+
+def _total(session: Session, count_sql: str, params: dict, rows: list, limit: int, offset: int) -> int:
+  # 第一页都没取满就是全部命中，省掉一次 COUNT（LIKE 时这是一遍全表扫）
+  if offset == 0 and len(rows) < limit:
+    return len(rows)
+  return session.execute(text(count_sql), params).scalar_one()
+
+
+def _fts_page(session: Session, where: List[str], params: dict, limit: int, offset: int) -> Tuple[int, list]:
+  """FTS 里按 bm25() 排好只取这一页；总数另数（COUNT 不用算 bm25，快得多）。分数取相反数，越大越相关。"""
+  base = "FROM search_index JOIN searchdoc d ON d.id = search_index.rowid WHERE search_index MATCH :match" + "".join(
+    f" AND {w}" for w in where
+  )
+  rows = session.execute(
+    text(
+      f"SELECT {_COLS}, -bm25(search_index, {_TITLE_WEIGHT}, {_BODY_WEIGHT}) AS score {base} "
+      "ORDER BY score DESC, d.id DESC LIMIT :limit OFFSET :offset"
+    ),
+    {**params, "limit": limit, "offset": offset},
+  ).all()
+  # 没有额外条件时只数 FTS 表，不用连 searchdoc
+  count = "SELECT COUNT(*) FROM search_index WHERE search_index MATCH :match" if not where else f"SELECT COUNT(*) {base}"
+  return _total(session, count, params, rows, limit, offset), [(r.score, r) for r in rows]
+
+
+def _tf(column: str, i: int) -> str:
+  """词 i 在列里出现几次（整数）。"""
+  term = f"CAST(:l{i} AS TEXT)"
+  return f"((LENGTH(LOWER({column})) - LENGTH(REPLACE(LOWER({column}), {term}, ''))) / LENGTH({term}))"
+
+
+def _score_sql(terms: List[str], params: dict) -> Tuple[str, str]:
+  """(子查询里每行算一次的词频列, 外层的打分表达式)。
+  简化的 BM25（命中的文档每个词都有，IDF 差别不大，略去）：词频饱和 + 正文长度归一，标题加权。"""
+  columns = ["LENGTH(d.body) AS body_len"]
+  parts = []
+  norm = f"({1 - _B} + {_B} * body_len / {_AVG_BODY})"
+  for i, t in enumerate(terms):
+    params[f"l{i}"] = t.lower()
+    columns += [f"{_tf('d.title', i)} AS tft{i}", f"{_tf('d.body', i)} AS tfb{i}"]
+    parts.append(f"{_TITLE_WEIGHT * (_K1 + 1)} * tft{i} / (tft{i} + {_K1})")
+    parts.append(f"{_BODY_WEIGHT * (_K1 + 1)} * tfb{i} / (tfb{i} + {_K1} * {norm})")
+  return ", ".join(columns), " + ".join(parts)
+
+
+def _like_page(session: Session, terms: List[str], where: List[str], params: dict, limit: int, offset: int) -> Tuple[int, list]:
+  """没法用 FTS 的查询：打分和取前 N 都在库里做，只取回这一页。"""
+  base = f"FROM searchdoc d WHERE {' AND '.join(where)}"
+  columns, score = _score_sql(terms, params)
+  rows = session.execute(
+    text(
+      f"SELECT {', '.join(_FIELDS)}, {score} AS score FROM (SELECT {_COLS}, {columns} {base}) m "
+      "ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset"
+    ),
+    {**params, "limit": limit, "offset": offset},
+  ).all()
+  return _total(session, f"SELECT COUNT(*) {base}", params, rows, limit, offset), [(r.score, r) for r in rows]
+
+
+def _lookup(session: Session, sql: str, ids: List[str]) -> Dict[str, str]:
+  if not ids:
+    return {}
+  stmt = text(sql).bindparams(bindparam("ids", expanding=True))
+  return dict(session.execute(stmt, {"ids": ids}).all())
+
+
+def search(session: Session, q: str, project_id: Optional[str] = None, limit: int = 20, offset: int = 0) -> dict:
+  """返回 {"total", "hits"}；hits 按相关度排，带项目名、节点 id 和正文摘要。"""
+  terms = _terms(q)
+  if not terms:
+    raise ValueError("empty_query")
+  params: Dict[str, object] = {}
+  sqlite = session.get_bind().dialect.name == "sqlite"
+  indexed, where = _where(sqlite, _has_fts(session), terms, project_id, params)
+  if indexed:
+    total, page = _fts_page(session, where, params, limit, offset)
+  else:
+    total, page = _like_page(session, terms, where, params, limit, offset)
+  rows = [r for _, r in page]
+
+  # 回答没有标题，显示所属节点的标题；项目名一起查出来
+  project_ids = sorted({r.project_id for r in rows})
+  node_ids = sorted({r.node_id for r in rows if r.kind == "answer" and r.node_id})
+  names = _lookup(session, "SELECT id, name FROM project WHERE id IN :ids", project_ids)
+  titles = _lookup(session, "SELECT id, title FROM node WHERE id IN :ids", node_ids)
+
+  hits = []
+  for score, r in page:
+    hits.append(
+      {
+        "kind": r.kind,
+        "project_id": r.project_id,
+        "project_name": names.get(r.project_id, ""),
+        "node_id": r.node_id,
+        "answer_id": int(r.ref_id) if r.kind == "answer" else None,
+        "title": titles.get(r.node_id, "") if r.kind == "answer" else r.title,
+        "snippet": _snippet(r.body, terms),
+        "score": round(score, 4),
+      }
+    )
+  return {"total": total, "hits": hits}
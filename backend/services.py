@@ -1,15 +1,27 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import logging
+import os
+import time
+from collections import defaultdict
+from dataclasses import asdict
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from uuid import uuid4
 
-from sqlmodel import Session, select
+from sqlmodel import Session, delete, func, select, update
 
-from .ai_client import AIClient
-from .models import Draft, Node, NodeAnswer, Project, ProjectDialog
+from . import metrics, search, shared_state, similarity
+from .ai_client import AICallResult, AIClient, NodeDraft
+from .cache import dumps
+from .db import engine
+from .events import broker
+from .idea_templates import idea_templates
+from .models import NODE_STATUSES, NODE_TYPES, Draft, MergedSection, Node, NodeAnswer, NodeChange, Project, ProjectDialog
+from .prefetch import prefetcher
 
 logger = logging.getLogger(__name__)
 
@@ -25,12 +37,18 @@ def _short_title(text: str, fallback: str) -> str:
 
 
 def flatten_nodes(nodes: List[Node], parent_id: Optional[str] = None) -> List[Node]:
+  # 先按父节点分组再展开，几千个节点也是线性的
+  children: Dict[Optional[str], List[Node]] = defaultdict(list)
+  for n in nodes:
+    children[n.parent_id].append(n)
   tree: List[Node] = []
-  children = [n for n in nodes if n.parent_id == parent_id]
-  children.sort(key=lambda n: n.order_index)
-  for c in children:
-    tree.append(c)
-    tree.extend(flatten_nodes(nodes, c.id))
+
+  def walk(pid: Optional[str]) -> None:
+    for c in sorted(children.get(pid, ()), key=lambda n: n.order_index):
+      tree.append(c)
+      walk(c.id)
+
+  walk(parent_id)
   return tree
 
 
@@ -47,6 +65,142 @@ def calc_progress(all_nodes: List[Node]) -> Tuple[int, int, int]:
   return total, green, percent
 
 
+# 子树计数：每个节点记着自己所有后代（不含自身）里的问题数、已完成数、红色数，
+# 口径同 calc_progress。加节点 / 改状态时沿祖先链一条 UPDATE 维护，进度和溯源都不用再扫全树。
+
+
+def _is_question(n: Node) -> bool:
+  return getattr(n, "node_type", "question") != "tip" and (n.level or 0) > 0
+
+
+def _own_counts(n: Node) -> Tuple[int, int, int]:
+  """(total, green, red) 里这个节点自己占的那份。"""
+  if not _is_question(n):
+    return 0, 0, 0
+  if n.status in ("green", "ai"):
+    return 1, 1, 0
+  return 1, 0, 1 if n.status == "red" else 0
+
+
+def _percent(total: int, green: int) -> int:
+  return int(round((green / total) * 100)) if total else 0
+
+
+def fill_aggregates(nodes: List[Node]) -> None:
+  """按给定的整棵树在内存里重算所有子树计数；建项目和老数据回填都用它。"""
+  by_id = {n.id: n for n in nodes}
+  for n in nodes:
+    n.sub_total = n.sub_green = n.sub_red = 0
+  for n in nodes:
+    t, g, r = _own_counts(n)
+    if not t:
+      continue
+    pid = n.parent_id
+    while pid and pid in by_id:
+      p = by_id[pid]
+      p.sub_total += t
+      p.sub_green += g
+      p.sub_red += r
+      pid = p.parent_id
+
+
+def _dfs_key(parent_key: str, order_index: int) -> str:
+  seg = f"{max(order_index or 0, 0):06d}"
+  return f"{parent_key}/{seg}" if parent_key else seg
+
+
+def fill_dfs_keys(nodes: List[Node]) -> None:
+  """同 fill_aggregates，在内存里给整棵树算先序位置。"""
+  by_id = {n.id: n for n in nodes}
+  done: dict = {}
+
+  def key_of(n: Node) -> str:
+    if n.id not in done:
+      parent = by_id.get(n.parent_id) if n.parent_id else None
+      done[n.id] = _dfs_key(key_of(parent) if parent else "", n.order_index)
+    return done[n.id]
+
+  for n in flatten_nodes(nodes):
+    n.dfs_key = key_of(n)
+
+
+def rebuild_tree_index(session: Session, project_id: str) -> None:
+  """重算整个项目的子树计数和先序位置；老数据回填用。"""
+  nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
+  fill_aggregates(nodes)
+  fill_dfs_keys(nodes)
+  for n in nodes:
+    session.add(n)
+
+
+def _bump_ancestors(session: Session, node: Node, dt: int, dg: int, dr: int) -> None:
+  if not (dt or dg or dr):
+    return
+  ids: List[str] = []
+  pid = node.parent_id
+  while pid:
+    ids.append(pid)
+    parent = session.get(Node, pid)
+    pid = parent.parent_id if parent else None
+  if ids:
+    session.exec(
+      update(Node)
+      .where(Node.id.in_(ids))
+      .values(
+        sub_total=Node.sub_total + dt,
+        sub_green=Node.sub_green + dg,
+        sub_red=Node.sub_red + dr,
+      )
+    )
+
+
+def add_node(session: Session, node: Node) -> None:
+  """新节点入库，顺带算好先序位置、计入各祖先的子树计数。"""
+  parent = session.get(Node, node.parent_id) if node.parent_id else None
+  node.dfs_key = _dfs_key(parent.dfs_key if parent else "", node.order_index)
+  session.add(node)
+  _bump_ancestors(session, node, *_own_counts(node))
+  search.index_nodes(session, [node])
+
+
+def set_node_status(session: Session, project: Project, node: Node, status: str) -> None:
+  """改节点状态，同步祖先计数并记一条 status 变更。"""
+  before = _own_counts(node)
+  node.status = status
+  session.add(node)
+  after = _own_counts(node)
+  _bump_ancestors(session, node, *(a - b for a, b in zip(after, before)))
+  record_change(session, project, node, "status")
+
+
+def next_red_node(session: Session, project_id: str, after_key: str = "") -> Optional[Node]:
+  """
+  先序遍历顺序里 after_key 之后的第一个红色问题，到末尾就从头绕回来。
+  走 (project_id, status, dfs_key) 索引，一次范围查找，不扫树。
+  """
+  def first(cond) -> Optional[Node]:
+    return session.exec(
+      select(Node)
+      .where(
+        Node.project_id == project_id,
+        Node.status == "red",
+        cond,
+        Node.node_type != "tip",
+        Node.level > 0,
+      )
+      .order_by(Node.dfs_key)
+      .limit(1)
+    ).first()
+
+  found = first(Node.dfs_key > after_key) if after_key else None
+  return found or first(Node.dfs_key >= "")
+
+
+def _next_order_index(session: Session, parent_id: str) -> int:
+  cur = session.exec(select(func.max(Node.order_index)).where(Node.parent_id == parent_id)).one()
+  return (cur or 0) + 1
+
+
 # Draft 立项对话
 
 
@@ -60,11 +214,12 @@ def _mode_limits(mode: str) -> Tuple[int, int]:
   return 20, 3
 
 
+@metrics.timed("create_draft")
 def create_draft(session: Session, mode: str = "detail") -> Draft:
   max_q, _ = _mode_limits(mode)
   draft = Draft(
     id=_uuid(),
-    messages="[]",
+    messages=[],
     status="chatting",
     mode=(mode or "detail"),
     max_questions=max_q,
@@ -76,6 +231,7 @@ def create_draft(session: Session, mode: str = "detail") -> Draft:
   return draft
 
 
+@metrics.timed("draft_append_message")
 async def draft_append_message(
   session: Session,
   draft_id: str,
@@ -90,7 +246,8 @@ async def draft_append_message(
     raise ValueError("draft_already_ready")
 
   ai_client = ai_client or AIClient()
-  messages = json.loads(draft.messages) if draft.messages else []
+  # 拷一份再改：原地 append 同一个 list，ORM 看不出列变了
+  messages = list(draft.messages or [])
   messages.append({"role": "user", "content": user_content.strip()})
 
   result = await ai_client.draft_analyze_and_reply(messages)
@@ -100,17 +257,101 @@ async def draft_append_message(
   initial_questions = result.get("initial_questions") or []
 
   messages.append({"role": "assistant", "content": reply})
-  draft.messages = json.dumps(messages, ensure_ascii=False)
+  draft.messages = messages
   if not need_more and title:
     draft.status = "ready"
     draft.project_title = title
-    draft.initial_questions = json.dumps(initial_questions, ensure_ascii=False)
+    draft.initial_questions = list(initial_questions)
   draft.updated_at = datetime.utcnow()
   session.add(draft)
   session.commit()
   return need_more, reply, title, initial_questions
 
 
+def _from_model(client: AIClient) -> bool:
+  """最近一次调用是模型给的（不是 stub），结果才值得存成模板。"""
+  return bool(client.calls) and client.calls[-1].source != "stub"
+
+
+async def _use_template(kind: str, text: str, method: str) -> Optional[list]:
+  """查立项模板，命中时按一次 source=template 的 AI 调用记下来（见 backend/idea_templates.py）。"""
+  start = time.perf_counter()
+  hit = await idea_templates.nearest_async(kind, text)
+  metrics.CACHE_REQUESTS.inc(cache="idea_template", result="hit" if hit else "miss")
+  if hit is None:
+    return None
+  metrics.record_ai_call(AICallResult(method=method, source="template", latency=time.perf_counter() - start, value=hit[1]))
+  return hit[1]
+
+
+def _refine_nodes(project_id: str, updates: List[Tuple[str, str, str, str]]) -> Optional[int]:
+  """
+  套模板建的项目后台拿到模型的新结果后，把当初按模板建的节点换成新的标题 / 问题。
+  updates 每项是 (节点 id, 模板给的问题, 新标题, 新问题)；只换还没被动过的节点：
+  仍是红色、没有回答、问题还是模板原样（标题会被前端的起短标题换掉，不作数）。改了返回改之前的 revision。
+  """
+  with Session(engine) as session:
+    project = session.get(Project, project_id)
+    if project is None:
+      return None
+    ids = [node_id for node_id, _, _, _ in updates]
+    by_id = {n.id: n for n in session.exec(select(Node).where(Node.id.in_(ids), Node.project_id == project_id)).all()}
+    answered = set(session.exec(select(NodeAnswer.node_id).where(NodeAnswer.node_id.in_(ids))).all())
+    changed: List[Node] = []
+    for node_id, used_question, title, question in updates:
+      n = by_id.get(node_id)
+      if n is None or n.status != "red" or n.id in answered or n.question != used_question:
+        continue
+      if (n.title, n.question) != (title, question):
+        n.title, n.question = title, question
+        session.add(n)
+        changed.append(n)
+    if not changed:
+      return None
+    revision = bump_revision(session, project)
+    for n in changed:
+      record_change(session, project, n, "updated")
+    search.index_nodes(session, changed)
+    session.commit()
+    return revision - 1
+
+
+async def _apply_refined(project_id: str, updates: List[Tuple[str, str, str, str]]) -> None:
+  since = await asyncio.get_running_loop().run_in_executor(None, _refine_nodes, project_id, updates)
+  if since is not None:
+    with Session(engine) as session:
+      await publish_changes(session, project_id, since)
+
+
+async def _refine_mindmap(project_id: str, idea_text: str, used: List[NodeDraft], node_ids: List[str]) -> None:
+  """node_ids[i] 是按 used[i] 建出来的节点。"""
+  client = AIClient()
+  drafts = await client.generate_mindmap(idea_text)
+  if not _from_model(client):
+    return
+  await idea_templates.add_async("mindmap", idea_text, [asdict(d) for d in drafts])
+  if len(drafts) != len(used) or any((d.level, d.parent_index) != (u.level, u.parent_index) for d, u in zip(drafts, used)):
+    return  # 树形不一样就不硬套了，新结果只进模板库
+  await _apply_refined(
+    project_id,
+    [(node_id, u.question, d.title, d.question) for node_id, u, d in zip(node_ids, used, drafts) if d.level > 0],
+  )
+
+
+async def _refine_questions(project_id: str, idea_text: str, title: str, template_key: str, used: List[Tuple[str, str]]) -> None:
+  """used：按模板建的初题节点 (节点 id, 问题)。"""
+  client = AIClient()
+  questions = await client.generate_initial_mindmap_questions(idea_text, title)
+  if not questions or not _from_model(client):
+    return
+  await idea_templates.add_async("questions", template_key, questions)
+  await _apply_refined(
+    project_id,
+    [(node_id, old, _short_title(q, f"问{i + 1}"), q[:200]) for i, ((node_id, old), q) in enumerate(zip(used, questions[:3]))],
+  )
+
+
+@metrics.timed("create_project_from_draft")
 async def create_project_from_draft(
   session: Session,
   draft_id: str,
@@ -123,12 +364,30 @@ async def create_project_from_draft(
   if draft.status != "ready" or not draft.project_title:
     raise ValueError("draft_not_ready")
 
-  messages = json.loads(draft.messages) if draft.messages else []
+  messages = draft.messages or []
   idea_parts = [m.get("content", "") for m in messages if m.get("role") == "user"]
   idea_text = "\n".join(idea_parts).strip() or draft.project_title
 
   max_q, _ = _mode_limits(draft.mode)
 
+  # 脑图初题由专用提示词生成（受众、场景、风险等），与立项阶段「只澄清本质」分离。
+  # 先调 AI 再写库：flush 之后就拿着写锁了，别让别的请求陪着等模型
+  client = ai_client or AIClient()
+  template_key = f"{draft.project_title}\n{idea_text}"
+  template = await _use_template("questions", template_key, "generate_initial_mindmap_questions")
+  if template is not None:
+    questions = list(template)
+  else:
+    questions = await client.generate_initial_mindmap_questions(idea_text, draft.project_title)
+    if questions and _from_model(client):
+      idea_templates.spawn(idea_templates.add_async("questions", template_key, questions))
+  if not questions:
+    fallback = draft.initial_questions or []
+    questions = [str(q)[:200] for q in (fallback if isinstance(fallback, list) else [])[:3]]
+  if not questions:
+    questions = ["这个项目要解决的核心问题是什么？", "你期望的首要用户或使用场景是怎样的？"]
+  questions = [str(q)[:200] for q in questions[:3]]
+
   project = Project(
     id=_uuid(),
     name=draft.project_title,
@@ -145,16 +404,6 @@ async def create_project_from_draft(
     if role in ("user", "assistant", "system"):
       session.add(ProjectDialog(project_id=project.id, role=role, content=text))
 
-  # 脑图初题由专用提示词生成（受众、场景、风险等），与立项阶段「只澄清本质」分离
-  client = ai_client or AIClient()
-  questions = await client.generate_initial_mindmap_questions(idea_text, draft.project_title)
-  if not questions:
-    fallback = json.loads(draft.initial_questions) if draft.initial_questions else []
-    questions = [str(q)[:200] for q in (fallback if isinstance(fallback, list) else [])[:3]]
-  if not questions:
-    questions = ["这个项目要解决的核心问题是什么？", "你期望的首要用户或使用场景是怎样的？"]
-  questions = [str(q)[:200] for q in questions[:3]]
-
   root_id = _uuid()
   root = Node(
     id=root_id,
@@ -169,30 +418,39 @@ async def create_project_from_draft(
   session.add(root)
   session.flush()
 
+  tree: List[Node] = [root]
   for idx, q in enumerate(questions):
     node_id = _uuid()
-    session.add(
-      Node(
-        id=node_id,
-        project_id=project.id,
-        parent_id=root_id,
-        level=1,
-        title=_short_title(q, f"问{idx + 1}"),
-        question=q,
-        status="red",
-        order_index=idx + 1,
-      )
+    node = Node(
+      id=node_id,
+      project_id=project.id,
+      parent_id=root_id,
+      level=1,
+      title=_short_title(q, f"问{idx + 1}"),
+      question=q,
+      status="red",
+      order_index=idx + 1,
     )
+    tree.append(node)
+    session.add(node)
+  fill_aggregates(tree)
+  fill_dfs_keys(tree)
+  search.index_project(session, project)
+  search.index_nodes(session, tree)
 
   # 初始问题计入总配额
   project.current_questions = len(questions)
   session.add(project)
 
+  used = [(n.id, n.question) for n in tree if n.level == 1]
   session.commit()
   session.refresh(project)
+  if template is not None and idea_templates.refine and client.has_real_api:
+    idea_templates.spawn(_refine_questions(project.id, idea_text, draft.project_title, template_key, used))
   return project
 
 
+@metrics.timed("create_project_from_idea")
 async def create_project_from_idea(
   session: Session,
   idea_text: str,
@@ -206,6 +464,20 @@ async def create_project_from_idea(
   max_len = 24
   name = cleaned[:max_len] + ("..." if len(cleaned) > max_len else "")
 
+  # 同 create_project_from_draft：AI 调用放在第一次写库之前；有足够像的旧构想就直接套它的脑图
+  template = await _use_template("mindmap", idea_text, "generate_mindmap")
+  if template is not None:
+    drafts = [NodeDraft(**d) for d in template]
+    drafts[0].title = name
+  else:
+    try:
+      drafts = await ai_client.generate_mindmap(idea_text)
+    except Exception as e:
+      logger.warning("AI generate_mindmap failed, using stub: %s", e)
+      drafts = ai_client._generate_stub_mindmap(idea_text)
+    if _from_model(ai_client):
+      idea_templates.spawn(idea_templates.add_async("mindmap", idea_text, [asdict(d) for d in drafts]))
+
   project = Project(id=_uuid(), name=name, idea_text=idea_text)
   session.add(project)
   session.flush()
@@ -219,12 +491,6 @@ async def create_project_from_idea(
       )
     )
 
-  try:
-    drafts = await ai_client.generate_mindmap(idea_text)
-  except Exception as e:
-    logger.warning("AI generate_mindmap failed, using stub: %s", e)
-    drafts = ai_client._generate_stub_mindmap(idea_text)
-
   # 将 drafts 转为 Node，并维护 parent_id
   nodes: List[Node] = []
   for idx, d in enumerate(drafts):
@@ -244,12 +510,228 @@ async def create_project_from_idea(
     )
     nodes.append(node)
     session.add(node)
+  fill_aggregates(nodes)
+  fill_dfs_keys(nodes)
+  search.index_project(session, project)
+  search.index_nodes(session, nodes)
 
+  node_ids = [n.id for n in nodes]
   session.commit()
   session.refresh(project)
+  if template is not None and idea_templates.refine and ai_client.has_real_api:
+    idea_templates.spawn(_refine_mindmap(project.id, idea_text, drafts, node_ids))
   return project
 
 
+# 变更日志每个项目只留最近 CHANGE_LOG_KEEP 个 revision，更早的 since 来要增量就让前端整棵重拉；
+# 每隔 _CHANGE_TRIM_EVERY 个 revision 顺手删一次旧的
+CHANGE_LOG_KEEP = int(os.getenv("CHANGE_LOG_KEEP") or 1000)
+_CHANGE_TRIM_EVERY = 100
+
+
+def bump_revision(session: Session, project: Project) -> int:
+  """项目树有改动就把 revision +1；用 SQL 自增，并发写也不会撞号。"""
+  project.revision = Project.revision + 1
+  project.updated_at = datetime.utcnow()
+  session.add(project)
+  session.flush()
+  session.refresh(project, attribute_names=["revision"])
+  if project.revision % _CHANGE_TRIM_EVERY == 0 and project.revision > CHANGE_LOG_KEEP:
+    session.exec(
+      delete(NodeChange).where(
+        NodeChange.project_id == project.id, NodeChange.revision <= project.revision - CHANGE_LOG_KEEP
+      )
+    )
+  return project.revision
+
+
+def record_change(session: Session, project: Project, node: Node, kind: str) -> None:
+  """记一条节点变更（kind: added / updated / status），revision 用项目当前号，先 bump 再记。"""
+  session.add(NodeChange(project_id=project.id, revision=project.revision, node_id=node.id, kind=kind))
+
+
+def _roots_progress(roots: List[Node]) -> Tuple[int, int, int]:
+  total = green = 0
+  for r in roots:
+    t, g, _ = _own_counts(r)
+    total += (r.sub_total or 0) + t
+    green += (r.sub_green or 0) + g
+  return total, green, _percent(total, green)
+
+
+def project_progress(session: Session, project_id: str) -> Tuple[int, int, int]:
+  """和 calc_progress 同口径，直接读根节点上的子树计数。"""
+  roots = session.exec(select(Node).where(Node.project_id == project_id, Node.parent_id.is_(None))).all()
+  return _roots_progress(roots)
+
+
+def progress_by_project(session: Session) -> dict:
+  """project_id -> (total, green, percent)，项目列表一次查完所有根节点，不再每个项目拉整棵树。"""
+  roots = session.exec(select(Node).where(Node.parent_id.is_(None))).all()
+  grouped: dict = {}
+  for r in roots:
+    grouped.setdefault(r.project_id, []).append(r)
+  return {pid: _roots_progress(rs) for pid, rs in grouped.items()}
+
+
+# 变更按强弱合并：同一节点在区间内既新增又改状态，只算新增
+_CHANGE_RANK = {"updated": 0, "status": 1, "added": 2}
+
+
+def get_project_changes(
+  session: Session, project_id: str, since: int
+) -> Tuple[Project, bool, List[Tuple[str, Node]]]:
+  """
+  取 since 之后（不含）变过的节点，返回 (project, reset, [(kind, node)])。
+  since 比服务端 revision 还新（比如换过库）、或者早于变更日志保留的范围（CHANGE_LOG_KEEP）时
+  reset=True，前端应整棵重拉。
+  """
+  project = session.get(Project, project_id)
+  if not project:
+    raise ValueError("project_not_found")
+  revision = project.revision or 0
+  if since < 0 or since > revision or since < revision - CHANGE_LOG_KEEP:
+    return project, True, []
+  if since == revision:
+    return project, False, []
+
+  rows = session.exec(
+    select(NodeChange.node_id, NodeChange.kind)
+    .where(NodeChange.project_id == project_id, NodeChange.revision > since)
+  ).all()
+  kinds: dict = {}
+  for node_id, kind in rows:
+    if _CHANGE_RANK.get(kind, 0) >= _CHANGE_RANK.get(kinds.get(node_id), -1):
+      kinds[node_id] = kind
+  if not kinds:
+    return project, False, []
+  nodes = session.exec(select(Node).where(Node.id.in_(list(kinds.keys())))).all()
+  nodes = sorted(nodes, key=lambda n: (n.level, n.order_index))
+  return project, False, [(kinds[n.id], n) for n in nodes]
+
+
+def node_payload(n: Node) -> dict:
+  """NodeOut 的纯 dict 版本。"""
+  return {
+    "id": n.id,
+    "project_id": n.project_id,
+    "parent_id": n.parent_id,
+    "level": n.level,
+    "title": n.title,
+    "question": n.question,
+    "status": n.status,
+    "order_index": n.order_index,
+    "node_type": getattr(n, "node_type", "question"),
+  }
+
+
+# 紧凑格式里 status / node_type 用下标表示，已知取值排在前面，保证下标稳定；
+# 码表随 payload 的 enums 下发，前端照它解码（frontend/main.js expandNodes），不自己另写一份
+_COMPACT_ENUMS = {"status": list(NODE_STATUSES), "node_type": list(NODE_TYPES)}
+
+
+def compact_nodes(nodes: List[Node]) -> dict:
+  """
+  节点列表的列式版本：每个字段一个数组，parent 用数组下标（根为 -1）代替 32 位 id，
+  status / node_type 用 enums 里的下标，不带每个节点都一样的 project_id。
+  """
+  enums = {k: list(v) for k, v in _COMPACT_ENUMS.items()}
+  lookup = {k: {name: i for i, name in enumerate(v)} for k, v in enums.items()}
+
+  def intern(kind: str, value: str) -> int:
+    table = lookup[kind]
+    if value not in table:
+      table[value] = len(enums[kind])
+      enums[kind].append(value)
+    return table[value]
+
+  index = {n.id: i for i, n in enumerate(nodes)}
+  return {
+    "count": len(nodes),
+    "enums": enums,
+    "id": [n.id for n in nodes],
+    "parent": [index.get(n.parent_id, -1) if n.parent_id else -1 for n in nodes],
+    "level": [n.level for n in nodes],
+    "title": [n.title for n in nodes],
+    "question": [n.question for n in nodes],
+    "status": [intern("status", n.status) for n in nodes],
+    "order_index": [n.order_index for n in nodes],
+    "node_type": [intern("node_type", getattr(n, "node_type", None) or "question") for n in nodes],
+  }
+
+
+@metrics.timed("project_changes_payload")
+def project_changes_payload(session: Session, project_id: str, since: int) -> dict:
+  """ProjectChangesOut 的纯 dict 版本：/changes 接口和 WebSocket 推送共用。"""
+  project, reset, changes = get_project_changes(session, project_id, since)
+  total, green, percent = project_progress(session, project.id)
+  return {
+    "id": project.id,
+    "status": project.status,
+    "since": since,
+    "revision": project.revision or 0,
+    "reset": reset,
+    "changes": [{"kind": kind, "node": node_payload(n)} for kind, n in changes],
+    "progress": {"total": total, "green": green, "percent": percent},
+  }
+
+
+@metrics.timed("publish_changes")
+async def publish_changes(session: Session, project_id: str, since: int) -> None:
+  """提交之后把 since 之后的节点 diff 推给正在看这个项目的客户端；没人订阅就跳过。"""
+  if not broker.wants(project_id):
+    return
+  payload = project_changes_payload(session, project_id, since)
+  payload["type"] = "changes"
+  await broker.publish(project_id, dumps(payload).decode("utf-8"))
+
+
+@metrics.timed("get_subtree")
+def get_subtree(
+  session: Session, project_id: str, parent_id: Optional[str], depth: int
+) -> Tuple[Project, List[Tuple[Node, int, Tuple[int, int, int]]]]:
+  """
+  懒加载：从 parent_id（为空则从根）往下取 depth 层，返回 [(node, child_count, subtree_progress)]。
+  每层一次按 parent_id 的查询，首屏代价只跟展开的层数有关，不跟整棵树大小走。
+  """
+  project = session.get(Project, project_id)
+  if not project:
+    raise ValueError("project_not_found")
+  if parent_id is not None:
+    parent = session.get(Node, parent_id)
+    if not parent or parent.project_id != project.id:
+      raise ValueError("node_not_found")
+
+  result: List[Node] = []
+  frontier: List[Optional[str]] = [parent_id]
+  for _ in range(depth):
+    if parent_id is None and frontier == [None]:
+      cond = Node.parent_id.is_(None)
+    else:
+      cond = Node.parent_id.in_(frontier)
+    level_nodes = session.exec(
+      select(Node).where(Node.project_id == project_id, cond).order_by(Node.order_index)
+    ).all()
+    if not level_nodes:
+      break
+    result.extend(level_nodes)
+    frontier = [n.id for n in level_nodes]
+
+  ids = [n.id for n in result]
+  child_counts: dict = {}
+  if ids:
+    child_counts = dict(
+      session.exec(
+        select(Node.parent_id, func.count()).where(Node.parent_id.in_(ids)).group_by(Node.parent_id)
+      ).all()
+    )
+  # 按先序排好，前端拿到就能直接挂到对应父节点下
+  return project, [
+    (n, child_counts.get(n.id, 0), (n.sub_total, n.sub_green, _percent(n.sub_total, n.sub_green)))
+    for n in flatten_nodes(result, parent_id)
+  ]
+
+
 def get_project_with_nodes(session: Session, project_id: str) -> Tuple[Project, List[Node]]:
   project = session.get(Project, project_id)
   if not project:
@@ -258,6 +740,152 @@ def get_project_with_nodes(session: Session, project_id: str) -> Tuple[Project,
   return project, nodes
 
 
+def _merge_branches(session: Session, project_id: str) -> List[Tuple[Node, List[str]]]:
+  """按一级分支把已答节点的问答拼成章节素材：[(一级节点, 行列表)]，顺序同脑图先序。"""
+  nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
+  by_id = {n.id: n for n in nodes}
+  answers: Dict[str, List[str]] = defaultdict(list)
+  rows = session.exec(
+    select(NodeAnswer.node_id, NodeAnswer.content)
+    .join(Node, Node.id == NodeAnswer.node_id)
+    .where(Node.project_id == project_id)
+    .order_by(NodeAnswer.created_at, NodeAnswer.id)
+  ).all()
+  for node_id, content in rows:
+    answers[node_id].append(content)
+
+  branches: List[Tuple[Node, List[str]]] = []
+  lines_by_branch: Dict[str, List[str]] = {}
+  for n in flatten_nodes(nodes):
+    if n.level == 0:
+      continue
+    # 沿 parent_id 向上拿路径，顺便记下所属的一级节点
+    path_titles: List[str] = []
+    branch = cur = n
+    while cur is not None:
+      path_titles.append(cur.title)
+      if cur.level > 0:
+        branch = cur
+      cur = by_id.get(cur.parent_id) if cur.parent_id else None
+    if branch.id not in lines_by_branch:
+      lines_by_branch[branch.id] = []
+      branches.append((branch, lines_by_branch[branch.id]))
+    if not answers.get(n.id):
+      continue
+    path_titles.reverse()
+    lines = lines_by_branch[branch.id]
+    lines.append(f"### {' > '.join(path_titles)}")
+    lines.append("")
+    lines.append(f"**节点问题：** {n.question}")
+    lines.append("")
+    lines.append("**用户解答：**")
+    for i, content in enumerate(answers[n.id], start=1):
+      lines.append(f"- 解答 {i}：{content}")
+    lines.append("")
+  return [(b, lines) for b, lines in branches if lines]
+
+
+def _section_digest(ai: AIClient, project: Project, heading: str, lines: List[str]) -> str:
+  raw = json.dumps([ai.model, project.name, project.idea_text, heading, lines], ensure_ascii=False)
+  return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _stitch_doc(project: Project, sections: List[str], demo: bool) -> str:
+  """最后一步只是拼接：标题 + 原始构想 + 各章，不再过模型。"""
+  parts = [f"# {project.name}" + (" - 融合项目文档（Demo）" if demo else ""), "", "## 原始项目构想", "", project.idea_text or "(无)", ""]
+  for section in sections:
+    parts.append(section)
+    parts.append("")
+  if demo:
+    parts.append("## 说明")
+    parts.append("")
+    parts.append(
+      "本文档由 Demo 内置规则自动拼接生成，未接入真实大模型；"
+      "在正式环境中，可在保持不篡改你原始意图的前提下，使用大模型优化结构与表述。"
+    )
+  return "\n".join(parts).rstrip() + "\n"
+
+
+@metrics.timed("merge_project_doc")
+async def merge_project_doc(session: Session, project_id: str) -> str:
+  """
+  融合文档按一级分支分章：每章的成稿连同素材 digest 存在 MergedSection 里，
+  再次融合时只有问答变了的分支重新过模型（并发跑，受 AI_MAX_CONCURRENCY 限制），其余直接复用，最后拼起来。
+  """
+  project = session.get(Project, project_id)
+  if not project:
+    raise ValueError("project_not_found")
+  total, green, _ = project_progress(session, project_id)
+  if not total or total != green:
+    raise ValueError("project_not_completed")
+
+  ai = AIClient()
+  branches = _merge_branches(session, project_id)
+  stored = {
+    m.branch_id: m for m in session.exec(select(MergedSection).where(MergedSection.project_id == project_id)).all()
+  }
+  digests = [_section_digest(ai, project, b.title, lines) for b, lines in branches]
+  sections: List[Optional[str]] = []
+  todo: List[int] = []
+  for i, (branch, _) in enumerate(branches):
+    cached = stored.get(branch.id)
+    if cached is not None and cached.digest == digests[i]:
+      sections.append(cached.content)
+      metrics.CACHE_REQUESTS.inc(cache="merge_section", result="hit")
+    else:
+      sections.append(None)
+      todo.append(i)
+      metrics.CACHE_REQUESTS.inc(cache="merge_section", result="miss")
+
+  async def merge_one(i: int) -> Tuple[str, bool]:
+    client = AIClient()
+    branch, lines = branches[i]
+    content = await client.merge_section(project.name, project.idea_text, branch.title, lines)
+    # stub 的结果不存：没接模型时拼一遍本来就不花钱，接上模型后也不会被旧的兜底稿占住
+    return content, bool(client.calls) and client.calls[-1].source != "stub"
+
+  results = await asyncio.gather(*(merge_one(i) for i in todo))
+  now = datetime.utcnow()
+  for i, (content, keep) in zip(todo, results):
+    sections[i] = content
+    if not keep:
+      continue
+    branch_id = branches[i][0].id
+    row = stored.get(branch_id) or MergedSection(project_id=project_id, branch_id=branch_id, digest="", content="")
+    row.digest, row.content, row.updated_at = digests[i], content, now
+    session.add(row)
+  session.commit()
+  return _stitch_doc(project, [s for s in sections if s is not None], demo=not ai.has_real_api)
+
+
+def _answer_anchor(node: Node, content: str, by_ai: bool, order_index: int) -> Node:
+  """回答下面挂的「回答支点」节点：人工回答是绿色问题节点，AI 回答是蓝色 Tips 节点。"""
+  if by_ai:
+    return Node(
+      id=_uuid(),
+      project_id=node.project_id,
+      parent_id=node.id,
+      level=node.level + 1,
+      title=_short_title(content, "AI答"),
+      question=content,
+      status="ai",
+      node_type="tip",
+      order_index=order_index,
+    )
+  return Node(
+    id=_uuid(),
+    project_id=node.project_id,
+    parent_id=node.id,
+    level=node.level + 1,
+    title=_short_title(content, "回答"),
+    question=content,
+    status="green",
+    # node_type 使用默认 "question"，作为一个“回答支点”问题节点
+    order_index=order_index,
+  )
+
+
+@metrics.timed("answer_node_and_trace")
 async def answer_node_and_trace(
   session: Session,
   project_id: str,
@@ -265,96 +893,206 @@ async def answer_node_and_trace(
   content: str,
   ai_client: Optional[AIClient] = None,
   by_ai: bool = False,
-) -> Tuple[Node, List[Node], Optional[str], List[Node]]:
+) -> Tuple[Node, Tuple[int, int, int], Optional[str], List[Node]]:
   """
   保存回答后：
   - 问题节点本身立即标记为完成（人工回答 = green，AI 回答 = ai）；
   - 额外在其下方生成一个“回答支点”子节点，作为后续追问 / Tips 的锚点：
       - 人工回答生成 status=green 的 answer 节点；
       - AI 回答生成 status=ai、node_type="tip" 的 Tips 节点。
-  返回 (node, nodes, next_node_id, added_nodes)，added_nodes 中包含新建的回答节点。
+  返回 (node, progress, next_node_id, added_nodes)，added_nodes 中包含新建的回答节点。
+  全程只沿祖先链走，不加载整棵树。
   """
 
-  project, nodes = get_project_with_nodes(session, project_id)
+  project = session.get(Project, project_id)
+  if not project:
+    raise ValueError("project_not_found")
   node = session.get(Node, node_id)
   if not node or node.project_id != project.id:
     raise ValueError("node_not_found")
 
+  revision = bump_revision(session, project)
+
   # 保存本次回答
   answer = NodeAnswer(node_id=node.id, content=content)
   session.add(answer)
   session.flush()
+  search.index_answers(session, [(node, answer)])
 
   next_node_id: Optional[str] = None
   added_nodes: List[Node] = []
 
   # 任意回答后立即标记为完成：人工回答 = 绿色，AI 回答 = 纯蓝
-  node.status = "ai" if by_ai else "green"
-  session.add(node)
-  session.flush()
+  set_node_status(session, project, node, "ai" if by_ai else "green")
 
   # 在该问题节点下方生成一个“回答支点”子节点
   # - 人工回答：answer 类型节点，绿色；
   # - AI 回答：tip 类型节点，蓝色，表示由 AI 补全。
-  nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
-  children = [n for n in nodes if n.parent_id == node.id]
-  base_order = max([n.order_index for n in children], default=0)
-
-  answer_node_id = _uuid()
-  if by_ai:
-    new_title = _short_title(content, "AI答")
-    answer_node = Node(
-      id=answer_node_id,
-      project_id=project.id,
-      parent_id=node.id,
-      level=node.level + 1,
-      title=new_title,
-      question=content,
-      status="ai",
-      node_type="tip",
-      order_index=base_order + 1,
-    )
-  else:
-    new_title = _short_title(content, "回答")
-    answer_node = Node(
-      id=answer_node_id,
-      project_id=project.id,
-      parent_id=node.id,
-      level=node.level + 1,
-      title=new_title,
-      question=content,
-      status="green",
-      # node_type 使用默认 "question"，作为一个“回答支点”问题节点
-      order_index=base_order + 1,
-    )
+  order_index = _next_order_index(session, node.id)
 
-  session.add(answer_node)
+  answer_node = _answer_anchor(node, content, by_ai, order_index)
+  add_node(session, answer_node)
+  record_change(session, project, answer_node, "added")
   added_nodes.append(answer_node)
 
-  # 重新获取节点列表，溯源下一个红色分支
-  nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
-  next_node_id = _auto_trace_next_red_branch(session, nodes, node)
+  # 沿祖先链自动变绿，并找下一个红色问题（根节点也在这条链上）
+  next_node_id = _auto_trace_next_red_branch(session, node, project)
 
-  # 进度与项目状态更新
-  nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
-  flat = flatten_nodes(nodes)
-  total, green, _ = calc_progress(flat)
-  root = next((n for n in flat if n.level == 0), None)
-  if root and root.status != "green":
-    non_root = [n for n in flat if n.level > 0]
-    if non_root and all(n.status == "green" for n in non_root):
-      root.status = "green"
-      session.add(root)
+  # 进度与项目状态更新：读根节点计数即可
+  progress = project_progress(session, project_id)
+  total, green, _ = progress
   if total and total == green:
     project.status = "completed"
     session.add(project)
 
   session.commit()
   session.refresh(node)
-  nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
-  return node, nodes, next_node_id, added_nodes
+  await publish_changes(session, project_id, revision - 1)
+  if not by_ai:
+    # AI 代答多是自动批量跑的，没人马上接着点追问 / Tips，不值得预取
+    _prefetch_after_answer(project, node, answer.id, content)
+  return node, progress, next_node_id, added_nodes
+
+
+MAX_BATCH_ANSWERS = 200
+
+
+@metrics.timed("answer_nodes_batch")
+async def answer_nodes_batch(
+  session: Session, project_id: str, items: List[Tuple[str, str, bool]]
+) -> Tuple[dict, Optional[str]]:
+  """
+  一次提交多条回答 (node_id, content, by_ai)，导入现成材料时用。每条的效果同 answer_node_and_trace，但：
+  - 整批一个事务、一个 revision，有一个节点不存在就整批不写；
+  - 祖先的子树计数先在内存里按节点汇总，最后按相同增量分组各一条 UPDATE；
+  - 溯源（祖先自动变绿）、下一个红色问题和进度在最后算。
+  返回 (合并后的增量，格式同 /changes, 下一个红色问题 id)。
+  """
+  if not items:
+    raise ValueError("empty_batch")
+  if len(items) > MAX_BATCH_ANSWERS:
+    raise ValueError("batch_too_large")
+  project = session.get(Project, project_id)
+  if not project:
+    raise ValueError("project_not_found")
+  ids = sorted({node_id for node_id, _, _ in items})
+  targets = {n.id: n for n in session.exec(select(Node).where(Node.project_id == project.id, Node.id.in_(ids))).all()}
+  if len(targets) != len(ids):
+    raise ValueError("node_not_found")
+
+  revision = bump_revision(session, project)
+
+  answers = [NodeAnswer(node_id=node_id, content=content) for node_id, content, _ in items]
+  session.add_all(answers)
+  session.flush()
+  search.index_answers(session, [(targets[a.node_id], a) for a in answers])
+
+  # 祖先链按节点缓存，几条回答在同一分支下时只查一次
+  chains: Dict[str, List[Node]] = {}
+
+  def ancestors(node: Node) -> List[Node]:
+    if node.id not in chains:
+      parent = session.get(Node, node.parent_id) if node.parent_id else None
+      chains[node.id] = [parent] + ancestors(parent) if parent else []
+    return chains[node.id]
+
+  deltas: Dict[str, List[int]] = defaultdict(lambda: [0, 0, 0])
+
+  def bump(node: Node, counts: Tuple[int, int, int]) -> None:
+    if any(counts):
+      for p in ancestors(node):
+        d = deltas[p.id]
+        for i, v in enumerate(counts):
+          d[i] += v
+
+  next_order = dict(
+    session.exec(
+      select(Node.parent_id, func.max(Node.order_index)).where(Node.parent_id.in_(ids)).group_by(Node.parent_id)
+    ).all()
+  )
+  status_recorded = set()
+  added: List[Node] = []
+  for node_id, content, by_ai in items:
+    node = targets[node_id]
+    before = _own_counts(node)
+    node.status = "ai" if by_ai else "green"
+    session.add(node)
+    bump(node, tuple(a - b for a, b in zip(_own_counts(node), before)))
+    if node.id not in status_recorded:
+      status_recorded.add(node.id)
+      record_change(session, project, node, "status")
+
+    next_order[node.id] = (next_order.get(node.id) or 0) + 1
+    anchor = _answer_anchor(node, content, by_ai, next_order[node.id])
+    anchor.dfs_key = _dfs_key(node.dfs_key, anchor.order_index)
+    chains[anchor.id] = [node] + ancestors(node)
+    session.add(anchor)
+    bump(anchor, _own_counts(anchor))
+    record_change(session, project, anchor, "added")
+    added.append(anchor)
+  search.index_nodes(session, added)
+
+  by_delta: Dict[Tuple[int, int, int], List[str]] = defaultdict(list)
+  for node_id, (dt, dg, dr) in deltas.items():
+    if dt or dg or dr:
+      by_delta[(dt, dg, dr)].append(node_id)
+  for (dt, dg, dr), node_ids in by_delta.items():
+    session.exec(
+      update(Node)
+      .where(Node.id.in_(node_ids))
+      .values(sub_total=Node.sub_total + dt, sub_green=Node.sub_green + dg, sub_red=Node.sub_red + dr)
+    )
+
+  # 溯源：按提交顺序逐条往上走（同 _auto_trace_next_red_branch），看过且没变化的祖先不再重复查
+  visited: set = set()
+  for node_id in dict.fromkeys(node_id for node_id, _, _ in items):
+    _trace_up(session, project, targets[node_id], visited)
+  nxt = next_red_node(session, project.id, targets[items[-1][0]].dfs_key)
+
+  total, green, _ = project_progress(session, project_id)
+  if total and total == green:
+    project.status = "completed"
+    session.add(project)
+
+  session.commit()
+  for node_id in ids:
+    prefetcher.invalidate(node_id)  # 回答变了，旧的预取作废；批量导入不再预取
+  await publish_changes(session, project_id, revision - 1)
+  return project_changes_payload(session, project_id, revision - 1), nxt.id if nxt else None
+
+
+def _prefetch_after_answer(project: Project, node: Node, answer_id: int, content: str) -> None:
+  """回答落库后，后台先把这个节点的追问和 Tips 候选算上，见 backend/prefetch.py。"""
+  prefetcher.invalidate(node.id)
+  if not prefetcher.enabled or not AIClient().has_real_api:
+    return
+  idea, question, level = project.idea_text, node.question, node.level
+
+  async def followups() -> Optional[dict]:
+    client = AIClient()
+    result = await client.node_answer_judge_and_followups(idea, question, content, level)
+    return None if client.calls and client.calls[-1].degraded else result
+
+  async def tips() -> Optional[List[str]]:
+    client = AIClient()
+    result = await client.make_tips_candidates(idea, question, content)
+    return None if client.calls and client.calls[-1].degraded else result
+
+  prefetcher.schedule("followups", node.id, answer_id, followups)
+  prefetcher.schedule("tips", node.id, answer_id, tips)
+
 
+_DEFAULT_FOLLOWUP = "能再具体说明或补充一下吗？"
 
+
+def _followups(result: dict) -> List[str]:
+  followups = result.get("followup_questions") or []
+  if not isinstance(followups, list):
+    return []
+  return [str(q)[:200] for q in followups if str(q).strip()]
+
+
+@metrics.timed("spawn_followup_node")
 async def spawn_followup_node(
   session: Session,
   project_id: str,
@@ -365,11 +1103,14 @@ async def spawn_followup_node(
   基于“已回答过的节点”，向外拖拽时生成一个新的追问子节点：
   - 取该节点最新一次回答；
   - 调用 node_answer_judge_and_followups，只使用 followup_questions；
-  - 取第一个追问生成子节点。
+  - 取第一个和同级 / 祖先节点不重复的追问生成子节点（判重和复用见 backend/similarity.py）；
+    模型给的都重复（或没给）时用通用追问兜底，用户主动拖出来的总要有个节点。
   """
   ai_client = ai_client or AIClient()
 
-  project, nodes = get_project_with_nodes(session, project_id)
+  project = session.get(Project, project_id)
+  if not project:
+    raise ValueError("project_not_found")
   node = session.get(Node, node_id)
   if not node or node.project_id != project.id:
     raise ValueError("node_not_found")
@@ -381,21 +1122,39 @@ async def spawn_followup_node(
   if not latest_answer:
     raise ValueError("no_answer")
 
-  result = await ai_client.node_answer_judge_and_followups(
-    project.idea_text, node.question, latest_answer.content, node.level
-  )
-  followups = result.get("followup_questions") or []
-  if not isinstance(followups, list):
-    followups = []
-  followups = [str(q)[:200] for q in followups if str(q).strip()]
-  if not followups:
-    followups = ["能再具体说明或补充一下吗？"]
-
-  q = followups[0]
-
-  # 找到当前节点已有子节点，计算 order_index
-  children = [n for n in nodes if n.parent_id == node.id]
-  base_order = max([n.order_index for n in children], default=0)
+  # 判重的参照：节点下已有的子节点 + 从自己到根的祖先链
+  children = list(session.exec(select(Node.question).where(Node.parent_id == node.id)).all())
+  existing = list(children)
+  cur: Optional[Node] = node
+  while cur is not None:
+    existing.append(cur.question)
+    cur = session.get(Node, cur.parent_id) if cur.parent_id else None
+
+  # 先看这个项目里问过的足够像的「问题 + 回答」还有没有没用上的追问，有就不调模型
+  key = f"{node.question}\n{latest_answer.content}"
+  start = time.perf_counter()
+  cache = similarity.followup_cache
+  reusable = await shared_state.call(cache.store, cache.lookup, project.id, key)
+  q = similarity.pick_new(reusable, existing)
+  if q is not None:
+    metrics.CACHE_REQUESTS.inc(cache="followup_reuse", result="hit")
+    metrics.record_ai_call(
+      AICallResult(method="node_answer_judge_and_followups", source="similar", latency=time.perf_counter() - start, value=q)
+    )
+  else:
+    metrics.CACHE_REQUESTS.inc(cache="followup_reuse", result="miss")
+    result = await prefetcher.take("followups", node.id, latest_answer.id, "node_answer_judge_and_followups")
+    if result is not None:
+      await shared_state.call(cache.store, cache.store_followups, project.id, key, _followups(result))
+      q = similarity.pick_new(_followups(result), existing)
+    if q is None:
+      # 没预取，或预取的都和已有节点重复：带上已有追问再问一次模型
+      result = await ai_client.node_answer_judge_and_followups(
+        project.idea_text, node.question, latest_answer.content, node.level, existing=children
+      )
+      if ai_client.calls and ai_client.calls[-1].source != "stub":
+        await shared_state.call(cache.store, cache.store_followups, project.id, key, _followups(result))
+      q = similarity.pick_new(_followups(result), existing) or _DEFAULT_FOLLOWUP
 
   new_id = _uuid()
   new_node = Node(
@@ -406,17 +1165,21 @@ async def spawn_followup_node(
     title=_short_title(q, "新问"),
     question=q,
     status="red",
-    order_index=base_order + 1,
+    order_index=_next_order_index(session, node.id),
   )
-  session.add(new_node)
+  add_node(session, new_node)
 
   # 注意：父节点保持其当前完成状态（green/ai），不再因为新增追问而重新变红
 
+  revision = bump_revision(session, project)
+  record_change(session, project, new_node, "added")
   session.commit()
   session.refresh(new_node)
+  await publish_changes(session, project_id, revision - 1)
   return new_node
 
 
+@metrics.timed("spawn_tips_node")
 async def spawn_tips_node(
   session: Session,
   project_id: str,
@@ -429,14 +1192,13 @@ async def spawn_tips_node(
   """
   ai_client = ai_client or AIClient()
 
-  project, nodes = get_project_with_nodes(session, project_id)
+  project = session.get(Project, project_id)
+  if not project:
+    raise ValueError("project_not_found")
   node = session.get(Node, node_id)
   if not node or node.project_id != project.id:
     raise ValueError("node_not_found")
 
-  children = [n for n in nodes if n.parent_id == node.id]
-  base_order = max([n.order_index for n in children], default=0)
-
   q = "信息待选择"
   new_id = _uuid()
   new_node = Node(
@@ -447,63 +1209,50 @@ async def spawn_tips_node(
     title="信息待选择",
     question=q,
     status="tip",  # 不计入红绿进度，由前端渲染为蓝色
-    order_index=base_order + 1,
+    order_index=_next_order_index(session, node.id),
     node_type="tip",
   )
-  session.add(new_node)
+  add_node(session, new_node)
 
+  revision = bump_revision(session, project)
+  record_change(session, project, new_node, "added")
   session.commit()
   session.refresh(new_node)
+  await publish_changes(session, project_id, revision - 1)
   return new_node
 
 
-def _auto_trace_next_red_branch(session: Session, nodes: List[Node], leaf: Node) -> Optional[str]:
-  # 构建 id -> node 映射
-  node_map = {n.id: n for n in nodes}
-
+def _trace_up(session: Session, project: Project, leaf: Node, visited: Optional[set] = None) -> None:
+  """
+  从刚答完的节点往上走，规则和最初的逐层扫描一致：
+  父节点的直接子节点（含 Tips、AI 代答节点）里有红色就停；全部是 green 时父节点自动变绿，继续往上。
+  只看直接子节点（按 parent_id 索引取），走 O(深度) 层。
+  visited：批量时共用，走到已经看过的父节点、而且这一趟还没改过状态，结论不会变，直接停。
+  """
   cur = leaf
-  candidate_next_id: Optional[str] = None
-
+  changed = False
   while cur.parent_id:
-    parent = node_map.get(cur.parent_id)
+    if visited is not None and not changed and cur.parent_id in visited:
+      break
+    parent = session.get(Node, cur.parent_id)
     if not parent:
       break
-
-    # 父节点下是否还有红色兄弟分支
-    siblings = [n for n in nodes if n.parent_id == parent.id]
-    red_siblings = [s for s in siblings if s.status == "red"]
-    if red_siblings:
-      first_red_branch = red_siblings[0]
-      candidate_next_id = _find_first_red_leaf(nodes, first_red_branch.id)
-      if candidate_next_id is None:
-        candidate_next_id = first_red_branch.id
+    if visited is not None:
+      visited.add(parent.id)
+    statuses = session.exec(select(Node.status).where(Node.parent_id == parent.id)).all()
+    if "red" in statuses:
       break
-
-    # 父节点全部子节点绿，则父节点自动变绿，继续向上
-    if siblings and all(s.status == "green" for s in siblings):
-      if parent.status != "green":
-        parent.status = "green"
-        session.add(parent)
+    if all(st == "green" for st in statuses) and parent.status != "green":
+      set_node_status(session, project, parent, "green")
+      changed = True
     cur = parent
 
-  # 根节点全绿逻辑在外层进度计算中处理
-  return candidate_next_id
-
-
-def _find_first_red_leaf(nodes: List[Node], start_id: str) -> Optional[str]:
-  node_map = {n.id: n for n in nodes}
-
-  def dfs(nid: str) -> Optional[str]:
-    n = node_map[nid]
-    children = [c for c in nodes if c.parent_id == n.id]
-    if not children and n.status == "red":
-      return n.id
-    for c in children:
-      res = dfs(c.id)
-      if res:
-        return res
-    return None
-
-  return dfs(start_id)
-
 
+def _auto_trace_next_red_branch(session: Session, leaf: Node, project: Project) -> Optional[str]:
+  """
+  祖先按 _trace_up 的规则自动变绿；
+  下一个任务取先序顺序里该节点之后的第一个红色问题（索引查找，到末尾绕回开头）。
+  """
+  _trace_up(session, project, leaf)
+  nxt = next_red_node(session, project.id, leaf.dfs_key)
+  return nxt.id if nxt else None
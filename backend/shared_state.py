@@ -0,0 +1,196 @@
+"""
+进程间共享的小状态：模型回复缓存、模型并发名额。
+
+默认放进程内存，单进程够用；`uvicorn --workers N` 时每个 worker 各有一份，
+缓存命中率掉成 1/N、并发上限变成 N 倍。配置 SHARED_STATE=sqlite:///path/state.db 后
+同一台机器上的 worker 共用一个 SQLite 文件（WAL 模式，单独一个库，和业务库无关）。
+
+两种实现接口相同：
+  get(ns, key) / put(ns, key, value, ttl, max_items)   带 TTL 的 KV，每个 ns 条数封顶
+  update(ns, key, fn, ttl, max_items)                   原子的读-改-写：fn(旧值或 None) -> 新值
+  try_acquire(name, limit, lease) / release(name, token)  计数信号量，名额带租期，
+                                                          worker 崩了没释放的名额到期自动回收
+时间一律用 time.time()：monotonic 各进程起点不同，没法跨进程比。
+SQLiteState 的调用可能要等别的 worker 的写锁，异步代码里经 call() 放到线程池里跑，别卡住事件循环。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class MemoryState:
+  """单进程：KV 按 LRU 淘汰。"""
+
+  blocking = False
+
+  def __init__(self) -> None:
+    self._items: Dict[str, "OrderedDict[str, tuple]"] = {}  # ns -> key -> (过期时间, 值)
+    self._slots: Dict[str, Dict[str, float]] = {}
+    self._lock = threading.Lock()
+
+  def get(self, ns: str, key: str) -> Optional[str]:
+    with self._lock:
+      items = self._items.get(ns)
+      item = items.get(key) if items is not None else None
+      if item is None:
+        return None
+      if item[0] < time.time():
+        items.pop(key, None)
+        return None
+      items.move_to_end(key)
+      return item[1]
+
+  def put(self, ns: str, key: str, value: str, ttl: float, max_items: int) -> None:
+    with self._lock:
+      self._put(ns, key, value, ttl, max_items)
+
+  def _put(self, ns: str, key: str, value: str, ttl: float, max_items: int) -> None:
+    items = self._items.setdefault(ns, OrderedDict())
+    items[key] = (time.time() + ttl, value)
+    items.move_to_end(key)
+    while len(items) > max_items:
+      items.popitem(last=False)
+
+  def update(self, ns: str, key: str, fn: Callable[[Optional[str]], str], ttl: float, max_items: int) -> None:
+    with self._lock:
+      item = self._items.get(ns, {}).get(key)
+      old = item[1] if item is not None and item[0] >= time.time() else None
+      self._put(ns, key, fn(old), ttl, max_items)
+
+  def try_acquire(self, name: str, limit: int, lease: float) -> Optional[str]:
+    now = time.time()
+    with self._lock:
+      slots = self._slots.setdefault(name, {})
+      for token in [t for t, expires in slots.items() if expires < now]:
+        del slots[token]
+      if len(slots) >= limit:
+        return None
+      token = uuid.uuid4().hex
+      slots[token] = now + lease
+      return token
+
+  def release(self, name: str, token: str) -> None:
+    with self._lock:
+      self._slots.get(name, {}).pop(token, None)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+  ns TEXT NOT NULL,
+  key TEXT NOT NULL,
+  value TEXT NOT NULL,
+  expires REAL NOT NULL,
+  PRIMARY KEY (ns, key)
+);
+CREATE INDEX IF NOT EXISTS ix_kv_expires ON kv (ns, expires);
+CREATE TABLE IF NOT EXISTS slots (
+  name TEXT NOT NULL,
+  token TEXT PRIMARY KEY,
+  expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_slots_name ON slots (name, expires);
+"""
+
+
+class SQLiteState:
+  """
+  同机多 worker：共用一个 SQLite 文件，每个线程一条连接。
+  KV 超出条数时淘汰最早过期的（读的时候不写库，省掉跨进程的写锁争用，代价是不是严格 LRU）。
+  """
+
+  # 等锁最多 busy timeout 那么久，异步代码里要经 call() 调
+  blocking = True
+
+  def __init__(self, path: str) -> None:
+    self.path = path
+    self._local = threading.local()
+    conn = self._conn()
+    conn.executescript(_SCHEMA)
+
+  @classmethod
+  def from_url(cls, url: str) -> "SQLiteState":
+    return cls(url[len("sqlite:///"):])
+
+  def _conn(self) -> sqlite3.Connection:
+    conn = getattr(self._local, "conn", None)
+    if conn is None:
+      # isolation_level=None：自己写 BEGIN IMMEDIATE，拿名额的「数-插」要在一个写事务里
+      conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+      conn.execute("PRAGMA journal_mode=WAL")
+      conn.execute("PRAGMA synchronous=NORMAL")
+      self._local.conn = conn
+    return conn
+
+  def get(self, ns: str, key: str) -> Optional[str]:
+    row = self._conn().execute(
+      "SELECT value FROM kv WHERE ns = ? AND key = ? AND expires >= ?", (ns, key, time.time())
+    ).fetchone()
+    return row[0] if row else None
+
+  def put(self, ns: str, key: str, value: str, ttl: float, max_items: int) -> None:
+    self.update(ns, key, lambda _: value, ttl, max_items)
+
+  def update(self, ns: str, key: str, fn: Callable[[Optional[str]], str], ttl: float, max_items: int) -> None:
+    # BEGIN IMMEDIATE 先拿写锁再读，别的 worker 的读-改-写只能排在前后，不会互相覆盖
+    now = time.time()
+    conn = self._conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+      row = conn.execute("SELECT value FROM kv WHERE ns = ? AND key = ? AND expires >= ?", (ns, key, now)).fetchone()
+      value = fn(row[0] if row else None)
+      conn.execute("INSERT OR REPLACE INTO kv (ns, key, value, expires) VALUES (?, ?, ?, ?)", (ns, key, value, now + ttl))
+      conn.execute("DELETE FROM kv WHERE ns = ? AND expires < ?", (ns, now))
+      conn.execute(
+        "DELETE FROM kv WHERE ns = ? AND key IN "
+        "(SELECT key FROM kv WHERE ns = ? ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+        (ns, ns, max_items),
+      )
+      conn.execute("COMMIT")
+    except BaseException:
+      conn.execute("ROLLBACK")
+      raise
+
+  def try_acquire(self, name: str, limit: int, lease: float) -> Optional[str]:
+    now = time.time()
+    conn = self._conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+      conn.execute("DELETE FROM slots WHERE name = ? AND expires < ?", (name, now))
+      (used,) = conn.execute("SELECT COUNT(*) FROM slots WHERE name = ?", (name,)).fetchone()
+      token = None
+      if used < limit:
+        token = uuid.uuid4().hex
+        conn.execute("INSERT INTO slots (name, token, expires) VALUES (?, ?, ?)", (name, token, now + lease))
+      conn.execute("COMMIT")
+      return token
+    except BaseException:
+      conn.execute("ROLLBACK")
+      raise
+
+  def release(self, name: str, token: str) -> None:
+    self._conn().execute("DELETE FROM slots WHERE name = ? AND token = ?", (name, token))
+
+
+async def call(store, fn: Callable[..., Any], *args: Any) -> Any:
+  """在异步代码里调 store 的方法：会等锁的放线程池，内存里的直接调（省一次线程切换）。"""
+  if getattr(store, "blocking", False):
+    return await asyncio.to_thread(fn, *args)
+  return fn(*args)
+
+
+def _make_state():
+  url = (os.getenv("SHARED_STATE") or "").strip()
+  if url.startswith("sqlite:///"):
+    return SQLiteState.from_url(url)
+  return MemoryState()
+
+
+state = _make_state()
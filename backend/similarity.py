@@ -0,0 +1,128 @@
+"""
+本地文本相似度：字符 n-gram 哈希成定长向量，用余弦相似度判重。不走网络，也不调模型。
+
+- 文本先去掉空白和标点，按字切出 2~3 字的 n-gram，哈希到 DIM 维后做 L2 归一化；
+- 追问判重：新追问和同级节点、祖先节点的问题太像（≥ DUPLICATE_THRESHOLD）就不要；
+- 追问复用：每个项目记着最近几次模型给出的追问，按「节点问题 + 回答」的向量建索引。
+  再次追问时，如果找到足够像的记录（≥ REUSE_THRESHOLD）且还有没用过的候选，就直接拿来用，不调模型。
+  记录存在 shared_state 里，多 worker 共用，写入走 shared_state 的原子读-改-写；
+- 向量用 NumPy 矩阵乘批量算（NumPy 是必需依赖，见 requirements.txt）。
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import shared_state
+
+DIM = 1024
+DUPLICATE_THRESHOLD = 0.8
+REUSE_THRESHOLD = 0.9
+
+_STRIP = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def _grams(text: str) -> List[str]:
+  s = _STRIP.sub("", (text or "").lower())
+  if len(s) < 2:
+    return [s] if s else []
+  grams = [s[i : i + 2] for i in range(len(s) - 1)]
+  grams += [s[i : i + 3] for i in range(len(s) - 2)]
+  return grams
+
+
+def _sparse(text: str) -> Dict[int, float]:
+  """哈希 trick：crc32 取模定维度，计数后归一化。"""
+  vec: Dict[int, float] = {}
+  for g in _grams(text):
+    h = zlib.crc32(g.encode("utf-8"))
+    i = h % DIM
+    vec[i] = vec.get(i, 0.0) + 1.0
+  norm = sum(v * v for v in vec.values()) ** 0.5
+  return {i: v / norm for i, v in vec.items() if v} if norm else {}
+
+
+def embed(texts: Sequence[str]):
+  """texts -> len(texts) x DIM 的 float32 矩阵，每行已归一化。"""
+  m = np.zeros((len(texts), DIM), dtype=np.float32)
+  for row, text in enumerate(texts):
+    for i, v in _sparse(text).items():
+      m[row, i] = v
+  return m
+
+
+def similarities(query: str, texts: Sequence[str]) -> List[float]:
+  """query 和 texts 里每条的余弦相似度。"""
+  if not texts:
+    return []
+  return (embed(texts) @ embed([query])[0]).tolist()
+
+
+def most_similar(query: str, texts: Sequence[str]) -> Tuple[int, float]:
+  """(下标, 相似度)；texts 为空时返回 (-1, 0.0)。"""
+  sims = similarities(query, texts)
+  if not sims:
+    return -1, 0.0
+  best = max(range(len(sims)), key=sims.__getitem__)
+  return best, sims[best]
+
+
+def is_duplicate(text: str, existing: Sequence[str], threshold: float = DUPLICATE_THRESHOLD) -> bool:
+  return most_similar(text, existing)[1] >= threshold
+
+
+class FollowupCache:
+  """每个项目最近 max_entries 次模型给的追问：[{"key": 问题+回答, "followups": [...]}]，新的在后。"""
+
+  def __init__(self, ttl: float = 86400.0, max_entries: int = 64, store=None) -> None:
+    self.ttl = ttl
+    self.max_entries = max_entries
+    self.store = store or shared_state.state
+
+  def _load(self, project_id: str) -> List[dict]:
+    raw = self.store.get("followups", project_id)
+    return json.loads(raw) if raw else []
+
+  def lookup(self, project_id: str, key: str, threshold: float = REUSE_THRESHOLD) -> List[str]:
+    """足够像的记录里的追问，最像的在前。"""
+    entries = self._load(project_id)
+    sims = similarities(key, [e["key"] for e in entries])
+    ranked = sorted((s, i) for i, s in enumerate(sims) if s >= threshold)
+    out: List[str] = []
+    for _, i in reversed(ranked):
+      out.extend(q for q in entries[i]["followups"] if q not in out)
+    return out
+
+  def store_followups(self, project_id: str, key: str, followups: List[str]) -> None:
+    if not followups:
+      return
+
+    def merge(raw: Optional[str]) -> str:
+      entries = json.loads(raw) if raw else []
+      new = list(followups)
+      old = next((e for e in entries if e["key"] == key), None)
+      if old is not None:
+        # 同一个节点同一条回答又问了一次模型：新旧候选合并
+        entries.remove(old)
+        new = old["followups"] + [q for q in new if q not in old["followups"]]
+      entries.append({"key": key, "followups": new})
+      return json.dumps(entries[-self.max_entries :], ensure_ascii=False)
+
+    # 多个 worker 同时给一个项目存追问时，各自读-改-写会互相覆盖，交给 store 原子地做
+    self.store.update("followups", project_id, merge, self.ttl, 10000)
+
+
+followup_cache = FollowupCache()
+
+
+def pick_new(candidates: Sequence[str], existing: Sequence[str]) -> Optional[str]:
+  """候选里第一条和 existing 都不重复的。"""
+  for q in candidates:
+    if not is_duplicate(q, existing):
+      return q
+  return None
@@ -0,0 +1,182 @@
+"""
+前端静态资源：只放行白名单里的页面和 frontend/ 目录，仓库里其他文件一律 404。
+
+- 启动时（或第一次请求时）把资源读进内存，算内容 hash，预先压好 gzip（装了 brotli 再加一份 br）；
+- frontend/ 下的文件另有带 hash 的地址 /assets/main.<hash>.js，页面里的引用在构建时改写过去，
+  这类地址内容永远不变，给一年 immutable 缓存；
+- 页面本身和老地址 /frontend/... 用 no-cache + ETag，回访只花一次 304。
+- STATIC_WATCH=1 时每次请求检查源文件 mtime，改了就重建，开发时不用重启。
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .cache import etag_matches
+from .compression import _brotli, pick_encoding
+
+# 对外开放的页面（相对仓库根目录）和整个开放的目录
+STATIC_PAGES = ("index.html", "策划.html")
+STATIC_DIRS = ("frontend",)
+_INDEX = "index.html"
+_IMMUTABLE = "public, max-age=31536000, immutable"
+_REVALIDATE = "no-cache"
+# 太小的文件压了也省不了几个字节，还多一次解压
+_MIN_COMPRESS = 512
+
+
+def _media_type(path: str) -> str:
+  if path.endswith(".js"):
+    return "text/javascript; charset=utf-8"
+  media, _ = mimetypes.guess_type(path)
+  media = media or "application/octet-stream"
+  if media.startswith("text/") or media in ("application/json", "image/svg+xml"):
+    media += "; charset=utf-8"
+  return media
+
+
+@dataclass
+class Asset:
+  media_type: str
+  digest: str
+  # 编码 -> bytes；identity 一定有，gzip / br 只在压缩后明显更小时才有
+  bodies: Dict[str, bytes] = field(default_factory=dict)
+
+  def etag(self, encoding: str) -> str:
+    return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+
+def _compress(data: bytes) -> Dict[str, bytes]:
+  bodies = {"identity": data}
+  if len(data) < _MIN_COMPRESS:
+    return bodies
+  gz = gzip.compress(data, compresslevel=9, mtime=0)
+  if len(gz) < len(data) * 0.9:
+    bodies["gzip"] = gz
+  brotli = _brotli()
+  if brotli is not None:
+    br = brotli.compress(data, quality=11)
+    if len(br) < len(data) * 0.9:
+      bodies["br"] = br
+  return bodies
+
+
+def _hashed_name(rel: str, digest: str) -> str:
+  stem, ext = os.path.splitext(os.path.basename(rel))
+  return f"{stem}.{digest[:12]}{ext}"
+
+
+class StaticAssets:
+  """挂在 / 上的 ASGI app，替代整目录的 StaticFiles。"""
+
+  def __init__(self, root: str, pages=STATIC_PAGES, dirs=STATIC_DIRS, watch: Optional[bool] = None) -> None:
+    self.root = root
+    self.pages = pages
+    self.dirs = dirs
+    self.watch = (os.getenv("STATIC_WATCH") or "").strip() in ("1", "true") if watch is None else watch
+    # URL 路径 -> (资源, Cache-Control)
+    self.routes: Dict[str, Tuple[Asset, str]] = {}
+    self.urls: Dict[str, str] = {}  # 源文件相对路径 -> 带 hash 的地址
+    self._mtimes: Dict[str, float] = {}
+    self._lock = threading.Lock()
+    self._built = False
+
+  def _sources(self) -> List[str]:
+    files = [p for p in self.pages if os.path.isfile(os.path.join(self.root, p))]
+    for d in self.dirs:
+      base = os.path.join(self.root, d)
+      for dirpath, _, names in os.walk(base):
+        for name in names:
+          if not name.startswith("."):
+            files.append(os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, "/"))
+    return sorted(files)
+
+  def _stale(self) -> bool:
+    for rel in self._sources():
+      try:
+        if os.path.getmtime(os.path.join(self.root, rel)) != self._mtimes.get(rel):
+          return True
+      except OSError:
+        return True
+    return len(self._mtimes) != len(self._sources())
+
+  def build(self) -> None:
+    """读文件、算 hash、改写页面引用、预压缩；可以在启动时放后台线程里跑。"""
+    with self._lock:
+      if self._built and not (self.watch and self._stale()):
+        return
+      routes: Dict[str, Tuple[Asset, str]] = {}
+      urls: Dict[str, str] = {}
+      mtimes: Dict[str, float] = {}
+      sources = self._sources()
+      pages = [rel for rel in sources if rel in self.pages]
+      # 先处理被引用的资源，页面要用到它们的 hash 地址
+      for rel in sources:
+        if rel in self.pages:
+          continue
+        path = os.path.join(self.root, rel)
+        mtimes[rel] = os.path.getmtime(path)
+        with open(path, "rb") as f:
+          data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:20]
+        asset = Asset(_media_type(rel), digest, _compress(data))
+        hashed = f"/assets/{_hashed_name(rel, digest)}"
+        urls[rel] = hashed
+        routes[hashed] = (asset, _IMMUTABLE)
+        routes[f"/{rel}"] = (asset, _REVALIDATE)
+      for rel in pages:
+        path = os.path.join(self.root, rel)
+        mtimes[rel] = os.path.getmtime(path)
+        with open(path, "rb") as f:
+          html = f.read().decode("utf-8")
+        for src, hashed in urls.items():
+          html = html.replace(f'"./{src}"', f'"{hashed}"').replace(f'"{src}"', f'"{hashed}"').replace(f'"/{src}"', f'"{hashed}"')
+        data = html.encode("utf-8")
+        asset = Asset(_media_type(rel), hashlib.sha256(data).hexdigest()[:20], _compress(data))
+        routes[f"/{rel}"] = (asset, _REVALIDATE)
+        if rel == _INDEX:
+          routes["/"] = (asset, _REVALIDATE)
+      self.routes, self.urls, self._mtimes = routes, urls, mtimes
+      self._built = True
+
+  def lookup(self, path: str) -> Optional[Tuple[Asset, str]]:
+    if not self._built or self.watch:
+      self.build()
+    # ASGI 的 path 已经解码过，中文文件名直接比
+    return self.routes.get(path)
+
+  async def __call__(self, scope, receive, send) -> None:
+    if scope["type"] != "http":
+      return
+    found = self.lookup(scope["path"])
+    method = scope.get("method", "GET")
+    if found is None or method not in ("GET", "HEAD"):
+      status = 404 if found is None else 405
+      await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain")]})
+      await send({"type": "http.response.body", "body": b"Not Found" if status == 404 else b"Method Not Allowed"})
+      return
+    asset, cache_control = found
+    headers = dict(scope.get("headers") or [])
+    encoding = pick_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"), asset.bodies)
+    etag = asset.etag(encoding)
+    out = [
+      (b"cache-control", cache_control.encode()),
+      (b"etag", etag.encode()),
+      (b"vary", b"Accept-Encoding"),
+    ]
+    if etag_matches(headers.get(b"if-none-match", b"").decode("latin-1"), etag):
+      await send({"type": "http.response.start", "status": 304, "headers": out})
+      await send({"type": "http.response.body", "body": b""})
+      return
+    body = asset.bodies[encoding]
+    out += [(b"content-type", asset.media_type.encode()), (b"content-length", str(len(body)).encode())]
+    if encoding != "identity":
+      out.append((b"content-encoding", encoding.encode()))
+    await send({"type": "http.response.start", "status": 200, "headers": out})
+    await send({"type": "http.response.body", "body": b"" if method == "HEAD" else body})
@@ -0,0 +1 @@
+"""后端热点路径的基准测试；用法见 benchmarks/README.md。"""
@@ -0,0 +1,53 @@
+"""
+对比两次 benchmarks.run 的结果：
+
+  python -m benchmarks.compare before.json after.json --threshold 1.2
+
+按 (case, size, variant) 对齐，比较 median；任何一项变慢超过 threshold 倍时退出码为 1，方便挂 CI。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+Key = Tuple[str, str, str]
+
+
+def _index(path: str) -> Dict[Key, dict]:
+  with open(path, encoding="utf-8") as f:
+    report = json.load(f)
+  return {(r["case"], r["size"], r.get("variant", "")): r for r in report.get("results", [])}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("baseline")
+  parser.add_argument("current")
+  parser.add_argument("--threshold", type=float, default=1.2, help="current/baseline 的 median 比值上限")
+  args = parser.parse_args(argv)
+
+  base = _index(args.baseline)
+  cur = _index(args.current)
+  regressions = 0
+  print(f"{'case':<44} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+  for key in sorted(base.keys() | cur.keys()):
+    label = f"{key[0]}[{key[2]}]@{key[1]}" if key[2] else f"{key[0]}@{key[1]}"
+    if key not in base or key not in cur:
+      print(f"{label:<44} {'(only in ' + ('current' if key in cur else 'baseline') + ')':>33}")
+      continue
+    b = base[key]["stats"]["median"]
+    c = cur[key]["stats"]["median"]
+    ratio = c / b if b else float("inf")
+    flag = ""
+    if ratio > args.threshold:
+      regressions += 1
+      flag = "  <-- slower"
+    print(f"{label:<44} {b * 1000:12.3f} {c * 1000:12.3f} {ratio:7.2f}{flag}")
+  return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
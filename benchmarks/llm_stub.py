@@ -0,0 +1,110 @@
+"""
+本地 OpenAI 兼容 stub：只实现 POST /v1/chat/completions，回复内容和 AI_PROVIDER=sim 用的是同一套
+（backend.llm_sim.plausible_reply），带 usage 字段。基准和压测都把 AI_API_BASE 指到这里，不花钱也不受外网抖动影响。
+
+可调的行为：
+- latency / jitter：首 token 前的固定延迟；
+- token_rate：每秒吐多少 token，回复越长越慢（0 表示瞬间吐完）；
+- error_rate：按比例随机回 500 / 429；
+- 请求带 stream=true 时按 SSE 分块推送，块间按 token_rate 间隔。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import uvicorn
+from fastapi import Body, FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from backend.llm_sim import estimate_tokens, plausible_reply
+
+
+def create_app(
+  latency: float = 0.0,
+  jitter: float = 0.0,
+  error_rate: float = 0.0,
+  token_rate: float = 0.0,
+  seed: int = 0,
+) -> FastAPI:
+  """latency / jitter 单位秒，token_rate 单位 token/秒。app.state 上记着调用数和注入的错误数。"""
+  app = FastAPI()
+  rng = random.Random(seed)
+  app.state.calls = 0
+  app.state.errors = 0
+
+  @app.post("/v1/chat/completions")
+  async def chat_completions(payload: dict = Body(...)):
+    app.state.calls += 1
+    call_id = f"stub-{app.state.calls}"
+    delay = max(0.0, latency + rng.uniform(-jitter, jitter))
+    if delay:
+      await asyncio.sleep(delay)
+    if error_rate and rng.random() < error_rate:
+      app.state.errors += 1
+      if rng.random() < 0.5:
+        return JSONResponse({"error": {"message": "rate limited", "type": "rate_limit"}}, status_code=429)
+      return JSONResponse({"error": {"message": "injected failure", "type": "server_error"}}, status_code=500)
+
+    prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages") or [])
+    content = plausible_reply(prompt, rng)
+    model = payload.get("model", "stub")
+
+    if payload.get("stream"):
+      return StreamingResponse(_stream(call_id, model, content, token_rate), media_type="text/event-stream")
+
+    if token_rate:
+      await asyncio.sleep(estimate_tokens(content) / token_rate)
+    return {
+      "id": call_id,
+      "object": "chat.completion",
+      "created": int(time.time()),
+      "model": model,
+      "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+      "usage": {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content)},
+    }
+
+  return app
+
+
+async def _stream(call_id: str, model: str, content: str, token_rate: float):
+  """按 OpenAI 的 chat.completion.chunk 格式分块推，每块约 2 个 token。"""
+  step = 4
+  for i in range(0, len(content), step):
+    piece = content[i : i + step]
+    chunk = {
+      "id": call_id,
+      "object": "chat.completion.chunk",
+      "model": model,
+      "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+    }
+    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    if token_rate:
+      await asyncio.sleep(estimate_tokens(piece) / token_rate)
+  done = {"id": call_id, "object": "chat.completion.chunk", "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+  yield f"data: {json.dumps(done)}\n\n"
+  yield "data: [DONE]\n\n"
+
+
+@contextmanager
+def serve(app, host: str = "127.0.0.1", port: int = 0, path: str = "/v1", lifespan: str = "off") -> Iterator[str]:
+  """后台线程里起 uvicorn，yield 出 base url（默认带 /v1）；port=0 时随机挑空闲端口。"""
+  server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan=lifespan))
+  thread = threading.Thread(target=server.run, daemon=True)
+  thread.start()
+  while not server.started:
+    if not thread.is_alive():
+      raise RuntimeError("stub server failed to start")
+    time.sleep(0.01)
+  bound = server.servers[0].sockets[0].getsockname()[1]
+  try:
+    yield f"http://{host}:{bound}{path}"
+  finally:
+    server.should_exit = True
+    thread.join(timeout=5)
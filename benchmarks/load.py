@@ -0,0 +1,370 @@
+"""
+压测：N 个虚拟用户并发跑完整流程，默认连本地 fake LLM。
+
+  python -m benchmarks.load --users 20 --journeys 100
+  python -m benchmarks.load --mode uvicorn --users 50 --duration 60 --llm-latency 0.8 --llm-token-rate 40
+  python -m benchmarks.load --target http://127.0.0.1:8000 --users 10 --journeys 20   # 打已经起好的服务
+
+一条流程：建 draft → 对话到 ready → from-draft → 循环（取下一个红色问题作答，穿插追问、Tips 选取、拉详情）
+直到全部完成 → 融合。输出吞吐、各步骤延迟分位数、错误分布，以及数据库争用情况：
+SQL 耗时占比（从 /metrics 取差值）、连接池占满的时间比例、SQLite 锁错误数（后两项只在同进程起服务时有）。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+
+import httpx
+
+
+def _pct(ordered: List[float], q: float) -> float:
+  if not ordered:
+    return 0.0
+  return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Recorder:
+  """按步骤名收集延迟和状态码。"""
+
+  def __init__(self) -> None:
+    self.latency: Dict[str, List[float]] = defaultdict(list)
+    self.status: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    self.requests = 0
+    self.journeys_ok = 0
+    self.journeys_failed = 0
+    self.lock_errors = 0
+    self.metrics_delta: Dict[str, float] = {}
+
+  def add(self, step: str, elapsed: float, status: str) -> None:
+    self.requests += 1
+    self.latency[step].append(elapsed)
+    self.status[step][status] += 1
+
+  def summary(self) -> dict:
+    steps = {}
+    for step, samples in sorted(self.latency.items()):
+      ordered = sorted(samples)
+      steps[step] = {
+        "count": len(samples),
+        "mean": statistics.fmean(ordered),
+        "p50": _pct(ordered, 0.5),
+        "p90": _pct(ordered, 0.9),
+        "p99": _pct(ordered, 0.99),
+        "max": ordered[-1],
+        "status": dict(self.status[step]),
+      }
+    return steps
+
+
+def _count_lock_errors(engine, rec: Recorder) -> None:
+  """
+  锁冲突在引擎层数，不依赖响应体里有没有错误详情：
+  SQLite 是写锁等超时（database is locked），Postgres 是死锁 / 串行化失败。
+  """
+  from sqlalchemy import event
+
+  @event.listens_for(engine, "handle_error")
+  def _on_error(ctx) -> None:
+    message = str(ctx.original_exception)
+    if "locked" in message or "deadlock detected" in message or "could not serialize" in message:
+      rec.lock_errors += 1
+
+
+class PoolSampler:
+  """同进程时定期看一眼连接池：占满的时间比例、最多同时借出几条。"""
+
+  def __init__(self, engine, interval: float = 0.02) -> None:
+    self.pool = engine.pool
+    self.interval = interval
+    self.samples = 0
+    self.saturated = 0
+    self.max_checked_out = 0
+    self._stop = threading.Event()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+
+  def _capacity(self) -> Optional[int]:
+    size = getattr(self.pool, "size", None)
+    overflow = getattr(self.pool, "_max_overflow", 0)
+    if not callable(size):
+      return None
+    return size() + max(overflow, 0) if overflow >= 0 else None
+
+  def _run(self) -> None:
+    capacity = self._capacity()
+    checkedout = getattr(self.pool, "checkedout", None)
+    while not self._stop.is_set():
+      if callable(checkedout):
+        n = checkedout()
+        self.samples += 1
+        self.max_checked_out = max(self.max_checked_out, n)
+        if capacity is not None and n >= capacity:
+          self.saturated += 1
+      time.sleep(self.interval)
+
+  def start(self) -> None:
+    self._thread.start()
+
+  def stop(self) -> dict:
+    self._stop.set()
+    self._thread.join(timeout=1)
+    return {
+      "pool": type(self.pool).__name__,
+      "capacity": self._capacity(),
+      "max_checked_out": self.max_checked_out,
+      "saturated_ratio": (self.saturated / self.samples) if self.samples else 0.0,
+    }
+
+
+# 标签值里本身有花括号（路由模板 /api/projects/{project_id}），所以贪婪匹配到最后一个 }
+_METRIC_LINE = re.compile(r'^(\w+)\{(.*)\} ([0-9.eE+-]+|\+Inf)$')
+
+
+def _scrape(text: str) -> Dict[str, float]:
+  """只取按路由汇总的 SQL 耗时和请求耗时，算占比用。"""
+  out: Dict[str, float] = defaultdict(float)
+  for line in text.splitlines():
+    m = _METRIC_LINE.match(line)
+    if not m:
+      continue
+    name, value = m.group(1), float(m.group(3))
+    if name in ("http_request_db_seconds_sum", "http_request_duration_seconds_sum", "http_request_db_queries_sum"):
+      out[name] += value
+  return out
+
+
+class Journey:
+  def __init__(self, client: httpx.AsyncClient, rec: Recorder, rng: random.Random, args) -> None:
+    self.client = client
+    self.rec = rec
+    self.rng = rng
+    self.args = args
+
+  async def call(self, step: str, method: str, url: str, **kw) -> httpx.Response:
+    start = time.perf_counter()
+    try:
+      r = await self.client.request(method, url, **kw)
+    except httpx.HTTPError as e:
+      self.rec.add(step, time.perf_counter() - start, type(e).__name__)
+      raise
+    self.rec.add(step, time.perf_counter() - start, str(r.status_code))
+    return r
+
+  async def run(self) -> None:
+    a = self.args
+    r = await self.call("draft.create", "POST", "/api/draft", json={"mode": "detail"})
+    r.raise_for_status()
+    draft_id = r.json()["draft_id"]
+    for i in range(3):
+      r = await self.call(
+        "draft.message", "POST", f"/api/draft/{draft_id}/message",
+        json={"content": "一个给大学生用的二手教材交易小程序，支持扫码上架和同校面交，先在一个校区试点。"},
+      )
+      r.raise_for_status()
+      if not r.json().get("need_more"):
+        break
+    r = await self.call("project.from_draft", "POST", "/api/projects/from-draft", json={"draft_id": draft_id})
+    r.raise_for_status()
+    project = r.json()
+    pid = project["id"]
+    etag = None
+
+    next_id = next((n["id"] for n in project["nodes"] if n["level"] > 0 and n["status"] == "red"), None)
+    spawns = tips = 0
+    for _ in range(a.max_answers):
+      if next_id is None:
+        break
+      node_id = next_id
+      r = await self.call(
+        "node.answer", "POST", f"/api/projects/{pid}/nodes/{node_id}/answer",
+        json={"content": "先在校内试点，目标用户是大一新生，主打扫码上架和同校面交。"},
+      )
+      r.raise_for_status()
+      next_id = r.json().get("nextNodeId")
+
+      if spawns < a.spawns and self.rng.random() < 0.5:
+        spawns += 1
+        r = await self.call("node.spawn", "POST", f"/api/projects/{pid}/nodes/{node_id}/spawn")
+        if r.status_code == 200 and next_id is None:
+          next_id = r.json()["id"]
+      if tips < a.tips and self.rng.random() < 0.3:
+        tips += 1
+        r = await self.call("tips.spawn", "POST", f"/api/projects/{pid}/nodes/{node_id}/tips")
+        if r.status_code == 200:
+          tip_id = r.json()["id"]
+          r = await self.call("tips.candidates", "POST", f"/api/projects/{pid}/nodes/{tip_id}/tips/candidates")
+          cands = r.json().get("candidates") if r.status_code == 200 else None
+          if cands:
+            await self.call(
+              "tips.choose", "POST", f"/api/projects/{pid}/nodes/{tip_id}/tips/choose", json={"content": cands[0]}
+            )
+      if self.rng.random() < 0.3:
+        headers = {"If-None-Match": etag} if etag else {}
+        r = await self.call("project.get", "GET", f"/api/projects/{pid}", headers=headers)
+        etag = r.headers.get("etag") or etag
+      if a.think_time:
+        await asyncio.sleep(self.rng.uniform(0, a.think_time))
+
+    if next_id is None:
+      r = await self.call("project.merge", "POST", f"/api/projects/{pid}/merge")
+      r.raise_for_status()
+
+
+async def _worker(client: httpx.AsyncClient, rec: Recorder, args, seed: int, budget: dict) -> None:
+  rng = random.Random(seed)
+  while True:
+    if args.duration:
+      if time.perf_counter() >= budget["deadline"]:
+        return
+    else:
+      if budget["left"] <= 0:
+        return
+      budget["left"] -= 1
+    try:
+      await Journey(client, rec, rng, args).run()
+      rec.journeys_ok += 1
+    except Exception as e:
+      rec.journeys_failed += 1
+      if args.verbose:
+        print(f"journey failed: {type(e).__name__}: {e}", file=sys.stderr)
+
+
+async def _drive(base_url: str, transport, args, rec: Recorder) -> float:
+  limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+  async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=args.timeout, limits=limits) as client:
+    before = _scrape((await client.get("/metrics")).text)
+    budget = {"left": args.journeys, "deadline": time.perf_counter() + args.duration}
+    start = time.perf_counter()
+    await asyncio.gather(*(_worker(client, rec, args, args.seed + i, budget) for i in range(args.users)))
+    elapsed = time.perf_counter() - start
+    after = _scrape((await client.get("/metrics")).text)
+  rec.metrics_delta = {k: after.get(k, 0.0) - before.get(k, 0.0) for k in after}
+  return elapsed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess", help="ASGI 直连，或本机起 uvicorn 走 TCP")
+  parser.add_argument("--target", default="", help="直接打一个已经在跑的服务（此时 fake LLM 需自行配置）")
+  parser.add_argument("--users", type=int, default=10, help="并发虚拟用户数")
+  parser.add_argument("--journeys", type=int, default=50, help="总流程数（--duration 为 0 时生效）")
+  parser.add_argument("--duration", type=float, default=0.0, help="按时长跑（秒），设了就忽略 --journeys")
+  parser.add_argument("--max-answers", type=int, default=30, help="每个流程最多作答多少次")
+  parser.add_argument("--spawns", type=int, default=3, help="每个流程最多追问几次")
+  parser.add_argument("--tips", type=int, default=2, help="每个流程最多选几次 Tips")
+  parser.add_argument("--think-time", type=float, default=0.0, help="每步之间随机停顿上限（秒）")
+  parser.add_argument("--timeout", type=float, default=120.0)
+  parser.add_argument("--llm-latency", type=float, default=0.2)
+  parser.add_argument("--llm-jitter", type=float, default=0.05)
+  parser.add_argument("--llm-error-rate", type=float, default=0.0)
+  parser.add_argument("--llm-token-rate", type=float, default=0.0, help="fake LLM 每秒吐多少 token，0 为瞬间")
+  parser.add_argument(
+    "--llm-provider", choices=["server", "sim"], default="server",
+    help="server：本机起 HTTP stub；sim：AI_PROVIDER=sim 进程内模拟，不走网络（AI_SIM_* 环境变量优先）",
+  )
+  parser.add_argument("--database-url", default="", help="默认用临时 SQLite 文件")
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--out", default="", help="结果 JSON 路径")
+  parser.add_argument("--verbose", action="store_true")
+  args = parser.parse_args(argv)
+
+  rec = Recorder()
+  pool_stats: Optional[dict] = None
+  llm_state = None
+
+  with ExitStack() as stack:
+    transport = None
+    if args.target:
+      base_url = args.target.rstrip("/")
+    else:
+      # 和 benchmarks.run 一样：import backend 前把库和 AI 配置定下来
+      os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='mindmap-load-')}/load.db"
+      os.environ["AI_CACHE_TTL"] = "0"
+      os.environ["AI_API_KEY"] = "load"
+
+      from benchmarks.llm_stub import create_app, serve
+
+      if args.llm_provider == "sim":
+        os.environ["AI_PROVIDER"] = "sim"
+        lo, hi = max(0.0, args.llm_latency - args.llm_jitter), args.llm_latency + args.llm_jitter
+        os.environ.setdefault("AI_SIM_LATENCY", f"uniform:{lo},{hi}")
+        os.environ.setdefault("AI_SIM_TOKEN_RATE", str(args.llm_token_rate))
+        half = args.llm_error_rate / 2
+        os.environ.setdefault("AI_SIM_FAILURES", f"500:{half},429:{half}" if half else "")
+        os.environ.setdefault("AI_SIM_SEED", str(args.seed))
+      else:
+        llm_app = create_app(
+          latency=args.llm_latency,
+          jitter=args.llm_jitter,
+          error_rate=args.llm_error_rate,
+          token_rate=args.llm_token_rate,
+          seed=args.seed,
+        )
+        llm_state = llm_app.state
+        os.environ["AI_API_BASE"] = stack.enter_context(serve(llm_app))
+
+      from backend.db import engine, init_db
+      from backend.main import app
+
+      if args.mode == "uvicorn":
+        base_url = stack.enter_context(serve(app, path="", lifespan="on"))
+      else:
+        init_db()
+        # 应用异常按 500 返回，和走 uvicorn 时一致
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        base_url = "http://load.test"
+      _count_lock_errors(engine, rec)
+      sampler = PoolSampler(engine)
+      sampler.start()
+
+    elapsed = asyncio.run(_drive(base_url, transport, args, rec))
+    if not args.target:
+      pool_stats = sampler.stop()
+
+  steps = rec.summary()
+  delta = rec.metrics_delta
+  http_seconds = delta.get("http_request_duration_seconds_sum", 0.0)
+  db_seconds = delta.get("http_request_db_seconds_sum", 0.0)
+  report = {
+    "config": {k: v for k, v in vars(args).items() if k not in ("out", "verbose")},
+    "elapsed": elapsed,
+    "journeys": {"ok": rec.journeys_ok, "failed": rec.journeys_failed},
+    "throughput": {"journeys_per_s": rec.journeys_ok / elapsed if elapsed else 0.0, "requests_per_s": rec.requests / elapsed if elapsed else 0.0},
+    "steps": steps,
+    "db": {
+      "sql_seconds": db_seconds,
+      "sql_share_of_request_time": (db_seconds / http_seconds) if http_seconds else 0.0,
+      "queries": delta.get("http_request_db_queries_sum", 0.0),
+      "lock_errors": rec.lock_errors,
+      "pool": pool_stats,
+    },
+    "llm": {"calls": llm_state.calls, "injected_errors": llm_state.errors} if llm_state is not None else None,
+  }
+
+  print(f"\n{rec.journeys_ok} journeys ok, {rec.journeys_failed} failed in {elapsed:.1f}s "
+        f"({report['throughput']['journeys_per_s']:.2f} journeys/s, {report['throughput']['requests_per_s']:.1f} req/s)")
+  print(f"{'step':<20} {'count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}  status")
+  for step, s in steps.items():
+    print(f"{step:<20} {s['count']:>6} {s['p50'] * 1000:9.1f} {s['p90'] * 1000:9.1f} {s['p99'] * 1000:9.1f}  {s['status']}")
+  db = report["db"]
+  print(f"SQL share of request time: {db['sql_share_of_request_time']:.1%}, lock errors: {db['lock_errors']}, pool: {db['pool']}")
+  if args.out:
+    with open(args.out, "w", encoding="utf-8") as f:
+      json.dump(report, f, ensure_ascii=False, indent=2)
+  return 0 if rec.journeys_failed == 0 else 1
+
+
+if __name__ == "__main__":
+  sys.exit(main())
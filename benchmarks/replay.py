@@ -0,0 +1,268 @@
+"""
+按录制文件重放一段真实会话（录制见 backend/recorder.py，AI_RECORD_PATH）：
+
+  python -m benchmarks.replay recording.jsonl                  # 按原始时间间隔重放
+  python -m benchmarks.replay recording.jsonl --speed 4        # 4 倍速
+  python -m benchmarks.replay recording.jsonl --no-timing      # 一个接一个，不等间隔
+  python -m benchmarks.replay recording.jsonl --target http://127.0.0.1:8000
+
+默认在进程内起一个用临时库的 app，AI_PROVIDER=sim + AI_SIM_REPLAY 指向同一个文件，
+模型按 prompt 回放录下来的回复和耗时。HTTP 请求按原始时间点发出，路径和请求体里的旧 id
+换成重放时新建出来的 id（靠记录里响应 id 的出现顺序对应）；原始会话里某请求开始前已经结束、
+且碰过同一对象的请求，重放时也先等它结束，保证同一份草稿 / 项目上的操作顺序不乱。
+进程内重放时按 rid 把模型调用对回当时那次请求，同一个 prompt 录了多条回复也不会串。
+最后对比每类请求原始和重放时的状态码与延迟。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+_ID = re.compile(r"\b[0-9a-f]{32}\b")
+
+
+def load_http_entries(path: str) -> List[dict]:
+  entries = []
+  with open(path, encoding="utf-8") as f:
+    for line in f:
+      line = line.strip()
+      if line:
+        entry = json.loads(line)
+        if entry.get("type") == "http":
+          entries.append(entry)
+  entries.sort(key=lambda e: e["ts"])
+  return entries
+
+
+def _route(path: str) -> str:
+  return _ID.sub("{id}", path)
+
+
+def _request_ids(entry: dict) -> set:
+  text = entry["path"] + (json.dumps(entry["body"]) if "body" in entry else "")
+  return set(_ID.findall(text))
+
+
+def dependencies(entries: List[dict]) -> List[List[int]]:
+  """每条请求要等哪些前序请求：原始时间线上在它开始前已结束、且涉及同一 id 的。"""
+  touched: Dict[str, List[int]] = defaultdict(list)
+  deps: List[List[int]] = []
+  for i, entry in enumerate(entries):
+    req_ids = _request_ids(entry)
+    found = set()
+    for id_ in req_ids:
+      for j in touched[id_]:
+        if entries[j]["ts"] + entries[j]["latency"] <= entry["ts"]:
+          found.add(j)
+    deps.append(sorted(found))
+    for id_ in req_ids | set(entry.get("ids") or []):
+      touched[id_].append(i)
+  return deps
+
+
+class _ReplayTag:
+  """进程内重放时包在 app 外面：把请求头里的原始 rid 交给模拟器。"""
+
+  def __init__(self, app) -> None:
+    self.app = app
+
+  async def __call__(self, scope, receive, send) -> None:
+    from backend import llm_sim
+
+    rid = dict(scope.get("headers") or []).get(b"x-replay-rid")
+    token = llm_sim.replay_rid.set(rid.decode("latin-1") if rid else None)
+    try:
+      await self.app(scope, receive, send)
+    finally:
+      llm_sim.replay_rid.reset(token)
+
+
+class IdMap:
+  """旧 id → 新 id；还没轮到产出它的请求时先等着。"""
+
+  def __init__(self, produced: set, wait_timeout: float) -> None:
+    self.produced = produced
+    self.wait_timeout = wait_timeout
+    self.known: Dict[str, str] = {}
+    self.events: Dict[str, asyncio.Event] = defaultdict(asyncio.Event)
+
+  def learn(self, old_ids: List[str], new_ids: List[str]) -> None:
+    for old, new in zip(old_ids, new_ids):
+      if old not in self.known:
+        self.known[old] = new
+        self.events[old].set()
+
+  async def resolve(self, old: str) -> Optional[str]:
+    if old in self.known:
+      return self.known[old]
+    if old not in self.produced:
+      return None  # 录制开始前就有的对象，重放时没有
+    try:
+      await asyncio.wait_for(self.events[old].wait(), self.wait_timeout)
+    except asyncio.TimeoutError:
+      return None
+    return self.known.get(old)
+
+  async def rewrite(self, text: str) -> Optional[str]:
+    out = text
+    for old in set(_ID.findall(text)):
+      new = await self.resolve(old)
+      if new is None:
+        return None
+      out = out.replace(old, new)
+    return out
+
+
+async def _replay_one(client: httpx.AsyncClient, entry: dict, ids: IdMap, results: List[dict]) -> None:
+  result = {
+    "method": entry["method"],
+    "route": _route(entry["path"]),
+    "orig_status": entry["status"],
+    "orig_latency": entry["latency"],
+  }
+  if "body_redacted" in entry:
+    results.append({**result, "skipped": "body_redacted"})
+    return
+  path = await ids.rewrite(entry["path"] + ("?" + entry["query"] if entry.get("query") else ""))
+  body_text = json.dumps(entry["body"], ensure_ascii=False) if "body" in entry else None
+  if body_text is not None:
+    body_text = await ids.rewrite(body_text)
+  if path is None or ("body" in entry and body_text is None):
+    results.append({**result, "skipped": "unmapped_id"})
+    return
+
+  headers = {"X-Replay-Rid": entry["rid"]} if entry.get("rid") else {}
+  kwargs: dict = {"headers": headers}
+  if body_text is not None:
+    headers["Content-Type"] = "application/json"
+    kwargs["content"] = body_text.encode("utf-8")
+  start = time.perf_counter()
+  try:
+    r = await client.request(entry["method"], path, **kwargs)
+  except httpx.HTTPError as e:
+    results.append({**result, "status": type(e).__name__, "latency": time.perf_counter() - start})
+    return
+  latency = time.perf_counter() - start
+  ids.learn(entry.get("ids") or [], list(dict.fromkeys(_ID.findall(r.text))))
+  result.update(status=r.status_code, latency=latency)
+  if r.status_code != entry["status"]:
+    result["detail"] = r.text[:200]
+  results.append(result)
+
+
+async def _drive(base_url: str, transport, entries: List[dict], args) -> List[dict]:
+  produced = {i for e in entries for i in (e.get("ids") or [])}
+  ids = IdMap(produced, args.wait_timeout)
+  deps = dependencies(entries)
+  done = [asyncio.Event() for _ in entries]
+  results: List[dict] = []
+  async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=args.timeout) as client:
+    if args.no_timing:
+      for entry in entries:
+        await _replay_one(client, entry, ids, results)
+      return results
+    t0 = time.perf_counter()
+    ts0 = entries[0]["ts"]
+
+    async def scheduled(i: int, entry: dict) -> None:
+      try:
+        delay = (entry["ts"] - ts0) / args.speed - (time.perf_counter() - t0)
+        if delay > 0:
+          await asyncio.sleep(delay)
+        for j in deps[i]:
+          await done[j].wait()
+        await _replay_one(client, entry, ids, results)
+      finally:
+        done[i].set()
+
+    await asyncio.gather(*(scheduled(i, e) for i, e in enumerate(entries)))
+  return results
+
+
+def _summary(results: List[dict]) -> dict:
+  by_route: Dict[str, List[dict]] = defaultdict(list)
+  for r in results:
+    by_route[f"{r['method']} {r['route']}"].append(r)
+  out = {}
+  for route, items in sorted(by_route.items()):
+    done = [r for r in items if "latency" in r]
+    orig = sorted(r["orig_latency"] for r in done)
+    new = sorted(r["latency"] for r in done)
+    out[route] = {
+      "count": len(items),
+      "skipped": sum(1 for r in items if "skipped" in r),
+      "status_mismatch": sum(1 for r in done if r["status"] != r["orig_status"]),
+      "orig_median": statistics.median(orig) if orig else None,
+      "replay_median": statistics.median(new) if new else None,
+    }
+  return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("recording")
+  parser.add_argument("--speed", type=float, default=1.0, help="时间压缩倍数")
+  parser.add_argument("--no-timing", action="store_true", help="不按原始间隔，顺序一个个发")
+  parser.add_argument("--target", default="", help="打已经在跑的服务（需自行配置 AI_PROVIDER=sim / AI_SIM_REPLAY）")
+  parser.add_argument("--timeout", type=float, default=120.0)
+  parser.add_argument("--wait-timeout", type=float, default=60.0, help="等前序请求产出 id 的最长时间")
+  parser.add_argument("--out", default="", help="逐条结果和汇总写到这个 JSON")
+  args = parser.parse_args(argv)
+
+  entries = load_http_entries(args.recording)
+  if not entries:
+    print("no http entries in recording", file=sys.stderr)
+    return 1
+
+  transport = None
+  if args.target:
+    base_url = args.target.rstrip("/")
+  else:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='mindmap-replay-')}/replay.db"
+    os.environ["AI_PROVIDER"] = "sim"
+    os.environ["AI_SIM_REPLAY"] = os.path.abspath(args.recording)
+    # 缓存关掉：原来命中缓存的调用没有录到，回放时按 prompt 找同样的回复即可
+    os.environ["AI_CACHE_TTL"] = "0"
+    # 录制里找不到的 prompt 现编，别按吐字速度拖慢整体节奏
+    os.environ.setdefault("AI_SIM_TOKEN_RATE", "0")
+    os.environ.pop("AI_RECORD_PATH", None)  # 别把重放又录进去
+
+    from backend.db import init_db
+    from backend.main import app
+
+    init_db()
+    transport = httpx.ASGITransport(app=_ReplayTag(app), raise_app_exceptions=False)
+    base_url = "http://replay.test"
+
+  start = time.perf_counter()
+  results = asyncio.run(_drive(base_url, transport, entries, args))
+  elapsed = time.perf_counter() - start
+
+  summary = _summary(results)
+  span = entries[-1]["ts"] + entries[-1]["latency"] - entries[0]["ts"]
+  print(f"replayed {len(results)} requests in {elapsed:.1f}s (recorded span {span:.1f}s, speed x{args.speed})")
+  print(f"{'request':<60} {'n':>4} {'skip':>4} {'diff':>4} {'orig ms':>9} {'replay ms':>10}")
+  for route, s in summary.items():
+    om = f"{s['orig_median'] * 1000:9.1f}" if s["orig_median"] is not None else f"{'-':>9}"
+    rm = f"{s['replay_median'] * 1000:10.1f}" if s["replay_median"] is not None else f"{'-':>10}"
+    print(f"{route:<60} {s['count']:>4} {s['skipped']:>4} {s['status_mismatch']:>4} {om} {rm}")
+  if args.out:
+    with open(args.out, "w", encoding="utf-8") as f:
+      json.dump({"elapsed": elapsed, "recorded_span": span, "summary": summary, "results": results}, f, ensure_ascii=False, indent=2)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,475 @@
+"""
+后端热点路径基准：
+
+  python -m benchmarks.run                       # realistic + stress 全跑，结果写 bench_results.json
+  python -m benchmarks.run --sizes realistic --cases flatten_nodes,calc_progress
+  python -m benchmarks.run --llm-latency 0.2 --out before.json
+
+每次运行用一个临时 SQLite 库，AI 调用打到本地 stub（benchmarks/llm_stub.py），
+输出 JSON 可以用 benchmarks/compare.py 和上一次的结果对比。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass
+class Size:
+  fanout: int
+  depth: int
+  projects: int  # list_projects 用的项目数
+  repeat: int
+  doc_kb: int  # parse_document 用的 txt 大小
+  doc_pages: int  # pdf 页数 / docx 段落数按 40 倍算
+  search_nodes: int  # search 用例的总节点数（多个项目凑够）
+
+
+SIZES: Dict[str, Size] = {
+  # 一个认真做完的项目：几十到一百多个节点
+  "realistic": Size(fanout=3, depth=4, projects=20, repeat=30, doc_kb=20, doc_pages=5, search_nodes=5000),
+  # 压力：几千节点的大树、几百个项目、接近上限的文档
+  "stress": Size(fanout=4, depth=6, projects=300, repeat=5, doc_kb=2000, doc_pages=100, search_nodes=120000),
+}
+
+
+def _stats(samples: List[float]) -> dict:
+  ordered = sorted(samples)
+  p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+  return {
+    "n": len(samples),
+    "min": ordered[0],
+    "median": statistics.median(ordered),
+    "mean": statistics.fmean(ordered),
+    "p95": p95,
+    "max": ordered[-1],
+    "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+  }
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1) -> dict:
+  samples: List[float] = []
+  for i in range(warmup + repeat):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    if i >= warmup:
+      samples.append(elapsed)
+  return _stats(samples)
+
+
+# ---------- 测试文档 ----------
+
+
+def _make_text(kb: int) -> str:
+  para = "这个项目面向大学生的二手教材交易，核心是扫码上架和同校面交。We keep it simple and local.\n"
+  return (para * (kb * 1024 // len(para.encode("utf-8")) + 1))[: kb * 1024 // 3]
+
+
+def _make_pdf(pages: int, lines_per_page: int = 40) -> bytes:
+  """手拼一个最小 PDF（Helvetica，ASCII 文本），免得为了造数据再装 reportlab。"""
+  objs: List[bytes] = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+  kids = []
+  for p in range(pages):
+    page_no, content_no = len(objs) + 1, len(objs) + 2
+    kids.append(f"{page_no} 0 R")
+    lines = " ".join(f"(Page {p + 1} line {i + 1}: scan to list, meet on campus.) Tj T*" for i in range(lines_per_page))
+    stream = f"BT /F1 10 Tf 12 TL 40 760 Td {lines} ET".encode("latin-1")
+    objs.append(
+      f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {content_no} 0 R >>".encode()
+    )
+    objs.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+  objs[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+  out = io.BytesIO()
+  out.write(b"%PDF-1.4\n")
+  offsets = []
+  for i, body in enumerate(objs, start=1):
+    offsets.append(out.tell())
+    out.write(b"%d 0 obj\n" % i + body + b"\nendobj\n")
+  xref = out.tell()
+  out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1))
+  for off in offsets:
+    out.write(b"%010d 00000 n \n" % off)
+  out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref))
+  return out.getvalue()
+
+
+def _make_docx(paragraphs: int) -> Optional[bytes]:
+  try:
+    from docx import Document
+  except ImportError:
+    return None
+  doc = Document()
+  for i in range(paragraphs):
+    doc.add_paragraph(f"第 {i + 1} 段：扫码上架、同校面交，先在一个校区试点。")
+  buf = io.BytesIO()
+  doc.save(buf)
+  return buf.getvalue()
+
+
+# ---------- 用例 ----------
+
+
+class Context:
+  def __init__(self, size_name: str, size: Size) -> None:
+    from backend.db import engine
+    from benchmarks.synth import TreeShape
+
+    self.size_name = size_name
+    self.size = size
+    self.engine = engine
+    self.shape = TreeShape(fanout=size.fanout, depth=size.depth)
+    self.loop = asyncio.new_event_loop()
+
+  def run(self, coro_fn: Callable[[], object]) -> Callable[[], object]:
+    return lambda: self.loop.run_until_complete(coro_fn())
+
+  def session(self, **kw):
+    from sqlmodel import Session
+
+    return Session(self.engine, **kw)
+
+  def setup_session(self):
+    # 造数据用：commit 后对象不过期，出了 with 还能读 id / status
+    return self.session(expire_on_commit=False)
+
+  def close(self) -> None:
+    self.loop.close()
+
+
+def case_flatten_nodes(ctx: Context) -> dict:
+  from backend.services import flatten_nodes
+  from benchmarks.synth import build_tree
+
+  nodes = build_tree("bench", ctx.shape)
+  return {"nodes": len(nodes), "stats": measure(lambda: flatten_nodes(nodes), ctx.size.repeat)}
+
+
+def case_calc_progress(ctx: Context) -> dict:
+  from backend.services import calc_progress
+  from benchmarks.synth import build_tree
+
+  nodes = build_tree("bench", ctx.shape)
+  return {"nodes": len(nodes), "stats": measure(lambda: calc_progress(nodes), ctx.size.repeat * 10)}
+
+
+def case_auto_trace(ctx: Context) -> dict:
+  """把一个红色叶子改绿后往上溯源；每轮回滚，树保持原样。"""
+  from backend.models import Node, Project
+  from backend.services import _auto_trace_next_red_branch, set_node_status
+  from benchmarks.synth import insert_project
+
+  with ctx.setup_session() as session:
+    project, nodes = insert_project(session, ctx.shape, seed=1)
+    leaves = [n.id for n in nodes if n.level == ctx.size.depth and n.status == "red"]
+
+  state = {"i": 0}
+  session = ctx.session()
+
+  def once() -> None:
+    leaf = session.get(Node, leaves[state["i"] % len(leaves)])
+    state["i"] += 1
+    p = session.get(Project, project.id)
+    set_node_status(session, p, leaf, "green")
+    _auto_trace_next_red_branch(session, leaf, p)
+    session.rollback()
+
+  try:
+    return {"nodes": len(nodes), "stats": measure(once, ctx.size.repeat)}
+  finally:
+    session.close()
+
+
+def case_answer_node_and_trace(ctx: Context) -> dict:
+  from backend.services import answer_node_and_trace
+  from benchmarks.synth import TreeShape, insert_project
+
+  shape = TreeShape(fanout=ctx.size.fanout, depth=ctx.size.depth, answered=0.0)
+  with ctx.setup_session() as session:
+    project, nodes = insert_project(session, shape, seed=2)
+  red = [n.id for n in nodes if n.level > 0 and n.status == "red"]
+  state = {"i": 0}
+
+  async def once() -> None:
+    node_id = red[state["i"] % len(red)]
+    state["i"] += 1
+    with ctx.session() as session:
+      await answer_node_and_trace(session, project.id, node_id, "基准测试回答：先做校内试点。")
+
+  return {"nodes": len(nodes), "stats": measure(ctx.run(once), min(ctx.size.repeat, len(red) - 1))}
+
+
+def case_answer_nodes_batch(ctx: Context) -> List[dict]:
+  """同样 50 条回答：singles 逐条调 answer_node_and_trace，batch 一次 answer_nodes_batch。"""
+  from backend.services import answer_node_and_trace, answer_nodes_batch
+  from benchmarks.synth import TreeShape, insert_project
+
+  per_batch = 50
+  shape = TreeShape(fanout=ctx.size.fanout, depth=ctx.size.depth, answered=0.0)
+  with ctx.setup_session() as session:
+    project, nodes = insert_project(session, shape, seed=4)
+  red = [n.id for n in nodes if n.level > 0 and n.status == "red"]
+  state = {"i": 0}
+
+  def next_items() -> List[tuple]:
+    start = state["i"]
+    state["i"] += per_batch
+    return [(red[(start + k) % len(red)], "基准测试回答：先做校内试点。", False) for k in range(per_batch)]
+
+  async def singles() -> None:
+    for node_id, content, by_ai in next_items():
+      with ctx.session() as session:
+        await answer_node_and_trace(session, project.id, node_id, content, by_ai=by_ai)
+
+  async def batch() -> None:
+    with ctx.session() as session:
+      await answer_nodes_batch(session, project.id, next_items())
+
+  return [
+    {"variant": variant, "nodes": len(nodes), "answers": per_batch, "stats": measure(ctx.run(fn), ctx.size.repeat)}
+    for variant, fn in (("singles", singles), ("batch", batch))
+  ]
+
+
+def case_list_projects(ctx: Context) -> dict:
+  from backend.main import list_projects
+  from benchmarks.synth import TreeShape, insert_project
+
+  small = TreeShape(fanout=3, depth=2)
+  with ctx.setup_session() as session:
+    for i in range(ctx.size.projects):
+      insert_project(session, small, seed=100 + i, with_answers=False)
+
+  def once() -> None:
+    with ctx.session() as session:
+      list_projects(session)
+
+  with ctx.session() as session:
+    count = len(list_projects(session))
+  return {"projects": count, "stats": measure(once, ctx.size.repeat)}
+
+
+def case_merge_project(ctx: Context) -> List[dict]:
+  """cold：每次先清掉分章成稿；one_changed：每次给一个节点追加回答；unchanged：全部复用。"""
+  from sqlmodel import delete
+
+  from backend.main import merge_project
+  from backend.models import MergedSection, NodeAnswer
+  from benchmarks.synth import TreeShape, insert_project
+
+  shape = TreeShape(fanout=ctx.size.fanout, depth=ctx.size.depth, answered=1.0)
+  with ctx.setup_session() as session:
+    project, nodes = insert_project(session, shape, seed=3)
+  answered = [n.id for n in nodes if n.level > 0]
+  state = {"i": 0}
+
+  def prepare(variant: str) -> None:
+    with ctx.session() as session:
+      if variant == "cold":
+        session.exec(delete(MergedSection).where(MergedSection.project_id == project.id))
+      elif variant == "one_changed":
+        state["i"] += 1
+        session.add(NodeAnswer(node_id=answered[state["i"] % len(answered)], content=f"补充说明 {state['i']}"))
+      session.commit()
+
+  out = []
+  for variant in ("cold", "one_changed", "unchanged"):
+
+    async def once(variant: str = variant) -> None:
+      prepare(variant)
+      with ctx.session() as session:
+        await merge_project(project.id, session)
+
+    out.append({"variant": variant, "nodes": len(nodes), "stats": measure(ctx.run(once), ctx.size.repeat)})
+  return out
+
+
+def case_search(ctx: Context) -> List[dict]:
+  """几种典型查询：命中很多的长词、少量命中、带短词（走 LIKE 过滤）、纯短词（LIKE 扫描）、限定项目。"""
+  from backend.main import search_all
+  from benchmarks.synth import TreeShape, insert_project
+
+  shape = TreeShape(fanout=ctx.size.fanout, depth=ctx.size.depth, answered=0.6)
+  total_nodes = 0
+  seed = 500
+  first = None
+  with ctx.setup_session() as session:
+    while total_nodes < ctx.size.search_nodes:
+      project, nodes = insert_project(session, shape, seed=seed)
+      first = first or project
+      total_nodes += len(nodes)
+      seed += 1
+
+  queries = {
+    "common": {"q": "扫码即可上架"},
+    "selective": {"q": "可量化指标"},
+    "mixed": {"q": "合成项目 7"},
+    "short": {"q": "风险"},
+    "in_project": {"q": "核心问题", "project_id": first.id},
+  }
+  out = []
+  for variant, params in queries.items():
+
+    def once(params: dict = params) -> None:
+      with ctx.session() as session:
+        search_all(q=params["q"], project_id=params.get("project_id"), limit=20, offset=0, session=session)
+
+    out.append({"variant": variant, "nodes": total_nodes, "stats": measure(once, ctx.size.repeat)})
+  return out
+
+
+def case_export(ctx: Context) -> List[dict]:
+  """单个项目流式导出三种格式，整条流读完为止。"""
+  from backend.export import FORMATS, stream_project
+  from benchmarks.synth import TreeShape, insert_project
+
+  shape = TreeShape(fanout=ctx.size.fanout, depth=ctx.size.depth, answered=0.6)
+  with ctx.setup_session() as session:
+    project, nodes = insert_project(session, shape, seed=6)
+
+  out = []
+  for fmt in FORMATS:
+
+    def once(fmt: str = fmt) -> None:
+      for _ in stream_project(project.id, fmt):
+        pass
+
+    out.append({"variant": fmt, "nodes": len(nodes), "stats": measure(once, ctx.size.repeat)})
+  return out
+
+
+def case_parse_document(ctx: Context) -> List[dict]:
+  from backend.main import parse_document
+
+  docs = {
+    "txt": _make_text(ctx.size.doc_kb).encode("utf-8"),
+    "pdf": _make_pdf(ctx.size.doc_pages),
+    "docx": _make_docx(ctx.size.doc_pages * 40),
+  }
+  out = []
+  for ext, raw in docs.items():
+    if raw is None:
+      continue
+    payload = {"filename": f"bench.{ext}", "content_base64": base64.b64encode(raw).decode("ascii")}
+    out.append(
+      {
+        "variant": ext,
+        "bytes": len(raw),
+        "stats": measure(ctx.run(lambda: parse_document(payload)), ctx.size.repeat),
+      }
+    )
+  return out
+
+
+CASES: Dict[str, Callable[[Context], object]] = {
+  "flatten_nodes": case_flatten_nodes,
+  "calc_progress": case_calc_progress,
+  "auto_trace_next_red_branch": case_auto_trace,
+  "answer_node_and_trace": case_answer_node_and_trace,
+  "answer_nodes_batch": case_answer_nodes_batch,
+  "list_projects": case_list_projects,
+  "merge_project": case_merge_project,
+  "parse_document": case_parse_document,
+  "export": case_export,
+  "search": case_search,
+}
+
+
+def _git_rev() -> Optional[str]:
+  try:
+    return subprocess.run(
+      ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+    ).stdout.strip()
+  except Exception:
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--sizes", default=",".join(SIZES), help="逗号分隔：" + ",".join(SIZES))
+  parser.add_argument("--cases", default=",".join(CASES), help="逗号分隔：" + ",".join(CASES))
+  parser.add_argument("--llm-latency", type=float, default=0.0, help="stub 每次回复的延迟（秒）")
+  parser.add_argument("--llm-jitter", type=float, default=0.0, help="延迟抖动（秒）")
+  parser.add_argument("--repeat", type=int, default=None, help="覆盖各档位的重复次数")
+  parser.add_argument("--out", default="bench_results.json", help="结果 JSON 路径，- 表示 stdout")
+  parser.add_argument("--database-url", default="", help="默认用临时 SQLite 文件；给 Postgres 时请用专门的空库")
+  args = parser.parse_args(argv)
+
+  sizes = [s for s in args.sizes.split(",") if s]
+  cases = [c for c in args.cases.split(",") if c]
+  unknown = [s for s in sizes if s not in SIZES] + [c for c in cases if c not in CASES]
+  if unknown:
+    parser.error(f"unknown size/case: {', '.join(unknown)}")
+
+  # 环境变量必须在 import backend 之前设好：engine、AI 缓存都是 import 时读配置
+  tmpdir = tempfile.mkdtemp(prefix="mindmap-bench-")
+  os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmpdir}/bench.db"
+  os.environ["AI_CACHE_TTL"] = "0"  # 每次都真打 stub，不让响应缓存把 LLM 那段抹掉
+  os.environ["AI_API_KEY"] = "bench"
+  os.environ["AI_PREFETCH"] = "0"  # 回答后的后台预取会在计时窗口里抢 stub 和数据库，计到下一次调用头上
+
+  from benchmarks.llm_stub import create_app, serve
+
+  results = []
+  with serve(create_app(latency=args.llm_latency, jitter=args.llm_jitter)) as base_url:
+    os.environ["AI_API_BASE"] = base_url
+    from backend.db import init_db
+
+    init_db()
+    for size_name in sizes:
+      size = SIZES[size_name]
+      if args.repeat:
+        size = Size(**{**asdict(size), "repeat": args.repeat})
+      ctx = Context(size_name, size)
+      try:
+        for case in cases:
+          print(f"[{size_name}] {case} ...", file=sys.stderr, flush=True)
+          res = CASES[case](ctx)
+          for item in res if isinstance(res, list) else [res]:
+            results.append({"case": case, "size": size_name, **item})
+            med = item["stats"]["median"] * 1000
+            label = f"{case}[{item['variant']}]" if "variant" in item else case
+            print(f"  {label:<40} median {med:9.3f} ms", file=sys.stderr)
+      finally:
+        ctx.close()
+
+  report = {
+    "meta": {
+      "timestamp": datetime.now(timezone.utc).isoformat(),
+      "git_rev": _git_rev(),
+      "python": platform.python_version(),
+      "platform": platform.platform(),
+      "sqlite": sqlite3.sqlite_version,
+      "llm_latency": args.llm_latency,
+      "llm_jitter": args.llm_jitter,
+      "sizes": {name: asdict(SIZES[name]) for name in sizes},
+    },
+    "results": results,
+  }
+  text = json.dumps(report, ensure_ascii=False, indent=2)
+  if args.out == "-":
+    print(text)
+  else:
+    with open(args.out, "w", encoding="utf-8") as f:
+      f.write(text + "\n")
+    print(f"wrote {args.out}", file=sys.stderr)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+冷启动测量：自动扩容时新 worker 多快能接流量。
+
+  python -m benchmarks.startup                      # import 耗时排行 + 起 uvicorn 到 /health 通的时间
+  python -m benchmarks.startup --runs 5 --max-seconds 2.5 --out startup.json
+  python -m benchmarks.startup --prewarm            # 带 PREWARM_PARSERS=1，对比第一次解析文档的耗时
+
+- import：子进程里 python -X importtime 导入 backend.main，按顶层包汇总自身耗时；
+- 启动：每轮新起一个 uvicorn 进程，从 spawn 到 /health 返回 200 计时。第一轮是空库（要建表），
+  之后复用同一个库（结构指纹一致，跳过 DDL），分开统计；
+- 第一次文档解析：启动后马上传一个 docx，看解析库的 import 是不是落在了请求里。
+
+给了 --max-seconds 时，已有库的启动中位数超过它就退出码 1，方便挂 CI。
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def import_profile(top: int = 12) -> dict:
+  proc = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", "import backend.main"],
+    cwd=_ROOT,
+    capture_output=True,
+    text=True,
+    env={**os.environ, "DATABASE_URL": "sqlite://"},
+  )
+  if proc.returncode != 0:
+    raise RuntimeError(proc.stderr[-2000:])
+  by_package: Dict[str, int] = defaultdict(int)
+  total = 0
+  for line in proc.stderr.splitlines():
+    if not line.startswith("import time:") or "self [us]" in line:
+      continue
+    self_us, cumulative_us, name = [p.strip() for p in line.split(":", 1)[1].split("|")]
+    by_package[name.split(".")[0]] += int(self_us)
+    if name == "backend.main":
+      total = int(cumulative_us)
+  ranked = sorted(by_package.items(), key=lambda kv: -kv[1])[:top]
+  return {"total_ms": total / 1000, "by_package_ms": {k: v / 1000 for k, v in ranked}}
+
+
+def _free_port() -> int:
+  with socket.socket() as s:
+    s.bind(("127.0.0.1", 0))
+    return s.getsockname()[1]
+
+
+def _sample_docx() -> Optional[bytes]:
+  try:
+    from docx import Document
+  except ImportError:
+    return None
+  doc = Document()
+  doc.add_paragraph("项目书：校园二手教材交易平台")
+  buf = io.BytesIO()
+  doc.save(buf)
+  return buf.getvalue()
+
+
+def start_once(db_url: str, prewarm: bool, timeout: float, docx_bytes: Optional[bytes]) -> dict:
+  port = _free_port()
+  env = {**os.environ, "DATABASE_URL": db_url, "PREWARM_PARSERS": "1" if prewarm else "0"}
+  t0 = time.perf_counter()
+  proc = subprocess.Popen(
+    [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+    cwd=_ROOT,
+    env=env,
+    stdout=subprocess.DEVNULL,
+    stderr=subprocess.PIPE,
+  )
+  try:
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5.0) as client:
+      while True:
+        if proc.poll() is not None:
+          raise RuntimeError(proc.stderr.read().decode("utf-8", errors="replace")[-2000:])
+        if time.perf_counter() - t0 > timeout:
+          raise TimeoutError(f"server not ready after {timeout}s")
+        try:
+          if client.get("/health").status_code == 200:
+            break
+        except httpx.TransportError:
+          pass
+        time.sleep(0.005)
+      ready = time.perf_counter() - t0
+      result = {"ready_s": ready}
+      if docx_bytes is not None:
+        s = time.perf_counter()
+        r = client.post(
+          "/api/parse-document",
+          json={"filename": "a.docx", "content_base64": base64.b64encode(docx_bytes).decode("ascii")},
+        )
+        result["first_parse_s"] = time.perf_counter() - s
+        result["first_parse_status"] = r.status_code
+      return result
+  finally:
+    proc.terminate()
+    try:
+      proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+      proc.kill()
+
+
+def _median(values: List[float]) -> Optional[float]:
+  return statistics.median(values) if values else None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--runs", type=int, default=3, help="启动几轮（第一轮是空库）")
+  parser.add_argument("--prewarm", action="store_true", help="设 PREWARM_PARSERS=1")
+  parser.add_argument("--timeout", type=float, default=60.0)
+  parser.add_argument("--max-seconds", type=float, default=0.0, help="已有库时启动中位数的上限，超了退出码 1")
+  parser.add_argument("--out", default="", help="结果 JSON 路径")
+  args = parser.parse_args(argv)
+
+  profile = import_profile()
+  print(f"import backend.main: {profile['total_ms']:.0f}ms")
+  for package, ms in profile["by_package_ms"].items():
+    print(f"  {package:<24} {ms:8.1f}ms")
+
+  db_url = f"sqlite:///{tempfile.mkdtemp(prefix='mindmap-startup-')}/startup.db"
+  docx_bytes = _sample_docx()
+  runs = []
+  for i in range(max(args.runs, 1)):
+    res = start_once(db_url, args.prewarm, args.timeout, docx_bytes)
+    res["fresh_db"] = i == 0
+    runs.append(res)
+    parse = f", first docx parse {res['first_parse_s'] * 1000:.0f}ms" if "first_parse_s" in res else ""
+    print(f"run {i + 1} ({'fresh db' if i == 0 else 'existing db'}): ready in {res['ready_s'] * 1000:.0f}ms{parse}")
+
+  existing = [r["ready_s"] for r in runs if not r["fresh_db"]]
+  summary = {
+    "import_ms": profile["total_ms"],
+    "fresh_db_ready_s": runs[0]["ready_s"],
+    "existing_db_ready_median_s": _median(existing),
+    "first_parse_median_s": _median([r["first_parse_s"] for r in runs if "first_parse_s" in r]),
+    "prewarm": args.prewarm,
+  }
+  if args.out:
+    with open(args.out, "w", encoding="utf-8") as f:
+      json.dump({"summary": summary, "import_profile": profile, "runs": runs}, f, ensure_ascii=False, indent=2)
+  limit_target = summary["existing_db_ready_median_s"] or summary["fresh_db_ready_s"]
+  if args.max_seconds and limit_target > args.max_seconds:
+    print(f"startup {limit_target:.2f}s exceeds --max-seconds {args.max_seconds}", file=sys.stderr)
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
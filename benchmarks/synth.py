@@ -0,0 +1,98 @@
+"""
+合成项目生成器：按 fanout / depth 造一棵满树，问题节点按比例标成已答 / 未答，夹杂一些 Tips 节点。
+计数和先序位置用 services 里同一套 fill_aggregates / fill_dfs_keys 算，和真实建项目的结果一致。
+"""
+
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from typing import List, Tuple
+from uuid import uuid4
+
+from sqlmodel import Session
+
+from backend import search
+from backend.models import Node, NodeAnswer, Project
+from backend.services import fill_aggregates, fill_dfs_keys
+
+
+@dataclass
+class TreeShape:
+  fanout: int
+  depth: int
+  answered: float = 0.5  # 问题节点里已答（green）的比例
+  tip_ratio: float = 0.1  # 非根节点里 Tips 节点的比例（Tips 下面不再长子节点）
+
+
+_QUESTIONS = [
+  "这个项目要解决的核心问题是什么？",
+  "你期望的首要用户或使用场景是怎样的？",
+  "你认为当前最大的可行性风险或难点是什么？",
+  "MVP 阶段准备纳入哪些功能？",
+  "项目成功的可量化指标是什么？",
+]
+
+_ANSWER = "我们先在校内做小范围试点，目标用户是大一新生，主打扫码即可上架和同校面交，降低交易成本。"
+
+
+def build_tree(project_id: str, shape: TreeShape, seed: int = 0) -> List[Node]:
+  """只在内存里造节点，不碰数据库。"""
+  rng = random.Random(seed)
+  root = Node(
+    id=uuid4().hex,
+    project_id=project_id,
+    parent_id=None,
+    level=0,
+    title="合成项目",
+    question="项目根节点",
+    status="red",
+    order_index=0,
+  )
+  nodes = [root]
+  frontier = [root]
+  for level in range(1, shape.depth + 1):
+    nxt: List[Node] = []
+    for parent in frontier:
+      if parent.node_type == "tip":
+        continue
+      for i in range(shape.fanout):
+        is_tip = rng.random() < shape.tip_ratio
+        q = _QUESTIONS[rng.randrange(len(_QUESTIONS))]
+        node = Node(
+          id=uuid4().hex,
+          project_id=project_id,
+          parent_id=parent.id,
+          level=level,
+          title="信息待选择" if is_tip else q[:5],
+          question="信息待选择" if is_tip else q,
+          status="tip" if is_tip else ("green" if rng.random() < shape.answered else "red"),
+          order_index=i + 1,
+          node_type="tip" if is_tip else "question",
+        )
+        nodes.append(node)
+        nxt.append(node)
+    frontier = nxt
+  fill_aggregates(nodes)
+  fill_dfs_keys(nodes)
+  return nodes
+
+
+def insert_project(session: Session, shape: TreeShape, seed: int = 0, with_answers: bool = True) -> Tuple[Project, List[Node]]:
+  """造一个项目写进库（连同检索文档）；已答节点各配一条回答（merge 要用）。"""
+  project = Project(id=uuid4().hex, name=f"合成项目 {seed}", idea_text="一个给大学生用的二手教材交易小程序，支持扫码")
+  session.add(project)
+  session.flush()
+  nodes = build_tree(project.id, shape, seed=seed)
+  session.add_all(nodes)
+  session.flush()
+  search.index_project(session, project)
+  search.index_nodes(session, nodes)
+  if with_answers:
+    by_id = {n.id: n for n in nodes}
+    answers = [NodeAnswer(node_id=n.id, content=_ANSWER) for n in nodes if n.level > 0 and n.status == "green"]
+    session.add_all(answers)
+    session.flush()
+    search.index_answers(session, [(by_id[a.node_id], a) for a in answers])
+  session.commit()
+  return project, nodes
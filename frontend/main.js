@@ -20,6 +20,10 @@ const state = {
   tipsCandidates: {}, // nodeId -> string[] Tips 候选
   tipsLoading: {}, // nodeId -> true 表示正在加载 Tips 候选
   contextMenu: { visible: false, nodeId: null },
+  projectSocket: null, // 当前项目的 WebSocket 推送连接
+  revision: 0, // 已经同步到的项目 revision，断线重连时从这里补增量
+  socketRetry: 0, // 连续重连失败次数，算退避时长
+  socketTimer: null, // 等待中的重连定时器
 };
 
 // DOM
@@ -183,6 +187,30 @@ async function apiJson(path, options = {}) {
   return res.json();
 }
 
+// 项目详情走紧凑格式（节点按列存，省流量），拿到后还原成节点对象数组；
+// status / node_type 的码表用响应里的 enums，和后端同一份，不在前端写死
+function expandNodes(data, projectId) {
+  if (Array.isArray(data)) return data;
+  const ids = data.id;
+  return ids.map((id, i) => ({
+    id,
+    project_id: projectId,
+    parent_id: data.parent[i] >= 0 ? ids[data.parent[i]] : null,
+    level: data.level[i],
+    title: data.title[i],
+    question: data.question[i],
+    status: data.enums.status[data.status[i]],
+    order_index: data.order_index[i],
+    node_type: data.enums.node_type[data.node_type[i]],
+  }));
+}
+
+async function fetchProject(projectId) {
+  const project = await apiJson(`/api/projects/${projectId}?format=compact`);
+  project.nodes = expandNodes(project.nodes, project.id);
+  return project;
+}
+
 function readFileAsBase64(file) {
   return new Promise((resolve, reject) => {
     const reader = new FileReader();
@@ -282,11 +310,9 @@ async function startAction(overriddenContent, fileDisplayName) {
         method: "POST",
         body: JSON.stringify({ draft_id: state.draftId }),
       });
-      state.projectId = project.id;
-      state.nodes = project.nodes;
       state.draftId = null;
-      updateProgress(project.progress);
       await switchView();
+      openProject(project);
       buildMap();
       state.nodes.filter((n) => n.level > 0).forEach((n) => ensureNodeTitle(n));
       showToast("进入 AI 引导工作台", "blue");
@@ -319,6 +345,81 @@ function updateProgress(progress) {
   }
 }
 
+/** 订阅项目 WebSocket：后台命名、自动变绿等改动直接推过来，不用等下一次重拉 */
+function subscribeProjectUpdates(projectId, since) {
+  clearTimeout(state.socketTimer);
+  state.socketTimer = null;
+  if (state.projectSocket) {
+    const old = state.projectSocket;
+    state.projectSocket = null; // 先摘掉，old 的 onclose 就不会再去重连
+    old.close();
+  }
+  if (!projectId) return;
+  state.revision = since;
+  const wsBase = API_BASE.replace(/^http/, "ws");
+  const ws = new WebSocket(`${wsBase}/api/projects/${projectId}/ws?since=${since}`);
+  state.projectSocket = ws;
+  ws.onopen = () => {
+    state.socketRetry = 0;
+  };
+  ws.onmessage = async (e) => {
+    if (state.projectId !== projectId) return;
+    let msg;
+    try {
+      msg = JSON.parse(e.data);
+    } catch (_) {
+      return;
+    }
+    if (msg.type === "reset" || msg.reset) {
+      const project = await fetchProject(projectId);
+      if (state.projectId !== projectId) return;
+      state.nodes = project.nodes;
+      state.revision = project.revision || 0;
+      updateProgress(project.progress);
+      buildMap();
+      return;
+    }
+    if (msg.type !== "changes") return;
+    if (typeof msg.revision === "number") state.revision = Math.max(state.revision, msg.revision);
+    // 自己刚操作完的改动通常已经在重拉里拿到了，真有差异再重绘
+    let dirty = false;
+    const byId = {};
+    state.nodes.forEach((n, i) => (byId[n.id] = i));
+    msg.changes.forEach(({ node }) => {
+      const i = byId[node.id];
+      if (i === undefined) {
+        state.nodes = state.nodes.concat(node);
+        dirty = true;
+      } else if (JSON.stringify(state.nodes[i]) !== JSON.stringify({ ...state.nodes[i], ...node })) {
+        state.nodes[i] = { ...state.nodes[i], ...node };
+        dirty = true;
+      }
+    });
+    updateProgress(msg.progress);
+    if (dirty) buildMap();
+  };
+  ws.onclose = (e) => {
+    if (state.projectSocket !== ws) return; // 主动关的（换了项目 / 重新订阅）
+    state.projectSocket = null;
+    if (e.code === 4404 || state.projectId !== projectId) return; // 项目没了
+    // 断线重连：1s、2s、4s……封顶 30s，带点抖动，从断开前同步到的 revision 补增量
+    const delay = Math.min(30000, 1000 * 2 ** state.socketRetry) * (0.8 + Math.random() * 0.4);
+    state.socketRetry += 1;
+    state.socketTimer = setTimeout(() => {
+      if (state.projectId === projectId && !state.projectSocket) subscribeProjectUpdates(projectId, state.revision);
+    }, delay);
+  };
+}
+
+/** 进入某个项目的工作台：换当前项目并重新订阅它的推送 */
+function openProject(project) {
+  state.projectId = project.id;
+  state.nodes = project.nodes;
+  state.socketRetry = 0;
+  updateProgress(project.progress);
+  subscribeProjectUpdates(project.id, project.revision || 0);
+}
+
 async function switchView() {
   chatView.classList.add("opacity-0", "pointer-events-none");
   return new Promise((resolve) => {
@@ -562,7 +663,7 @@ async function triggerSpawnFromNode(nodeId) {
 
     // 刷新项目，获取完整节点树
     try {
-      const project = await apiJson(`/api/projects/${state.projectId}`);
+      const project = await fetchProject(state.projectId);
       state.nodes = project.nodes;
     } catch (_) {
       state.nodes = state.nodes.concat(newNode);
@@ -593,7 +694,7 @@ async function triggerTipsFromNode(nodeId) {
 
     // 刷新项目，获取完整节点树
     try {
-      const project = await apiJson(`/api/projects/${state.projectId}`);
+      const project = await fetchProject(state.projectId);
       state.nodes = project.nodes;
     } catch (_) {
       state.nodes = state.nodes.concat(newNode);
@@ -716,7 +817,7 @@ async function chooseTip(nodeId, content) {
 
     // 优先从后端刷新整棵树，确保新 Tips 节点或内容立刻可见
     try {
-      const project = await apiJson(`/api/projects/${state.projectId}`);
+      const project = await fetchProject(state.projectId);
       state.nodes = project.nodes || state.nodes;
     } catch (_) {
       // 退路：仅在本地更新该节点
@@ -882,7 +983,7 @@ async function applyTipAsAnswer(nodeId, content) {
     }
 
     try {
-      const project = await apiJson(`/api/projects/${state.projectId}`);
+      const project = await fetchProject(state.projectId);
       state.nodes = project.nodes || state.nodes;
     } catch (_) {
       // 退路：仅更新当前节点
@@ -1155,7 +1256,7 @@ async function submitAnswer() {
 
     updateProgress(res.projectProgress);
     try {
-      const project = await apiJson(`/api/projects/${state.projectId}`);
+      const project = await fetchProject(state.projectId);
       state.nodes = project.nodes;
     } catch (_) {
       const updated = res.updatedNode;
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+
+import pytest
+
+from backend import ai_client
+from backend.ai_client import AIClient, CircuitBreaker, ConcurrencyLimiter, ResponseCache
+from backend.shared_state import MemoryState, SQLiteState
+
+MESSAGES = [{"role": "user", "content": "起一个简短的标题"}]
+
+
+class FakeProvider:
+  name = "fake"
+
+  def __init__(self) -> None:
+    self.calls = 0
+
+  async def complete(self, model, messages, timeout):
+    self.calls += 1
+    return {"choices": [{"message": {"content": "标题"}}]}
+
+
+@pytest.fixture
+def client(monkeypatch):
+  monkeypatch.setattr(ai_client, "breaker", CircuitBreaker(error_rate=0.5, min_calls=1, window=60, cooldown=0))
+  monkeypatch.setattr(ai_client, "response_cache", ResponseCache(600, 100, store=MemoryState()))
+  monkeypatch.setattr(ai_client, "llm_limiter", ConcurrencyLimiter(0, store=MemoryState()))
+  c = AIClient()
+  c.provider = FakeProvider()
+  c.has_real_api = True
+  return c
+
+
+def _call(c: AIClient) -> str:
+  return asyncio.run(c._run("test", lambda: c._call_llm(MESSAGES), lambda: "stub"))
+
+
+def test_probe_skips_response_cache_and_closes_breaker(client):
+  ai_client.response_cache.put(ai_client.ResponseCache.key(client.model, MESSAGES), "缓存里的")
+  ai_client.breaker.record(False)
+  assert ai_client.breaker.state == "open"
+
+  assert _call(client) == "标题"
+  assert client.provider.calls == 1
+  assert ai_client.breaker.state == "closed"
+
+
+def test_probe_released_when_call_never_reaches_provider(client):
+  ai_client.breaker.record(False)
+
+  async def no_llm():
+    raise ai_client.BadOutput("parse")
+
+  asyncio.run(client._run("test", no_llm, lambda: "stub"))
+  # 探测名额放掉了，没卡在 half_open；下一个请求接着探并关上熔断
+  assert ai_client.breaker.state == "open"
+  assert _call(client) == "标题"
+  assert ai_client.breaker.state == "closed"
+
+
+def test_probe_released_when_concurrency_slot_rejected(client, monkeypatch):
+  store = MemoryState()
+  monkeypatch.setattr(ai_client, "llm_limiter", ConcurrencyLimiter(1, store=store))
+  client.timeout = 0.05
+  ai_client.breaker.record(False)
+  held = store.try_acquire("llm", 1, lease=60)
+
+  assert _call(client) == "stub"
+  assert client.calls[-1].error == "ConcurrencyLimited"
+  assert client.provider.calls == 0
+  assert ai_client.breaker.state == "open"
+
+  store.release("llm", held)
+  assert _call(client) == "标题"
+  assert ai_client.breaker.state == "closed"
+
+
+def test_locked_shared_state_does_not_block_event_loop(client, monkeypatch):
+  path = os.path.join(tempfile.mkdtemp(), "state.db")
+  store = SQLiteState(path)
+  monkeypatch.setattr(ai_client, "llm_limiter", ConcurrencyLimiter(2, store=store))
+  monkeypatch.setattr(ai_client, "response_cache", ResponseCache(600, 100, store=store))
+  # 别的 worker 拿着写锁 0.3 秒
+  other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+  other.execute("BEGIN IMMEDIATE")
+  threading.Timer(0.3, other.commit).start()
+
+  async def main() -> tuple:
+    ticks = 0
+
+    async def ticker() -> None:
+      nonlocal ticks
+      while True:
+        await asyncio.sleep(0.01)
+        ticks += 1
+
+    beat = asyncio.create_task(ticker())
+    value = await client._run("test", lambda: client._call_llm(MESSAGES), lambda: "stub")
+    beat.cancel()
+    return value, ticks
+
+  value, ticks = asyncio.run(main())
+  assert value == "标题"
+  # 等锁的那 0.3 秒里事件循环照常在转
+  assert ticks >= 10
+  assert ai_client.response_cache.get(ai_client.ResponseCache.key(client.model, MESSAGES)) == "标题"
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+from sqlmodel import Session
+
+from backend import ai_client, llm_sim, main, services
+from backend import autopilot as autopilot_module
+from backend.ai_client import CircuitBreaker, ConcurrencyLimiter, ResponseCache
+from backend.autopilot import Autopilot
+from backend.db import engine
+from backend.shared_state import MemoryState
+
+
+def _project_id(idea: str) -> str:
+  with Session(engine) as session:
+    return asyncio.run(services.create_project_from_idea(session, idea, [])).id
+
+
+def test_finished_jobs_are_evicted_and_plan_loads_off_loop(monkeypatch):
+  projects = [_project_id(f"自动作答测试{i}") for i in range(3)]
+  threads = []
+  load_plan = autopilot_module._load_plan
+
+  def spy(project_id, limit):
+    threads.append(threading.current_thread())
+    return load_plan(project_id, limit)
+
+  monkeypatch.setattr(autopilot_module, "_load_plan", spy)
+  pilot = Autopilot(flush_interval=0.01, keep_max=1)
+
+  async def main() -> list:
+    jobs = []
+    for project_id in projects:
+      job = await pilot.start(project_id)
+      await job.task
+      jobs.append(job)
+    return jobs
+
+  jobs = asyncio.run(main())
+  assert all(j.status == "done" and j.saved == j.total > 0 for j in jobs)
+  assert threading.main_thread() not in threads
+  assert [pilot.get(p) for p in projects] == [None, None, jobs[-1]]
+
+
+def test_shutdown_waits_for_cancelled_jobs_before_closing_pool(monkeypatch):
+  project_id = _project_id("关停收尾测试")
+  # 模型慢一点、写库间隔拉长：取消时手里一定有答好还没存的
+  monkeypatch.setenv("AI_PROVIDER", "sim")
+  monkeypatch.setattr(llm_sim, "_provider", llm_sim.SimProvider(latency="fixed:0.02", token_rate=0))
+  monkeypatch.setattr(ai_client, "breaker", CircuitBreaker(error_rate=0.5, min_calls=100, window=60, cooldown=0))
+  monkeypatch.setattr(ai_client, "response_cache", ResponseCache(0, 0, store=MemoryState()))
+  monkeypatch.setattr(ai_client, "llm_limiter", ConcurrencyLimiter(0, store=MemoryState()))
+  pilot = Autopilot(concurrency=1, batch_size=1000, flush_interval=60)
+  monkeypatch.setattr(main, "autopilot", pilot)
+  seen = []
+  close_http_pool = main.close_http_pool
+
+  async def spy_close() -> None:
+    job = pilot.get(project_id)
+    seen.append((job.status, job.task.done(), job.saved))
+    await close_http_pool()
+
+  monkeypatch.setattr(main, "close_http_pool", spy_close)
+
+  async def run() -> None:
+    async with main.lifespan(main.app):
+      job = await pilot.start(project_id)
+      while job.generated < 2:
+        await asyncio.sleep(0.01)
+
+  asyncio.run(run())
+  job = pilot.get(project_id)
+  # 关连接池时任务已经收完尾：状态是 cancelled，答好的也存下了
+  assert seen == [("cancelled", True, job.saved)]
+  assert 2 <= job.saved < job.total
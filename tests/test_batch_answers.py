@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+from sqlmodel import Session, func, select
+
+from backend.db import engine
+from backend.main import app
+from backend.models import Node, NodeAnswer
+from backend.services import MAX_BATCH_ANSWERS
+
+
+def _answer_count(project_id: str) -> int:
+  with Session(engine) as session:
+    return session.exec(
+      select(func.count()).select_from(NodeAnswer).join(Node, Node.id == NodeAnswer.node_id).where(Node.project_id == project_id)
+    ).one()
+
+
+def test_batch_answers_one_revision_all_or_nothing_and_size_limit():
+  async def main() -> None:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+      project = (await c.post("/api/projects/init", json={"ideaText": "批量回答测试", "dialog": []})).json()
+      other = (await c.post("/api/projects/init", json={"ideaText": "另一个项目", "dialog": []})).json()
+      url = f"/api/projects/{project['id']}"
+      red = [n["id"] for n in project["nodes"] if n["status"] == "red" and n["level"] == 2]
+      assert len(red) > 2
+
+      async def state() -> tuple:
+        detail = (await c.get(url)).json()
+        return detail["revision"], {n["id"]: n["status"] for n in detail["nodes"]}, _answer_count(project["id"])
+
+      revision, statuses, answers = await state()
+
+      # 有一个节点不存在（或属于别的项目）：整批 404，一条都不写，revision 不动
+      foreign = next(n["id"] for n in other["nodes"] if n["level"] == 2)
+      for bad in ("no-such-node", foreign):
+        r = await c.post(f"{url}/answers", json={"answers": [{"node_id": red[0], "content": "答"}, {"node_id": bad, "content": "答"}]})
+        assert r.status_code == 404 and r.json()["detail"] == "node_not_found"
+        assert await state() == (revision, statuses, answers)
+
+      # 超过上限、空批：400，同样不写
+      too_many = [{"node_id": red[0], "content": str(i)} for i in range(MAX_BATCH_ANSWERS + 1)]
+      r = await c.post(f"{url}/answers", json={"answers": too_many})
+      assert r.status_code == 400 and r.json()["detail"] == "batch_too_large"
+      r = await c.post(f"{url}/answers", json={"answers": []})
+      assert r.status_code == 400 and r.json()["detail"] == "empty_batch"
+      assert await state() == (revision, statuses, answers)
+
+      # 正常一批：revision 只加一次，每条都落库
+      batch = [{"node_id": i, "content": f"回答 {i}"} for i in red[:3]] + [{"node_id": red[0], "content": "再补一句"}]
+      r = await c.post(f"{url}/answers", json={"answers": batch})
+      assert r.status_code == 200
+      assert r.json()["since"] == revision and r.json()["revision"] == revision + 1
+      new_revision, new_statuses, new_answers = await state()
+      assert new_revision == revision + 1
+      assert new_answers == answers + len(batch)
+      assert all(new_statuses[i] != "red" for i in red[:3])
+      # 增量从批次前的 revision 拉，拿到的就是这一批
+      changes = (await c.get(f"{url}/changes", params={"since": revision})).json()
+      assert changes["revision"] == revision + 1
+      assert set(red[:3]) <= {d["node"]["id"] for d in changes["changes"]}
+
+  asyncio.run(main())
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import asyncio
+
+from sqlmodel import Session, func, select
+
+from backend import services
+from backend.db import engine
+from backend.models import Node, NodeChange, Project
+
+
+def test_change_log_is_trimmed_and_old_since_resets(monkeypatch):
+  monkeypatch.setattr(services, "CHANGE_LOG_KEEP", 30)
+  monkeypatch.setattr(services, "_CHANGE_TRIM_EVERY", 10)
+  with Session(engine, expire_on_commit=False) as session:
+    project = asyncio.run(services.create_project_from_idea(session, "保留期测试", []))
+    node = session.exec(select(Node).where(Node.project_id == project.id, Node.level == 1)).first()
+  for i in range(100):
+    with Session(engine) as session:
+      p, n = session.get(Project, project.id), session.get(Node, node.id)
+      n.title = f"标题{i}"
+      session.add(n)
+      services.bump_revision(session, p)
+      services.record_change(session, p, n, "updated")
+      session.commit()
+
+  with Session(engine) as session:
+    oldest = session.exec(select(func.min(NodeChange.revision)).where(NodeChange.project_id == project.id)).one()
+    assert oldest > 100 - 30 - 10
+    _, reset, changes = services.get_project_changes(session, project.id, 100 - 30)
+    assert not reset and [n.title for _, n in changes] == ["标题99"]
+    _, reset, changes = services.get_project_changes(session, project.id, 100 - 31)
+    assert reset and changes == []
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from backend.models import NODE_STATUSES, Node
+from backend.services import compact_nodes
+
+
+def _expand(data: dict) -> list:
+  """同 frontend/main.js 的 expandNodes。"""
+  return [
+    {
+      "id": node_id,
+      "parent_id": data["id"][data["parent"][i]] if data["parent"][i] >= 0 else None,
+      "status": data["enums"]["status"][data["status"][i]],
+      "node_type": data["enums"]["node_type"][data["node_type"][i]],
+    }
+    for i, node_id in enumerate(data["id"])
+  ]
+
+
+def test_compact_enums_cover_every_status_and_round_trip():
+  nodes = [Node(id="r", project_id="p", level=0, title="根", question="", status="red")]
+  for i, status in enumerate(NODE_STATUSES):
+    nodes.append(Node(id=f"n{i}", project_id="p", parent_id="r", level=1, title="t", question="q", status=status))
+  nodes.append(Node(id="tip", project_id="p", parent_id="n0", level=2, title="t", question="q", status="ai", node_type="tip"))
+  data = compact_nodes(nodes)
+
+  assert data["enums"]["status"] == list(NODE_STATUSES)  # 已知取值不再临时追加，下标固定
+  assert [n["status"] for n in _expand(data)] == [n.status for n in nodes]
+  assert [n["node_type"] for n in _expand(data)] == [n.node_type for n in nodes]
+  assert _expand(data)[-1]["parent_id"] == "n0"
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlmodel import Session, select
+
+from backend import db, search, services
+from backend.models import Node
+
+
+@contextmanager
+def _statements(engine):
+  seen: list = []
+
+  def listener(conn, cursor, statement, parameters, context, executemany):
+    seen.append(statement)
+
+  event.listen(engine, "before_cursor_execute", listener)
+  try:
+    yield seen
+  finally:
+    event.remove(engine, "before_cursor_execute", listener)
+
+
+def test_unchanged_fingerprint_skips_all_ddl():
+  db.init_db()
+  with _statements(db.engine) as seen:
+    assert db.init_db() is False
+  assert len(seen) == 1 and seen[0].lstrip().upper().startswith("SELECT")
+
+
+def test_changed_fingerprint_migrates_once(monkeypatch):
+  monkeypatch.setattr(search, "INDEX_VERSION", search.INDEX_VERSION + 1)
+  with _statements(db.engine) as seen:
+    assert db.init_db() is True
+  assert any("search_index" in s for s in seen)
+  assert db.init_db() is False
+
+
+def test_old_database_gets_new_column_and_backfill(monkeypatch):
+  old = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'old.db')}")
+  monkeypatch.setattr(db, "engine", old)
+  db.init_db()
+  with Session(old) as session:
+    project = asyncio.run(services.create_project_from_idea(session, "老库迁移", []))
+    project_id = project.id
+  # 退回到还没有 dfs_key 列的样子
+  with old.begin() as conn:
+    conn.execute(text("DROP INDEX ix_node_project_status_dfs"))
+    conn.execute(text("ALTER TABLE node DROP COLUMN dfs_key"))
+    conn.execute(text("UPDATE schema_version SET fingerprint = 'stale'"))
+
+  assert db.init_db() is True
+  assert "dfs_key" in {c["name"] for c in inspect(old).get_columns("node")}
+  assert "ix_node_project_status_dfs" in {i["name"] for i in inspect(old).get_indexes("node")}
+  with Session(old) as session:
+    nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
+  assert nodes and all(n.dfs_key for n in nodes)
+  assert db.init_db() is False
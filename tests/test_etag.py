@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from backend.main import app
+
+
+def test_project_detail_etag_and_304():
+  async def main() -> None:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+      project = (await c.post("/api/projects/init", json={"ideaText": "ETag 测试项目", "dialog": []})).json()
+      url = f"/api/projects/{project['id']}"
+
+      plain = await c.get(url, headers={"Accept-Encoding": "identity"})
+      etag = plain.headers["etag"]
+      assert plain.status_code == 200 and not etag.startswith("W/")
+
+      # 压缩后变成弱 ETag，原样带回来也认
+      gz = await c.get(url, headers={"Accept-Encoding": "gzip"})
+      assert gz.headers.get("content-encoding") == "gzip"
+      assert gz.headers["etag"] == "W/" + etag
+      for tag in (etag, gz.headers["etag"], f'"other", {gz.headers["etag"]}'):
+        r = await c.get(url, headers={"If-None-Match": tag})
+        assert r.status_code == 304 and r.content == b""
+
+      # 回答一题 revision 变了：同一个 tag 拿到 200 和新内容
+      node = next(n for n in project["nodes"] if n["level"] == 2)
+      assert (await c.post(f"{url}/nodes/{node['id']}/answer", json={"content": "新的回答"})).status_code == 200
+      r = await c.get(url, headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+      assert r.status_code == 200
+      assert r.headers["etag"] != etag
+      assert r.json()["revision"] > plain.json()["revision"]
+      assert next(n for n in r.json()["nodes"] if n["id"] == node["id"])["status"] != "red"
+
+  asyncio.run(main())
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import fnmatch
+from typing import List
+
+from backend import events
+from backend.events import RESET_MESSAGE, Broker, RedisBackend
+
+
+class FakeRedis:
+  """redis.asyncio 客户端的替身：只有 RedisBackend 用到的 publish / pubsub，多个「worker」共用一个实例。"""
+
+  def __init__(self) -> None:
+    self.pubsubs: List["FakePubSub"] = []
+
+  async def publish(self, channel: str, message: str) -> int:
+    n = 0
+    for ps in list(self.pubsubs):
+      for pattern in ps.patterns:
+        if fnmatch.fnmatchcase(channel, pattern):
+          ps.queue.put_nowait({"type": "pmessage", "pattern": pattern, "channel": channel, "data": message})
+          n += 1
+    return n
+
+  def pubsub(self) -> "FakePubSub":
+    return FakePubSub(self)
+
+
+class FakePubSub:
+  def __init__(self, server: FakeRedis) -> None:
+    self.server = server
+    self.patterns: List[str] = []
+    self.queue: asyncio.Queue = asyncio.Queue()
+
+  async def psubscribe(self, *patterns: str) -> None:
+    self.patterns.extend(patterns)
+    self.server.pubsubs.append(self)
+    for p in patterns:
+      self.queue.put_nowait({"type": "psubscribe", "pattern": None, "channel": p, "data": 1})
+
+  async def punsubscribe(self) -> None:
+    self.patterns.clear()
+
+  async def close(self) -> None:
+    if self in self.server.pubsubs:
+      self.server.pubsubs.remove(self)
+
+  def drop(self) -> None:
+    """模拟连接断开：listen 抛 ConnectionError。"""
+    self.queue.put_nowait(ConnectionError("connection reset"))
+
+  async def listen(self):
+    while True:
+      item = await self.queue.get()
+      if isinstance(item, Exception):
+        raise item
+      yield item
+
+
+def test_redis_backend_fans_out_across_workers():
+  async def main() -> None:
+    server = FakeRedis()
+    worker_a, worker_b = Broker(RedisBackend(server)), Broker(RedisBackend(server))
+    await worker_a.start()
+    await worker_b.start()
+    try:
+      assert worker_a.wants("p1")  # 别的 worker 可能有订阅者
+      async with worker_b.subscribe("p1") as q1, worker_b.subscribe("p2") as q2:
+        await worker_a.publish("p1", '{"type":"changes"}')
+        assert await asyncio.wait_for(q1.get(), 1) == '{"type":"changes"}'
+        await asyncio.sleep(0)
+        assert q2.empty()
+    finally:
+      await worker_a.stop()
+      await worker_b.stop()
+    assert server.pubsubs == []
+
+  asyncio.run(main())
+
+
+def test_slow_subscriber_gets_reset():
+  async def main() -> None:
+    broker = Broker()
+    await broker.start()
+    async with broker.subscribe("p") as q:
+      for i in range(q.maxsize + 1):
+        await broker.publish("p", str(i))
+      assert q.qsize() == 1 and q.get_nowait() == RESET_MESSAGE
+    await broker.stop()
+
+  asyncio.run(main())
+
+
+def test_redis_forwarder_resubscribes_after_disconnect(monkeypatch):
+  monkeypatch.setattr(events, "_RETRY_MIN", 0.01)
+
+  async def main() -> None:
+    server = FakeRedis()
+    sender, receiver = Broker(RedisBackend(server)), Broker(RedisBackend(server))
+    await sender.start()
+    await receiver.start()
+    try:
+      async with receiver.subscribe("p1") as q:
+        dropped = receiver.backend._pubsub
+        dropped.drop()
+        # 重新订阅后先收到 reset（断开期间可能丢了消息），之后照常转发
+        assert await asyncio.wait_for(q.get(), 1) == RESET_MESSAGE
+        assert receiver.backend._pubsub is not dropped and dropped not in server.pubsubs
+        await sender.publish("p1", '{"type":"changes"}')
+        assert await asyncio.wait_for(q.get(), 1) == '{"type":"changes"}'
+        assert not receiver.backend._task.done()
+    finally:
+      await sender.stop()
+      await receiver.stop()
+    assert server.pubsubs == []
+
+  asyncio.run(main())
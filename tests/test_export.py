@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+
+from sqlmodel import Session
+
+from backend import export
+from backend.db import engine
+from benchmarks.synth import TreeShape, insert_project
+
+
+def _project(fanout: int = 3, depth: int = 4):
+  with Session(engine, expire_on_commit=False) as session:
+    project, nodes = insert_project(session, TreeShape(fanout=fanout, depth=depth, answered=0.6), seed=1)
+  return project, nodes
+
+
+def test_ndjson_keeps_preorder_across_batches(monkeypatch):
+  project, nodes = _project()
+  monkeypatch.setattr(export, "_BATCH", 7)
+  lines = [json.loads(line) for chunk in export.stream_project(project.id, "ndjson") for line in chunk.splitlines()]
+  exported = [line["id"] for line in lines if line["type"] == "node"]
+  assert exported == [n.id for n in sorted(nodes, key=lambda n: (n.dfs_key, n.id))]
+  answered = {n.id for n in nodes if n.status == "green"}
+  assert all(line["answers"] for line in lines if line.get("id") in answered)
+
+
+def test_slow_reader_does_not_block_writers(monkeypatch):
+  project, _ = _project(fanout=4, depth=5)
+  monkeypatch.setattr(export, "_CHUNK", 1)
+  stream = export.stream_project(project.id, "md")
+  for _ in range(10):  # 客户端收了几块就停住，停在节点中间
+    next(stream)
+
+  conn = sqlite3.connect(engine.url.database, timeout=0.2)
+  try:
+    conn.execute("UPDATE project SET name = ? WHERE id = ?", ("改名", project.id))
+    conn.commit()
+  finally:
+    conn.close()
+  assert b"".join(stream)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import threading
+
+from sqlmodel import Session, select
+
+from backend import services
+from backend.db import engine
+from backend.idea_templates import IdeaTemplates
+from backend.models import Node, Project
+
+
+def _project():
+  with Session(engine, expire_on_commit=False) as session:
+    project = asyncio.run(services.create_project_from_idea(session, "校园二手书交易平台", []))
+    nodes = session.exec(select(Node).where(Node.project_id == project.id).order_by(Node.order_index)).all()
+  return project, nodes
+
+
+def _rename(project_id: str, node: Node, title: str) -> None:
+  """同前端打开项目时 POST /title：换标题、revision +1。"""
+  with Session(engine) as session:
+    project = session.get(Project, project_id)
+    n = session.get(Node, node.id)
+    n.title = title
+    session.add(n)
+    services.bump_revision(session, project)
+    services.record_change(session, project, n, "updated")
+    session.commit()
+
+
+def test_refine_skips_only_touched_nodes():
+  project, nodes = _project()
+  fresh, retitled, answered = nodes[1], nodes[2], nodes[3]
+  _rename(project.id, retitled, "短标题")
+  with Session(engine) as session:
+    asyncio.run(services.answer_nodes_batch(session, project.id, [(answered.id, "我的回答", False)]))
+
+  updates = [(n.id, n.question, f"新{i}", f"精修后的问题{i}") for i, n in enumerate([fresh, retitled, answered])]
+  assert services._refine_nodes(project.id, updates) is not None
+
+  with Session(engine) as session:
+    got = {n.id: n.question for n in session.exec(select(Node).where(Node.project_id == project.id)).all()}
+  assert got[fresh.id] == "精修后的问题0"
+  assert got[retitled.id] == "精修后的问题1"  # 只换过标题不算动过
+  assert got[answered.id] == answered.question
+  # 再来一次：问题已经不是模板原样了，不再覆盖
+  assert services._refine_nodes(project.id, updates) is None
+
+
+class _SpyTemplates(IdeaTemplates):
+  def __init__(self, *args, **kwargs) -> None:
+    super().__init__(*args, **kwargs)
+    self.threads: list = []
+
+  def nearest(self, kind, text):
+    self.threads.append(threading.current_thread())
+    return super().nearest(kind, text)
+
+
+def test_template_lookup_runs_off_event_loop(monkeypatch):
+  path = os.path.join(tempfile.mkdtemp(), "templates.npz")
+  IdeaTemplates(path).add("mindmap", "给宠物主人用的上门喂养预约平台", [{"level": 0, "title": "上门喂养", "question": "做什么？", "parent_index": None}])
+  # 换一个实例，索引要从磁盘读（别的 worker 写的）
+  templates = _SpyTemplates(path, refine=False)
+  monkeypatch.setattr(services, "idea_templates", templates)
+  with Session(engine) as session:
+    project = asyncio.run(services.create_project_from_idea(session, "给宠物主人用的上门喂养预约平台", []))
+    questions = [n.question for n in session.exec(select(Node).where(Node.project_id == project.id)).all()]
+  # 套的是模板（stub 会建一整棵树）
+  assert questions == ["做什么？"]
+  assert templates.threads and threading.main_thread() not in templates.threads
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from backend import ai_client, llm_sim
+from backend.ai_client import AIClient, CircuitBreaker, ConcurrencyLimiter, ResponseCache
+from backend.llm_sim import SimProvider, prompt_key
+from backend.shared_state import MemoryState
+
+MESSAGES = [{"role": "user", "content": "请生成 2～3 个供工作台使用的关键疑问"}]
+OTHER = [{"role": "user", "content": "请列出 Tips"}]
+
+
+def _content(data: dict) -> str:
+  return data["choices"][0]["message"]["content"]
+
+
+def _complete(provider: SimProvider, messages, timeout: float = 5.0) -> str:
+  return _content(asyncio.run(provider.complete("m", messages, timeout)))
+
+
+def test_same_seed_same_reply_per_prompt_regardless_of_order():
+  a = SimProvider(latency="fixed:0", token_rate=0, seed=7)
+  b = SimProvider(latency="fixed:0", token_rate=0, seed=7)
+  first = [_complete(a, MESSAGES), _complete(a, OTHER), _complete(a, MESSAGES)]
+  # 别的 prompt 插在前面也不影响这条 prompt 抽到什么
+  second = [_complete(b, OTHER), _complete(b, MESSAGES), _complete(b, MESSAGES)]
+  assert [first[0], first[2], first[1]] == [second[1], second[2], second[0]]
+  seeds = {_complete(SimProvider(latency="fixed:0", token_rate=0, seed=s), MESSAGES) for s in range(8)}
+  assert len(seeds) > 1
+
+
+def test_replay_looks_up_by_prompt_key(tmp_path):
+  path = tmp_path / "rec.jsonl"
+  entries = [
+    {"key": prompt_key(MESSAGES), "response": "录下来的第一条", "latency": 0.0},
+    {"messages": MESSAGES, "response": "录下来的第二条", "latency": 0.0},
+  ]
+  path.write_text("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries), encoding="utf-8")
+  sim = SimProvider(latency="fixed:0", token_rate=0, replay_path=str(path))
+  assert [_complete(sim, MESSAGES) for _ in range(3)] == ["录下来的第一条", "录下来的第二条", "录下来的第一条"]
+  # 没录到的 prompt 现编
+  assert _complete(sim, OTHER) not in ("录下来的第一条", "录下来的第二条")
+
+
+def test_stream_paces_chunks_by_token_rate():
+  sim = SimProvider(latency="fixed:0", token_rate=200, seed=1)
+  expected = _complete(SimProvider(latency="fixed:0", token_rate=0, seed=1), MESSAGES)
+
+  async def collect() -> list:
+    return [chunk async for chunk in sim.stream("m", MESSAGES, 5.0)]
+
+  start = time.perf_counter()
+  chunks = asyncio.run(collect())
+  elapsed = time.perf_counter() - start
+  assert len(chunks) > 1 and "".join(chunks) == expected
+  assert elapsed >= llm_sim.estimate_tokens(expected) / 200 * 0.8
+
+
+@pytest.mark.parametrize("kind, error", [("timeout", httpx.ReadTimeout), ("500", httpx.HTTPStatusError)])
+def test_stream_injects_failures_before_first_chunk(kind, error):
+  sim = SimProvider(latency="fixed:0", token_rate=0, failures=f"{kind}:1")
+
+  async def collect() -> list:
+    return [chunk async for chunk in sim.stream("m", MESSAGES, 0.01)]
+
+  with pytest.raises(error):
+    asyncio.run(collect())
+
+
+@pytest.fixture
+def sim_client(monkeypatch):
+  monkeypatch.setenv("AI_PROVIDER", "sim")
+  monkeypatch.setattr(ai_client, "breaker", CircuitBreaker(error_rate=0.5, min_calls=100, window=60, cooldown=0))
+  monkeypatch.setattr(ai_client, "response_cache", ResponseCache(600, 100, store=MemoryState()))
+  monkeypatch.setattr(ai_client, "llm_limiter", ConcurrencyLimiter(0, store=MemoryState()))
+
+  def make(failures: str) -> AIClient:
+    monkeypatch.setattr(llm_sim, "_provider", SimProvider(latency="fixed:0", token_rate=0, failures=failures))
+    c = AIClient()
+    c.timeout = 0.01
+    return c
+
+  return make
+
+
+@pytest.mark.parametrize(
+  "failures, error",
+  [("", None), ("timeout:1", "ReadTimeout"), ("429:1", "HTTPStatusError"), ("500:1", "HTTPStatusError"), ("garbage:1", "JSONDecodeError")],
+)
+def test_failure_kinds_surface_through_ai_client(sim_client, failures, error):
+  c = sim_client(failures)
+  questions = asyncio.run(c.generate_initial_mindmap_questions("校园二手教材交易", "二手教材"))
+  (call,) = c.calls
+  assert call.method == "generate_initial_mindmap_questions"
+  assert call.error == error
+  assert call.source == ("llm" if error is None else "stub")
+  assert call.degraded == (error is not None)
+  stub = c._initial_mindmap_questions_stub("", "")
+  assert (questions == stub) == (error is not None)
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from sqlmodel import Session, select
+
+from backend import ai_client, llm_sim, services
+from backend.ai_client import AIClient, CircuitBreaker, ConcurrencyLimiter, ResponseCache
+from backend.db import engine
+from backend.models import MergedSection, Node
+from backend.shared_state import MemoryState
+
+
+@pytest.fixture
+def merged_headings(monkeypatch):
+  """备好模拟器（stub 的章节不落库），记下每次 merge_section 合的是哪一章。"""
+  monkeypatch.setattr(llm_sim, "_provider", llm_sim.SimProvider(latency="fixed:0", token_rate=0))
+  monkeypatch.setattr(ai_client, "breaker", CircuitBreaker(error_rate=0.5, min_calls=100, window=60, cooldown=0))
+  monkeypatch.setattr(ai_client, "response_cache", ResponseCache(0, 0, store=MemoryState()))
+  monkeypatch.setattr(ai_client, "llm_limiter", ConcurrencyLimiter(0, store=MemoryState()))
+  headings: list = []
+  merge_section = AIClient.merge_section
+
+  async def spy(self, title, idea_text, heading, qa_lines):
+    headings.append(heading)
+    return await merge_section(self, title, idea_text, heading, qa_lines)
+
+  monkeypatch.setattr(AIClient, "merge_section", spy)
+  return headings
+
+
+def _merge(project_id: str) -> str:
+  with Session(engine) as session:
+    return asyncio.run(services.merge_project_doc(session, project_id))
+
+
+def test_merge_reuses_unchanged_sections_by_digest(merged_headings, monkeypatch):
+  with Session(engine, expire_on_commit=False) as session:
+    project = asyncio.run(services.create_project_from_idea(session, "分章融合缓存测试", []))
+    nodes = session.exec(select(Node).where(Node.project_id == project.id)).all()
+    red = [n for n in nodes if n.status == "red" and n.level > 0]
+    asyncio.run(services.answer_nodes_batch(session, project.id, [(n.id, f"回答{n.title}", False) for n in red]))
+  # 建项目和答题走 stub，融合时才接上模拟器
+  monkeypatch.setenv("AI_PROVIDER", "sim")
+  branches = sorted((n for n in nodes if n.level == 1), key=lambda n: n.order_index)
+  assert len(branches) > 1
+
+  first = _merge(project.id)
+  assert sorted(merged_headings) == sorted(b.title for b in branches)
+  with Session(engine) as session:
+    stored = session.exec(select(MergedSection).where(MergedSection.project_id == project.id)).all()
+    assert {m.branch_id for m in stored} == {b.id for b in branches}
+
+  # 什么都没变：一章都不重合
+  merged_headings.clear()
+  assert _merge(project.id) == first
+  assert merged_headings == []
+
+  # 只改第二个分支下的一个节点：只有这一章重合，其余按 digest 复用
+  changed = branches[1]
+  leaf = next(n for n in nodes if n.parent_id == changed.id)
+  with Session(engine) as session:
+    asyncio.run(services.answer_nodes_batch(session, project.id, [(leaf.id, "补充的新回答", False)]))
+  merged_headings.clear()
+  _merge(project.id)
+  assert merged_headings == [changed.title]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from backend import ai_client, llm_sim
+from backend.ai_client import CircuitBreaker, ConcurrencyLimiter, ResponseCache
+from backend.main import app
+from backend.shared_state import MemoryState
+
+
+def _sim(monkeypatch, failures: str = "") -> None:
+  monkeypatch.setenv("AI_PROVIDER", "sim")
+  monkeypatch.setattr(llm_sim, "_provider", llm_sim.SimProvider(latency="fixed:0", token_rate=0, failures=failures))
+  monkeypatch.setattr(ai_client, "breaker", CircuitBreaker(error_rate=0.5, min_calls=100, window=60, cooldown=0))
+  monkeypatch.setattr(ai_client, "response_cache", ResponseCache(0, 0, store=MemoryState()))
+  monkeypatch.setattr(ai_client, "llm_limiter", ConcurrencyLimiter(0, store=MemoryState()))
+
+
+def test_route_template_labels_not_raw_ids():
+  async def main() -> tuple:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+      project_id = (await c.post("/api/projects/init", json={"ideaText": "指标标签测试", "dialog": []})).json()["id"]
+      assert (await c.get(f"/api/projects/{project_id}")).status_code == 200
+      assert (await c.get(f"/api/projects/{project_id}/nodes")).status_code == 200
+      assert (await c.get("/no/such/path")).status_code == 404
+      return project_id, (await c.get("/metrics")).text
+
+  project_id, text = asyncio.run(main())
+  assert project_id not in text
+  assert 'route="/api/projects/{project_id}"' in text
+  assert 'route="/api/projects/{project_id}/nodes"' in text
+  assert 'route="unmatched"' in text
+  assert "/no/such/path" not in text
+
+
+def test_ai_headers_only_when_ai_was_called(monkeypatch):
+  async def main() -> None:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+      project = (await c.post("/api/projects/init", json={"ideaText": "响应头测试", "dialog": []})).json()
+      url = f"/api/projects/{project['id']}"
+      node_id = next(n["id"] for n in project["nodes"] if n["level"] == 2)
+
+      # 没有 AI 调用的请求不带 X-AI-*
+      r = await c.get(url)
+      assert not [h for h in r.headers if h.startswith("x-ai-")]
+
+      r = await c.post(f"{url}/nodes/{node_id}/answer", json={"content": "先用小程序做校内试点，按学院分批推广"})
+      assert r.status_code == 200
+      _sim(monkeypatch)
+      r = await c.post(f"{url}/nodes/{node_id}/spawn")
+      assert r.status_code == 200
+      assert r.headers["x-ai-source"] == "llm"
+      assert r.headers["x-ai-degraded"] == "0"
+      assert int(r.headers["x-ai-latency-ms"]) >= 0
+      assert "x-ai-errors" not in r.headers
+
+      # 模型出错退回 stub：标成降级并带上故障类型
+      _sim(monkeypatch, failures="500:1")
+      r = await c.post(f"{url}/nodes/{node_id}/tips/candidates")
+      assert r.status_code == 200
+      assert r.headers["x-ai-source"] == "stub"
+      assert r.headers["x-ai-degraded"] == "1"
+      assert r.headers["x-ai-errors"] == "HTTPStatusError"
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+      text = (await c.get("/metrics")).text
+    assert 'ai_calls_total{method="node_answer_judge_and_followups",source="llm"}' in text
+    assert 'ai_calls_total{method="make_tips_candidates",source="stub"}' in text
+
+  asyncio.run(main())
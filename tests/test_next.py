@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List, Optional
+
+import httpx
+from sqlmodel import Session, select
+
+from backend import services
+from backend.db import engine
+from backend.main import app
+from backend.models import Node
+
+
+def _preorder(project_id: str) -> List[Node]:
+  with Session(engine) as session:
+    return services.flatten_nodes(session.exec(select(Node).where(Node.project_id == project_id)).all())
+
+
+def _red(project_id: str) -> List[str]:
+  return [n.id for n in _preorder(project_id) if n.status == "red" and n.node_type != "tip" and n.level > 0]
+
+
+async def _next(c: httpx.AsyncClient, project_id: str, after: Optional[str] = None) -> Optional[str]:
+  r = await c.get(f"/api/projects/{project_id}/next", params={"after": after} if after else None)
+  assert r.status_code == 200
+  return r.json()["nextNodeId"]
+
+
+def test_next_walks_preorder_wraps_and_runs_out():
+  async def main() -> None:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+      project_id = (await c.post("/api/projects/init", json={"ideaText": "下一题顺序测试", "dialog": []})).json()["id"]
+      red = _red(project_id)
+      assert len(red) > 3
+
+      # 先序：父节点（非叶子）在它的子问题前面，也会被挑中
+      walked, cur = [], None
+      for _ in red:
+        cur = await _next(c, project_id, cur)
+        walked.append(cur)
+      assert walked == red
+      by_id = {n.id: n for n in _preorder(project_id)}
+      assert by_id[walked[0]].level == 1 and by_id[walked[1]].parent_id == walked[0]
+      # 到末尾绕回第一个
+      assert await _next(c, project_id, red[-1]) == red[0]
+
+      # 答掉中间一个：从它前一个往后找会跳过它
+      with Session(engine) as session:
+        await services.answer_node_and_trace(session, project_id, red[2], "回答")
+      assert await _next(c, project_id, red[1]) == red[3]
+
+      r = await c.post(f"/api/projects/{project_id}/answers", json={"answers": [{"node_id": i, "content": "答"} for i in _red(project_id)]})
+      assert r.status_code == 200
+      assert await _next(c, project_id) is None
+      assert await _next(c, project_id, red[0]) is None
+
+  asyncio.run(main())
+
+
+def test_dfs_key_upkeep_when_nodes_are_added_mid_tree():
+  with Session(engine, expire_on_commit=False) as session:
+    project = asyncio.run(services.create_project_from_idea(session, "先序位置维护测试", []))
+    first_mid = next(n for n in _preorder(project.id) if n.level == 1)
+    asyncio.run(services.answer_node_and_trace(session, project.id, first_mid.id, "先答一下"))
+    added = [
+      asyncio.run(services.spawn_followup_node(session, project.id, first_mid.id)),
+      asyncio.run(services.spawn_tips_node(session, project.id, first_mid.id)),
+      asyncio.run(services.spawn_followup_node(session, project.id, first_mid.id)),
+    ]
+
+  nodes = _preorder(project.id)
+  # 库里存的 dfs_key 排出来的顺序就是树的先序
+  assert [n.id for n in sorted(nodes, key=lambda n: n.dfs_key)] == [n.id for n in nodes]
+  # 新节点插在 first_mid 子树的末尾、下一个 1 级节点之前
+  ids = [n.id for n in nodes]
+  next_mid = next(n for n in nodes if n.level == 1 and n.id != first_mid.id)
+  assert all(ids.index(first_mid.id) < ids.index(a.id) < ids.index(next_mid.id) for a in added)
+  last_old_child = [n for n in nodes if n.parent_id == first_mid.id and n.id not in {a.id for a in added}][-1]
+  with Session(engine) as session:
+    last_in_subtree = services.flatten_nodes(
+      session.exec(select(Node).where(Node.project_id == project.id)).all(), last_old_child.id
+    )
+    after = (last_in_subtree[-1] if last_in_subtree else last_old_child).dfs_key
+    # 跳过 Tips，落到第一个新追问
+    assert services.next_red_node(session, project.id, after).id == added[0].id
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from backend import db, search, services
+from backend.models import Draft, Node
+
+_URL = "postgresql+psycopg://u:p@localhost:5432/mindmap"
+
+
+@pytest.mark.parametrize("url", ["postgres://u:p@localhost:5432/mindmap", "postgresql://u:p@localhost:5432/mindmap", _URL])
+def test_postgres_urls_use_psycopg(url):
+  assert db._normalize_url(url) == _URL
+
+
+def test_postgres_engine_kwargs(monkeypatch):
+  for key in ("DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_TIMEOUT", "DB_POOL_RECYCLE", "DB_PREPARE_THRESHOLD"):
+    monkeypatch.delenv(key, raising=False)
+  kwargs = db._engine_kwargs(_URL)
+  assert kwargs == {
+    "pool_size": 10,
+    "max_overflow": 20,
+    "pool_timeout": 30,
+    "pool_recycle": 1800,
+    "pool_pre_ping": True,
+    "connect_args": {"prepare_threshold": 5, "application_name": "mindmap"},
+  }
+
+  monkeypatch.setenv("DB_POOL_SIZE", "3")
+  monkeypatch.setenv("DB_MAX_OVERFLOW", "bad")
+  monkeypatch.setenv("DB_PREPARE_THRESHOLD", "off")
+  kwargs = db._engine_kwargs(_URL)
+  assert (kwargs["pool_size"], kwargs["max_overflow"]) == (3, 20)
+  assert kwargs["connect_args"]["prepare_threshold"] is None
+  assert db._engine_kwargs("sqlite:///x.db") == {"connect_args": {"check_same_thread": False}}
+
+
+def test_json_columns_are_jsonb_on_postgres():
+  for col in (Draft.__table__.c.messages, Draft.__table__.c.initial_questions):
+    assert col.type.compile(dialect=postgresql.dialect()) == "JSONB"
+    assert col.type.compile(dialect=sqlite.dialect()) == "JSON"
+
+
+@pytest.mark.postgres
+def test_services_round_trip_on_postgres():
+  columns = {c["name"]: c["type"] for c in inspect(db.engine).get_columns("draft")}
+  assert columns["messages"].compile(dialect=db.engine.dialect) == "JSONB"
+  with Session(db.engine, expire_on_commit=False) as session:
+    draft = services.create_draft(session, mode="brief")
+    draft.messages = [{"role": "user", "content": "中文不转义"}]
+    session.add(draft)
+    session.commit()
+  with Session(db.engine) as session:
+    assert session.get(Draft, draft.id).messages == [{"role": "user", "content": "中文不转义"}]
+
+  with Session(db.engine, expire_on_commit=False) as session:
+    project = asyncio.run(services.create_project_from_idea(session, "Postgres 上的立项测试", []))
+    leaves = [n for n in session.exec(select(Node).where(Node.project_id == project.id)).all() if n.level == 3]
+  items = [(n.id, "足够详细的人工回答，超过二十个字，判完整没有问题。", False) for n in leaves[:2]]
+  with Session(db.engine) as session:
+    asyncio.run(services.answer_node_and_trace(session, project.id, leaves[0].id, items[0][1]))
+    asyncio.run(services.answer_nodes_batch(session, project.id, items[1:]))
+  with Session(db.engine) as session:
+    status = {n.id: n.status for n in session.exec(select(Node).where(Node.project_id == project.id)).all()}
+    assert status[leaves[0].id] == status[leaves[1].id] == "green"
+    # Postgres 上全走 ILIKE + pg_trgm，打分分页在 SQL 里
+    hits = search.search(session, "人工回答", project_id=project.id)["hits"]
+    assert {h["node_id"] for h in hits} == {leaves[0].id, leaves[1].id}
+    assert search.search(session, "立项测试", limit=1)["hits"]
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from backend import ai_client, llm_sim, main, services
+from backend.ai_client import CircuitBreaker, ConcurrencyLimiter, ResponseCache
+from backend.prefetch import Prefetcher
+from backend.shared_state import MemoryState
+
+
+def test_take_after_answer_reuses_prefetch_and_reanswer_invalidates(monkeypatch):
+  # conftest 全局关了预取，这里换一个开着的，接上模拟器并数一数真正打到模型的次数
+  prefetcher = Prefetcher(enabled=True)
+  monkeypatch.setattr(services, "prefetcher", prefetcher)
+  monkeypatch.setattr(main, "prefetcher", prefetcher)
+  monkeypatch.setattr(ai_client, "breaker", CircuitBreaker(error_rate=0.5, min_calls=100, window=60, cooldown=0))
+  monkeypatch.setattr(ai_client, "response_cache", ResponseCache(0, 0, store=MemoryState()))
+  monkeypatch.setattr(ai_client, "llm_limiter", ConcurrencyLimiter(0, store=MemoryState()))
+  sim = llm_sim.SimProvider(latency="fixed:0", token_rate=0)
+  monkeypatch.setattr(llm_sim, "_provider", sim)
+  llm_calls = []
+  complete = sim.complete
+
+  async def counting(model, messages, timeout):
+    llm_calls.append(messages)
+    return await complete(model, messages, timeout)
+
+  monkeypatch.setattr(sim, "complete", counting)
+
+  async def settle() -> None:
+    tasks = [t for kinds in prefetcher._entries.values() for _, t in kinds.values()]
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+  async def run() -> None:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as c:
+      project = (await c.post("/api/projects/init", json={"ideaText": "预取测试", "dialog": []})).json()
+      url = f"/api/projects/{project['id']}"
+      node_id = next(n["id"] for n in project["nodes"] if n["level"] == 2)
+
+      monkeypatch.setenv("AI_PROVIDER", "sim")
+      r = await c.post(f"{url}/nodes/{node_id}/answer", json={"content": "先在本校试点，再按学院推广"})
+      assert r.status_code == 200 and "x-ai-source" not in r.headers  # 预取不算在回答请求头上
+      await settle()
+      assert set(prefetcher._entries[node_id]) == {"followups", "tips"}
+      prefetched = len(llm_calls)
+      assert prefetched == 2
+
+      # 答完再取：直接用预取结果，不再调模型
+      r = await c.post(f"{url}/nodes/{node_id}/tips/candidates")
+      assert r.status_code == 200 and r.headers["x-ai-source"] == "prefetch"
+      r = await c.post(f"{url}/nodes/{node_id}/spawn")
+      assert r.status_code == 200 and r.headers["x-ai-source"] == "prefetch"
+      assert len(llm_calls) == prefetched
+
+      # 重新回答：旧预取作废，换成按新回答算的
+      old_version, old_task = prefetcher._entries[node_id]["tips"]
+      r = await c.post(f"{url}/nodes/{node_id}/answer", json={"content": "改成先做线上预约"})
+      assert r.status_code == 200
+      new_version, new_task = prefetcher._entries[node_id]["tips"]
+      assert new_version != old_version and new_task is not old_task
+      assert await prefetcher.take("tips", node_id, old_version, "make_tips_candidates") is None
+      await settle()
+      assert len(llm_calls) == prefetched + 2
+
+      # 批量导入只作废、不再预取：取的时候退回现调模型
+      r = await c.post(f"{url}/answers", json={"answers": [{"node_id": node_id, "content": "第三版回答"}]})
+      assert r.status_code == 200
+      assert node_id not in prefetcher._entries
+      r = await c.post(f"{url}/nodes/{node_id}/tips/candidates")
+      assert r.headers["x-ai-source"] == "llm"
+      assert len(llm_calls) == prefetched + 3
+
+    prefetcher.clear()
+
+  asyncio.run(run())
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from backend import ai_client, llm_sim
+from backend.ai_client import CircuitBreaker, ConcurrencyLimiter, ResponseCache
+from backend.main import app
+from backend.recorder import RecordingMiddleware, TrafficRecorder
+from backend.shared_state import MemoryState
+from benchmarks.replay import _ReplayTag, _drive, load_http_entries
+
+IDEA = "做一个校园二手教材交易平台，联系我 someone@example.com"
+
+
+def _fresh_ai(monkeypatch, provider: llm_sim.SimProvider) -> None:
+  # 缓存关掉，每次调用都真的走到模拟器（录制时才录得到，回放时才用得上录下来的回复）
+  monkeypatch.setattr(ai_client, "breaker", CircuitBreaker(error_rate=0.5, min_calls=100, window=60, cooldown=0))
+  monkeypatch.setattr(ai_client, "response_cache", ResponseCache(0, 0, store=MemoryState()))
+  monkeypatch.setattr(ai_client, "llm_limiter", ConcurrencyLimiter(0, store=MemoryState()))
+  monkeypatch.setattr(llm_sim, "_provider", provider)
+
+
+def _read(path) -> list:
+  with open(path, encoding="utf-8") as f:
+    return [json.loads(line) for line in f if line.strip()]
+
+
+async def _record_session(rec: TrafficRecorder) -> dict:
+  # 线上录制挂在压缩里层；这里包在整个 app 外面，就让响应别压缩
+  transport = httpx.ASGITransport(app=RecordingMiddleware(app, rec))
+  headers = {"Accept-Encoding": "identity"}
+  async with httpx.AsyncClient(transport=transport, base_url="http://record.test", headers=headers) as c:
+    draft_id = (await c.post("/api/draft", json={"mode": "brief"})).json()["draft_id"]
+    for _ in range(5):
+      r = await c.post(f"/api/draft/{draft_id}/message", json={"content": IDEA})
+      if not r.json()["need_more"]:
+        break
+    project = (await c.post("/api/projects/from-draft", json={"draft_id": draft_id})).json()
+    return (await c.get(f"/api/projects/{project['id']}")).json()
+
+
+def _shape(project: dict) -> list:
+  return sorted((n["level"], n["title"], n["question"], n["status"]) for n in project["nodes"])
+
+
+def test_record_then_replay_round_trip(tmp_path, monkeypatch):
+  path = str(tmp_path / "rec.jsonl")
+  rec = TrafficRecorder(path)
+  monkeypatch.setenv("AI_PROVIDER", "sim")
+  monkeypatch.setattr(ai_client, "recorder", rec)
+  _fresh_ai(monkeypatch, llm_sim.SimProvider(latency="fixed:0", token_rate=0, seed=1))
+
+  original = asyncio.run(_record_session(rec))
+
+  entries = _read(path)
+  http = [e for e in entries if e["type"] == "http"]
+  llm = [e for e in entries if e["type"] == "llm"]
+  assert [e["path"].split("/")[2] for e in http][:1] == ["draft"]
+  assert llm and {e["rid"] for e in llm} <= {e["rid"] for e in http}
+  # 模型调用和请求体里的邮箱都脱敏了
+  assert "someone@example.com" not in open(path, encoding="utf-8").read()
+  assert all(e["key"] for e in llm)
+  assert original["id"] in http[-1]["ids"]
+
+  # 回放：换个种子的模拟器，现编的话内容会不一样；按录制文件回放应该一模一样
+  monkeypatch.setattr(ai_client, "recorder", None)
+  _fresh_ai(monkeypatch, llm_sim.SimProvider(latency="fixed:0", token_rate=0, replay_path=path, seed=2))
+  transport = httpx.ASGITransport(app=_ReplayTag(app), raise_app_exceptions=False)
+  args = SimpleNamespace(no_timing=False, speed=1000.0, timeout=30.0, wait_timeout=5.0)
+  results = asyncio.run(_drive("http://replay.test", transport, load_http_entries(path), args))
+
+  assert len(results) == len(http)
+  assert not [r for r in results if "skipped" in r]
+  assert [(r["route"], r["status"]) for r in results] == [(r["route"], r["orig_status"]) for r in results]
+
+  async def latest() -> dict:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://replay.test") as c:
+      items = (await c.get("/api/projects")).json()
+      return (await c.get(f"/api/projects/{items[0]['id']}")).json()
+
+  replayed = asyncio.run(latest())
+  assert replayed["id"] != original["id"]
+  assert replayed["name"] == original["name"]
+  assert _shape(replayed) == _shape(original)
+
+
+@pytest.mark.parametrize("redact", ["prompts,responses", "bodies"])
+def test_redact_modes(tmp_path, redact):
+  rec = TrafficRecorder(str(tmp_path / "rec.jsonl"), redact)
+  rec.record_llm(
+    key="k", method="m", model="x", provider="sim",
+    messages=[{"role": "user", "content": "原文"}], response="回复", latency=0.1, usage=None,
+  )
+  rec.record_http(
+    method="POST", path="/api/draft", query="", body=b'{"mode":"brief"}',
+    status=200, latency=0.1, started=0.0, response_body=b'{"draft_id":"' + b"a" * 32 + b'"}', rid="r1",
+  )
+  llm, http = _read(tmp_path / "rec.jsonl")
+  text = json.dumps(llm, ensure_ascii=False)
+  if redact == "bodies":
+    assert "原文" in text and "回复" in text
+    assert "body" not in http and "body_redacted" in http
+  else:
+    assert "原文" not in text and "回复" not in text and llm["key"] == "k"
+    assert http["body"] == {"mode": "brief"}
+  assert http["ids"] == ["a" * 32]
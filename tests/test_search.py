@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from contextlib import contextmanager
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend import search
+from backend.db import engine
+
+
+def _docs(session: Session, marker: str, n: int, project_id: str = "p") -> None:
+  docs = [
+    {"kind": "node", "ref_id": uuid4().hex, "project_id": project_id, "node_id": None, "title": "普通", "body": f"正文提到{marker}第{i}次"}
+    for i in range(n)
+  ]
+  docs.append({"kind": "node", "ref_id": uuid4().hex, "project_id": project_id, "node_id": None, "title": f"{marker}", "body": "标题命中"})
+  search._upsert(session, docs[:1] + docs[-1:] + docs[1:-1])  # 标题命中的那条不是最新的
+  session.commit()
+
+
+def _pages(session: Session, q: str, limit: int = 50) -> tuple:
+  first = search.search(session, q, limit=limit)
+  seen, offset = [], 0
+  while True:
+    page = search.search(session, q, limit=limit, offset=offset)["hits"]
+    if not page:
+      return first, seen
+    seen += page
+    offset += limit
+
+
+@contextmanager
+def _selects(bind):
+  """查 searchdoc 的 SELECT 语句（不含 COUNT 和查项目名 / 节点标题的）。"""
+  seen: list = []
+
+  def listener(conn, cursor, statement, parameters, context, executemany):
+    if statement.startswith("SELECT d.id") or "FROM (SELECT d.id" in statement:
+      seen.append(statement)
+
+  event.listen(bind, "before_cursor_execute", listener)
+  try:
+    yield seen
+  finally:
+    event.remove(bind, "before_cursor_execute", listener)
+
+
+def test_fts_ranks_all_matches_and_pages_past_old_cap():
+  with Session(engine) as session:
+    _docs(session, "独角兽计划", 620)
+    first, seen = _pages(session, "独角兽计划")
+  assert first["total"] == 621
+  assert len(seen) == 621
+  assert first["hits"][0]["title"] == "独角兽计划"
+
+
+def test_like_fallback_without_trigram_tokenizer(monkeypatch):
+  path = os.path.join(tempfile.mkdtemp(), "old.db")
+  old = create_engine(f"sqlite:///{path}")
+  SQLModel.metadata.create_all(old)
+  ddl = [search._SQLITE_DDL[0].replace("'trigram'", "'no_such_tokenizer'")] + search._SQLITE_DDL[1:]
+  monkeypatch.setattr(search, "_SQLITE_DDL", ddl)
+  search.ensure_index(old)
+  with Session(old) as session:
+    _docs(session, "长尾关键词", 30)
+    first, seen = _pages(session, "长尾关键词", limit=7)
+  assert first["total"] == 31
+  assert len(seen) == 31
+  assert first["hits"][0]["title"] == "长尾关键词"
+
+
+def test_long_terms_use_fts_and_short_terms_are_paged_in_sql():
+  with Session(engine) as session:
+    _docs(session, "风控", 80)
+    _docs(session, "灰度发布策略", 80)
+    _docs(session, "灰度发布策略", 30, project_id="scoped")
+    with _selects(engine) as seen:
+      fts = search.search(session, "灰度发布策略", limit=5)
+      mixed = search.search(session, "灰度发布策略 正文", limit=5)
+      short = search.search(session, "风控", limit=5, offset=10)
+      scoped = search.search(session, "灰度发布策略", project_id="scoped", limit=5)
+    top_short = search.search(session, "风控", limit=1)["hits"][0]
+  assert "MATCH" in seen[0] and "MATCH" in seen[1]
+  # 短词和限定项目不走 FTS，但打分排序和分页都在 SQL 里，只取回一页
+  assert all("LIMIT" in stmt for stmt in seen)
+  assert "MATCH" not in seen[2] and "MATCH" not in seen[3]
+  assert [len(r["hits"]) for r in (fts, mixed, short, scoped)] == [5, 5, 5, 5]
+  assert fts["total"] >= 81 and short["total"] >= 81 and scoped["total"] == 31
+  assert fts["hits"][0]["title"] == "灰度发布策略" and scoped["hits"][0]["title"] == "灰度发布策略"
+  assert top_short["title"] == "风控"
+  assert all(h["project_id"] == "scoped" for h in scoped["hits"])
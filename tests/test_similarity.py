@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from backend.main import app
+from backend.shared_state import MemoryState, SQLiteState
+from backend.similarity import FollowupCache, is_duplicate
+
+
+def test_is_duplicate():
+  assert is_duplicate("你的目标用户是谁？", ["你的目标用户是谁"])
+  assert not is_duplicate("盈利模式是什么？", ["你的目标用户是谁"])
+
+
+class SlowMemoryState(MemoryState):
+  """读得慢一点，读-改-写之间的空档拉大，不原子的话必丢。"""
+
+  def get(self, ns, key):
+    value = super().get(ns, key)
+    time.sleep(0.005)
+    return value
+
+
+class SlowSQLiteState(SQLiteState):
+  def get(self, ns, key):
+    value = super().get(ns, key)
+    time.sleep(0.005)
+    return value
+
+
+@pytest.mark.parametrize("make_store", [SlowMemoryState, lambda: SlowSQLiteState(os.path.join(tempfile.mkdtemp(), "state.db"))])
+def test_concurrent_store_followups_keeps_every_entry(make_store):
+  # 每个线程一个 FollowupCache，和多 worker 一样只通过 store 共享
+  store = make_store()
+  n = 40
+
+  def save(i: int) -> None:
+    FollowupCache(store=store).store_followups("p", f"问题{i}", [f"追问{i}"])
+
+  with ThreadPoolExecutor(8) as pool:
+    list(pool.map(save, range(n)))
+  cache = FollowupCache(store=store)
+  assert {e["key"] for e in cache._load("p")} == {f"问题{i}" for i in range(n)}
+
+
+def test_spawn_twice_in_stub_mode_always_adds_a_child():
+  # stub 只会给通用追问，第二次起和已有子节点重复，也得照样建出来
+  async def main() -> list:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+      project = (await c.post("/api/projects/init", json={"ideaText": "重复追问测试", "dialog": []})).json()
+      node = next(n for n in project["nodes"] if n["level"] == 2)
+      base = f"/api/projects/{project['id']}/nodes/{node['id']}"
+      assert (await c.post(f"{base}/answer", json={"content": "先答一下"})).status_code == 200
+      return [await c.post(f"{base}/spawn") for _ in range(3)]
+
+  spawned = asyncio.run(main())
+  assert [r.status_code for r in spawned] == [200, 200, 200]
+  assert len({r.json()["id"] for r in spawned}) == 3
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import re
+
+import httpx
+
+from backend.main import app, static_assets
+
+
+def test_static_index_hashed_assets_and_whitelist():
+  async def main() -> None:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+      # 首页里对 frontend/main.js 的引用改写成带 hash 的地址
+      r = await c.get("/", headers={"Accept-Encoding": "identity"})
+      assert r.status_code == 200 and r.headers["cache-control"] == "no-cache"
+      hashed = static_assets.urls["frontend/main.js"]
+      assert re.fullmatch(r"/assets/main\.[0-9a-f]{12}\.js", hashed)
+      assert f'src="{hashed}"' in r.text and "./frontend/main.js" not in r.text
+      etag = r.headers["etag"]
+      assert (await c.get("/", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})).status_code == 304
+
+      # hash 地址：一年 immutable，预压缩好的 gzip 和原文一致
+      plain = await c.get(hashed, headers={"Accept-Encoding": "identity"})
+      assert plain.status_code == 200
+      assert plain.headers["cache-control"] == "public, max-age=31536000, immutable"
+      assert plain.headers["content-type"].startswith("text/javascript")
+      raw = await c.send(c.build_request("GET", hashed, headers={"Accept-Encoding": "gzip"}), stream=True)
+      assert raw.headers["content-encoding"] == "gzip"
+      assert raw.headers["etag"] != plain.headers["etag"]
+      body = b"".join([chunk async for chunk in raw.aiter_raw()])
+      await raw.aclose()
+      assert body == static_assets.routes[hashed][0].bodies["gzip"]
+      assert gzip.decompress(body) == plain.content
+      # 老地址还能用，但要回源校验
+      old = await c.get("/frontend/main.js", headers={"Accept-Encoding": "identity"})
+      assert old.content == plain.content and old.headers["cache-control"] == "no-cache"
+
+      # 白名单以外的仓库文件一律 404
+      for path in ("/requests.jsonl", "/backend/db.py", "/tests/conftest.py", "/assets/nope.js", "/frontend/../backend/db.py"):
+        assert (await c.get(path)).status_code == 404, path
+      assert (await c.post("/")).status_code == 405
+
+  asyncio.run(main())
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from backend.main import app
+
+
+def test_subtree_depth_child_counts_and_foreign_parent():
+  async def main() -> None:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+      project = (await c.post("/api/projects/init", json={"ideaText": "按需展开测试", "dialog": []})).json()
+      other = (await c.post("/api/projects/init", json={"ideaText": "另一个项目", "dialog": []})).json()
+      url = f"/api/projects/{project['id']}/nodes"
+      full = project["nodes"]
+      children = {n["id"]: [m["id"] for m in full if m["parent_id"] == n["id"]] for n in full}
+      root = next(n for n in full if n["parent_id"] is None)
+      mids = [n["id"] for n in full if n["level"] == 1]
+
+      # 不传 parent_id：depth=1 只有根，子节点数照实给
+      r = (await c.get(url)).json()
+      assert [n["id"] for n in r["nodes"]] == [root["id"]]
+      assert r["nodes"][0]["child_count"] == len(mids) > 0
+
+      # depth=2：根加 1 级节点，1 级节点的子节点没展开，child_count 仍是真实数目
+      r = (await c.get(url, params={"depth": 2})).json()
+      assert {n["id"] for n in r["nodes"]} == {root["id"], *mids}
+      for n in r["nodes"]:
+        assert n["child_count"] == len(children[n["id"]])
+      truncated = [n for n in r["nodes"] if n["level"] == 1]
+      assert any(n["child_count"] > 0 for n in truncated)
+      assert all(n["progress"]["total"] >= n["child_count"] for n in truncated)
+
+      # 从某个 1 级节点往下一层：只有它的直接子节点，按先序
+      r = (await c.get(url, params={"parent_id": mids[0], "depth": 1})).json()
+      assert r["parent_id"] == mids[0] and r["depth"] == 1
+      assert [n["id"] for n in r["nodes"]] == children[mids[0]]
+
+      # 层数够深就是整棵树
+      r = (await c.get(url, params={"depth": 10})).json()
+      assert [n["id"] for n in r["nodes"]] == [n["id"] for n in full]
+
+      assert (await c.get(url, params={"depth": 0})).status_code == 422
+      assert (await c.get(url, params={"depth": 11})).status_code == 422
+
+      # 别的项目的节点当 parent_id：404，不串项目
+      foreign = next(n["id"] for n in other["nodes"] if n["level"] == 1)
+      r = await c.get(url, params={"parent_id": foreign})
+      assert r.status_code == 404 and r.json()["detail"] == "node_not_found"
+      r = await c.get("/api/projects/nope/nodes")
+      assert r.status_code == 404 and r.json()["detail"] == "project_not_found"
+
+  asyncio.run(main())
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+
+from sqlmodel import Session, select
+
+from backend import services
+from backend.db import engine
+from backend.models import Node
+
+
+def _branches(session: Session, project_id: str):
+  """三个 2 级节点和它们的 3 级子问题。"""
+  nodes = session.exec(select(Node).where(Node.project_id == project_id)).all()
+  mids = sorted((n for n in nodes if n.level == 2), key=lambda n: n.dfs_key)[:3]
+  return [(m.id, [c.id for c in sorted(nodes, key=lambda n: n.dfs_key) if c.parent_id == m.id]) for m in mids]
+
+
+def _status(project_id: str) -> dict:
+  with Session(engine) as session:
+    return {n.id: n.status for n in session.exec(select(Node).where(Node.project_id == project_id)).all()}
+
+
+def _setup(idea: str):
+  with Session(engine, expire_on_commit=False) as session:
+    project = asyncio.run(services.create_project_from_idea(session, idea, []))
+    (plain, plain_kids), (tipped, tipped_kids), (mixed, mixed_kids) = _branches(session, project.id)
+    asyncio.run(services.spawn_tips_node(session, project.id, tipped))
+  answers = [(k, "人工回答", False) for k in plain_kids + tipped_kids]
+  answers += [(mixed_kids[0], "AI 回答", True)] + [(k, "人工回答", False) for k in mixed_kids[1:]]
+  return project.id, (plain, tipped, mixed), answers
+
+
+def test_parent_turns_green_only_when_every_direct_child_is_green():
+  project_id, (plain, tipped, mixed), answers = _setup("溯源规则测试")
+  for node_id, content, by_ai in answers:
+    with Session(engine) as session:
+      asyncio.run(services.answer_node_and_trace(session, project_id, node_id, content, by_ai=by_ai))
+  status = _status(project_id)
+  assert status[plain] == "green"
+  assert status[tipped] == "red"  # 下面挂着 Tips 节点
+  assert status[mixed] == "red"  # 有 AI 代答的子问题
+
+  batch_id, (plain_b, tipped_b, mixed_b), batch = _setup("溯源规则测试")
+  with Session(engine) as session:
+    asyncio.run(services.answer_nodes_batch(session, batch_id, batch))
+  status_b = _status(batch_id)
+  assert [status_b[plain_b], status_b[tipped_b], status_b[mixed_b]] == ["green", "red", "red"]